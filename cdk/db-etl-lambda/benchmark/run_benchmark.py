@@ -0,0 +1,344 @@
+#!/usr/bin/env python3
+"""
+db-etlパイプラインのベンチマーク
+
+ローカルのPostgreSQLに合成データ（顧客・商品・注文・注文明細）をDB Initializer Lambdaの generate モードと
+同じ生成器でシードから決定的に生成し、Extract-Transform / Load Lambdaの
+処理をステージごとに実行して、所要時間・スループット（行/秒）・ピークRSSを出力する。
+S3はmotoでモックするため、AWSのリソースは不要。
+
+使用方法:
+    python3 benchmark/run_benchmark.py --orders 100000
+    python3 benchmark/run_benchmark.py --orders 1000000 -o result.json
+    python3 benchmark/run_benchmark.py --orders 1000000 --skip-generate --baseline result.json
+    python3 benchmark/run_benchmark.py --orders 100000 --seed 7
+
+注意: 指定したソースDB・ターゲットDBの既存データは削除される
+"""
+
+import argparse
+import importlib.util
+import json
+import os
+import resource
+import sys
+import time
+import warnings
+from contextlib import contextmanager
+from datetime import date, timedelta
+from pathlib import Path
+
+SCRIPT_DIR = Path(__file__).parent
+PROJECT_DIR = SCRIPT_DIR.parent
+INITIALIZER_DIR = PROJECT_DIR / 'lambda' / 'db-initializer'
+INITIALIZER_SQL_DIR = INITIALIZER_DIR / 'sql'
+
+DEFAULT_SOURCE_DSN = 'postgresql://postgres@localhost:5432/sourcedb'
+DEFAULT_TARGET_DSN = 'postgresql://postgres@localhost:5432/targetdb'
+BENCHMARK_BUCKET = 'db-etl-benchmark'
+
+# 合成データ生成時に1回のCOPYで投入する注文数（DB Initializer Lambdaの GENERATOR_CHUNK_ORDERS と同じ）
+GENERATOR_CHUNK_ORDERS = 50000
+
+# ロード前に空にするターゲットテーブル
+TARGET_TABLES = (
+    'customer_analytics', 'product_sales_summary', 'daily_sales_summary', 'etl_load_ledger',
+    'weekly_sales_rollup', 'monthly_sales_rollup'
+)
+
+# Lambdaモジュールの読み込み前に設定する環境変数（未設定の場合のみ）
+BENCHMARK_ENVIRONMENT = {
+    'AWS_DEFAULT_REGION': 'ap-northeast-1',
+    'AWS_ACCESS_KEY_ID': 'testing',
+    'AWS_SECRET_ACCESS_KEY': 'testing',
+    'POWERTOOLS_SERVICE_NAME': 'db-etl-benchmark',
+    'POWERTOOLS_METRICS_NAMESPACE': 'DbEtlBenchmark',
+    'LOG_LEVEL': 'WARNING',
+}
+
+
+class StageRecorder:
+    """ステージごとの所要時間・行数・ピークRSSを記録"""
+    def __init__(self):
+        self.stages = []
+
+    def run(self, name: str, func, *args, rows=None):
+        """
+        ステージを実行して結果を返す
+
+        rows は処理行数（整数）または結果から行数を求める関数
+        """
+        start_time = time.perf_counter()
+        result = func(*args)
+        seconds = time.perf_counter() - start_time
+
+        row_count = rows(result) if callable(rows) else rows
+        self.stages.append({
+            'stage': name,
+            'seconds': round(seconds, 3),
+            'rows': row_count,
+            'rows_per_sec': round(row_count / seconds, 1) if row_count and seconds > 0 else None,
+            'peak_rss_mb': peak_rss_mb(),
+        })
+        return result
+
+
+def peak_rss_mb() -> float:
+    """プロセスのピークRSS（MB）"""
+    max_rss = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    # LinuxはKB、macOSはバイト単位
+    return round(max_rss / (1024 * 1024 if sys.platform == 'darwin' else 1024), 1)
+
+
+def import_lambda(module_name: str, lambda_dir: Path):
+    """Lambda関数のモジュールを別名で読み込む（どちらも lambda_function.py のため）"""
+    sys.path.insert(0, str(lambda_dir))
+    spec = importlib.util.spec_from_file_location(module_name, lambda_dir / 'lambda_function.py')
+    module = importlib.util.module_from_spec(spec)
+    spec.loader.exec_module(module)
+    return module
+
+
+def connection_factory(psycopg2, dsn: str):
+    """Load Lambdaの接続プールの代わりに、呼び出しごとに接続を開いて閉じるファクトリ"""
+    @contextmanager
+    def connect():
+        conn = psycopg2.connect(dsn)
+        try:
+            yield conn
+        finally:
+            conn.close()
+    return connect
+
+
+def execute_sql_file(conn, sql: str, params=None):
+    with conn.cursor() as cursor:
+        cursor.execute(sql, params)
+    conn.commit()
+
+
+def generate_source_data(conn, args) -> dict:
+    """
+    DB Initializer Lambdaの generate モードと同じ生成器でソースDBに合成データをCOPYで投入（既存のデータは削除する）
+
+    注文は --days 日に均等な比率で分散させる（曜日による偏りはつけない）
+
+    Returns:
+        テーブル別の投入行数
+    """
+    from etl_common import copy_rows, load_sql_file
+    from generator import SourceDataGenerator
+
+    settings = {
+        'customers': args.customers,
+        'products': args.products,
+        'orders': args.orders,
+        'days': args.days,
+        'end_date': args.target_date.isoformat(),
+        'items_per_order': [args.items_per_order, args.items_per_order],
+        'weekday_weights': [1] * 7,
+        'seed': args.seed,
+    }
+    generator = SourceDataGenerator(settings)
+    with conn.cursor() as cursor:
+        cursor.execute(load_sql_file('truncate_source_tables.sql', str(INITIALIZER_SQL_DIR)))
+        counts = {
+            'customers': copy_rows(cursor, 'customers', ('id', 'name', 'email', 'region'), generator.customer_rows()),
+            'products': copy_rows(cursor, 'products', ('id', 'name', 'category', 'price'), generator.product_rows()),
+            'orders': 0,
+            'order_items': 0,
+        }
+        for orders, items in generator.order_chunks(GENERATOR_CHUNK_ORDERS):
+            counts['orders'] += copy_rows(
+                cursor, 'orders', ('id', 'customer_id', 'order_date', 'status', 'total_amount'), orders
+            )
+            counts['order_items'] += copy_rows(
+                cursor, 'order_items', ('id', 'order_id', 'product_id', 'quantity', 'unit_price'), items
+            )
+        cursor.execute(load_sql_file('reset_source_sequences.sql', str(INITIALIZER_SQL_DIR)))
+        cursor.execute(load_sql_file('analyze_source_tables.sql', str(INITIALIZER_SQL_DIR)))
+    conn.commit()
+    return counts
+
+
+def count_orders(conn, target_date: date) -> int:
+    """対象日の注文数（抽出ステージのスループットの基準）"""
+    with conn.cursor() as cursor:
+        cursor.execute("SELECT COUNT(*) FROM orders WHERE order_date = %s", (target_date,))
+        count = cursor.fetchone()[0]
+    conn.rollback()
+    return count
+
+
+def truncate_target_tables(conn):
+    with conn.cursor() as cursor:
+        cursor.execute(f"TRUNCATE {', '.join(TARGET_TABLES)}")
+    conn.commit()
+
+
+def run_benchmark(args) -> dict:
+    for name, value in BENCHMARK_ENVIRONMENT.items():
+        os.environ.setdefault(name, value)
+    # psycopg2の接続をpandas.read_sqlに渡す際の警告（Lambdaと同じ使い方のため抑止）
+    warnings.filterwarnings('ignore', message='pandas only supports SQLAlchemy')
+    sys.path.insert(0, str(PROJECT_DIR / 'layers' / 'common-code' / 'python'))
+    sys.path.insert(0, str(INITIALIZER_DIR))
+
+    import boto3
+    import psycopg2
+    from moto import mock_aws
+    from etl_common import load_sql_file
+
+    recorder = StageRecorder()
+    source_conn = psycopg2.connect(args.source_dsn)
+    target_conn = psycopg2.connect(args.target_dsn)
+
+    # スキーマ作成（DB Initializer Lambdaと同じSQL）
+    execute_sql_file(source_conn, load_sql_file('create_source_tables.sql', str(INITIALIZER_SQL_DIR)))
+    execute_sql_file(target_conn, load_sql_file('create_target_tables.sql', str(INITIALIZER_SQL_DIR)))
+    execute_sql_file(target_conn, load_sql_file('create_target_views.sql', str(INITIALIZER_SQL_DIR)))
+
+    if not args.skip_generate:
+        print(f'合成データ生成: 注文 {args.orders} 件（{args.days} 日分）、顧客 {args.customers} 件、'
+              f'商品 {args.products} 件（シード: {args.seed}）')
+        recorder.run('generate_source_data', generate_source_data, source_conn, args,
+                     rows=lambda counts: counts['orders'] + counts['order_items'])
+
+    target_orders = count_orders(source_conn, args.target_date)
+    print(f'対象日 {args.target_date} の注文: {target_orders} 件')
+
+    with mock_aws():
+        boto3.client('s3').create_bucket(
+            Bucket=BENCHMARK_BUCKET,
+            CreateBucketConfiguration={'LocationConstraint': os.environ['AWS_DEFAULT_REGION']}
+        )
+        extract = import_lambda('extract_transform_lambda', PROJECT_DIR / 'lambda' / 'extract-transform')
+        load = import_lambda('load_lambda', PROJECT_DIR / 'lambda' / 'load')
+
+        # メモリ上での抽出・変換とロード
+        data = recorder.run('extract_transform_data', extract.extract_transform_data, source_conn,
+                            args.target_date, rows=target_orders)
+        source_conn.rollback()
+        truncate_target_tables(target_conn)
+        recorder.run('load_data_to_aurora', load.load_data_to_aurora, target_conn, data,
+                     rows=lambda results: sum(results.values()))
+        recorder.run('load_data_to_aurora_unchanged', load.load_data_to_aurora, target_conn, data,
+                     rows=lambda results: sum(results.values()))
+        del data
+
+        # S3経由（環境変数の抽出モード・出力形式・レイアウトに従う）
+        s3_keys, _ = recorder.run('extract_to_s3', extract.extract_to_s3, source_conn, args.target_date,
+                                  BENCHMARK_BUCKET, rows=target_orders)
+        source_conn.rollback()
+        truncate_target_tables(target_conn)
+        records = [
+            {'s3': {'bucket': {'name': BENCHMARK_BUCKET}, 'object': {'key': key}}}
+            for key in s3_keys if key.startswith('etl-data/')
+        ]
+        load_results = recorder.run(
+            'load_from_s3', load.process_records, records, connection_factory(psycopg2, args.target_dsn),
+            rows=lambda results: sum(sum(result.get('load_results', {}).values()) for result in results)
+        )
+        failed = [result for result in load_results if result['status'] == 'failed']
+        if failed:
+            raise RuntimeError(f"Load from S3 failed: {failed[0]['error']}")
+
+        config = {
+            name: getattr(extract, name)
+            for name in ('EXTRACT_MODE', 'EXTRACT_PARALLEL', 'TRANSFORM_ENGINE', 'OUTPUT_FORMAT', 'OUTPUT_LAYOUT')
+        }
+        config.update({name: getattr(load, name) for name in ('BULK_LOAD_THRESHOLD', 'LOAD_BATCH_SIZE')})
+
+    source_conn.close()
+    target_conn.close()
+
+    return {
+        'scale': {
+            'orders': args.orders,
+            'days': args.days,
+            'customers': args.customers,
+            'products': args.products,
+            'items_per_order': args.items_per_order,
+            'seed': args.seed,
+            'target_date_orders': target_orders,
+        },
+        'config': config,
+        'stages': recorder.stages,
+    }
+
+
+def print_report(result: dict):
+    print()
+    print(f"{'stage':<32}{'seconds':>10}{'rows':>12}{'rows/sec':>14}{'peak RSS (MB)':>16}")
+    for stage in result['stages']:
+        rows_per_sec = f"{stage['rows_per_sec']:,.0f}" if stage['rows_per_sec'] else '-'
+        print(f"{stage['stage']:<32}{stage['seconds']:>10.3f}{stage['rows'] or 0:>12,}"
+              f"{rows_per_sec:>14}{stage['peak_rss_mb']:>16.1f}")
+
+
+def compare_with_baseline(result: dict, baseline_file: Path, max_regression: float) -> bool:
+    """
+    ベースラインとステージごとのスループットを比較
+
+    Returns:
+        いずれかのステージが max_regression を超えて低下した場合はFalse
+    """
+    with open(baseline_file, 'r', encoding='utf-8') as f:
+        baseline = {stage['stage']: stage for stage in json.load(f)['stages']}
+
+    print()
+    print(f'ベースライン比較: {baseline_file}（許容低下率: {max_regression:.0%}）')
+    passed = True
+    for stage in result['stages']:
+        base = baseline.get(stage['stage'])
+        if not base or not base['rows_per_sec'] or not stage['rows_per_sec']:
+            continue
+        ratio = stage['rows_per_sec'] / base['rows_per_sec']
+        regressed = ratio < 1 - max_regression
+        passed = passed and not regressed
+        print(f"{stage['stage']:<32}{ratio:>8.2f}x{'  REGRESSION' if regressed else ''}")
+    return passed
+
+
+def main():
+    parser = argparse.ArgumentParser(
+        description='ローカルのPostgreSQLでdb-etlパイプラインのスループットを計測する'
+    )
+    parser.add_argument('--orders', type=int, default=100000, help='生成する注文数（デフォルト: 100000）')
+    parser.add_argument('--days', type=int, default=1,
+                        help='注文を分散させる日数。対象日の注文は orders / days 件（デフォルト: 1）')
+    parser.add_argument('--customers', type=int, help='生成する顧客数（デフォルト: 注文数の1/20、最低1000）')
+    parser.add_argument('--products', type=int, help='生成する商品数（デフォルト: 注文数の1/1000、最低100）')
+    parser.add_argument('--items-per-order', type=int, default=3, help='1注文あたりの明細数（デフォルト: 3）')
+    parser.add_argument('--seed', type=int, default=42,
+                        help='合成データのシード。同じシード・規模・対象日であれば同じデータになる（デフォルト: 42）')
+    parser.add_argument('--target-date', type=date.fromisoformat, default=date.today() - timedelta(days=1),
+                        help='処理対象日（デフォルト: 前日）')
+    parser.add_argument('--source-dsn', default=DEFAULT_SOURCE_DSN, help=f'ソースDB（デフォルト: {DEFAULT_SOURCE_DSN}）')
+    parser.add_argument('--target-dsn', default=DEFAULT_TARGET_DSN, help=f'ターゲットDB（デフォルト: {DEFAULT_TARGET_DSN}）')
+    parser.add_argument('--skip-generate', action='store_true', help='合成データを生成せず既存のソースデータを使用する')
+    parser.add_argument('-o', '--output', help='結果を保存するJSONファイルパス')
+    parser.add_argument('--baseline', help='比較するベースラインの結果JSONファイルパス')
+    parser.add_argument('--max-regression', type=float, default=0.2,
+                        help='ベースラインからの許容スループット低下率（デフォルト: 0.2）')
+
+    args = parser.parse_args()
+    if args.customers is None:
+        args.customers = max(1000, args.orders // 20)
+    if args.products is None:
+        args.products = max(100, args.orders // 1000)
+
+    result = run_benchmark(args)
+    print_report(result)
+
+    if args.output:
+        with open(args.output, 'w', encoding='utf-8') as f:
+            json.dump(result, f, ensure_ascii=False, indent=2)
+        print(f'\n結果を保存しました: {args.output}')
+
+    if args.baseline and not compare_with_baseline(result, Path(args.baseline), args.max_regression):
+        sys.exit(1)
+
+
+if __name__ == '__main__':
+    main()
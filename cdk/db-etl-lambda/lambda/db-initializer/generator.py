@@ -0,0 +1,177 @@
+"""
+ソースDB用の合成データ生成（generateモード）
+
+顧客・商品・注文・注文明細をシードから決定的に生成する。同じ設定・シードであれば同じデータになる。
+地域・カテゴリ・注文曜日の分布は設定で変更でき、顧客の注文頻度と商品の人気には偏りを持たせる。
+"""
+import random
+from bisect import bisect
+from datetime import date, timedelta
+from decimal import Decimal
+from itertools import accumulate
+from typing import Any, Dict, Iterator, List, Sequence, Tuple
+
+DEFAULT_CUSTOMERS = 10000
+DEFAULT_PRODUCTS = 1000
+DEFAULT_ORDERS = 100000
+DEFAULT_DAYS = 30
+DEFAULT_SEED = 42
+
+# 地域・カテゴリの出現比率
+DEFAULT_REGION_WEIGHTS = {
+    '東京': 35, '大阪': 20, '名古屋': 12, '福岡': 10, '札幌': 8, '仙台': 6, '広島': 5, '那覇': 4
+}
+DEFAULT_CATEGORY_WEIGHTS = {
+    'Electronics': 30, 'Furniture': 20, 'Appliance': 20, 'Books': 15, 'Food': 15
+}
+
+# 月曜〜日曜の注文数の比率
+DEFAULT_WEEKDAY_WEIGHTS = [10, 10, 10, 11, 13, 18, 16]
+
+# 1注文あたりの明細数（最小, 最大）
+DEFAULT_ITEMS_PER_ORDER = (1, 5)
+
+# カテゴリごとの価格帯（円）
+CATEGORY_PRICE_RANGES = {
+    'Electronics': (1000, 150000),
+    'Furniture': (2000, 80000),
+    'Appliance': (2000, 60000),
+    'Books': (500, 5000),
+    'Food': (200, 3000),
+}
+DEFAULT_PRICE_RANGE = (500, 50000)
+
+ORDER_STATUSES = ('completed', 'shipped', 'pending')
+ORDER_STATUS_CUM_WEIGHTS = (80, 95, 100)
+QUANTITIES = (1, 2, 3, 4, 5)
+QUANTITY_CUM_WEIGHTS = (60, 85, 95, 98, 100)
+
+# 商品人気のZipf分布の指数（大きいほど上位の商品に注文が集中）
+PRODUCT_POPULARITY_EXPONENT = 1.1
+# 顧客の注文頻度のパレート分布の形状（小さいほど一部の顧客に注文が集中）
+CUSTOMER_ACTIVITY_SHAPE = 3.0
+
+
+class SourceDataGenerator:
+    """
+    顧客・商品・注文・注文明細の行（COPYの列順のタプル）を生成
+
+    テーブルごとに独立した乱数列を使うため、例えば注文数だけを変えても顧客・商品は同じになる。
+    """
+    def __init__(self, settings: Dict[str, Any]):
+        self.customers = int(settings.get('customers', DEFAULT_CUSTOMERS))
+        self.products = int(settings.get('products', DEFAULT_PRODUCTS))
+        self.orders = int(settings.get('orders', DEFAULT_ORDERS))
+        self.seed = settings.get('seed', DEFAULT_SEED)
+
+        # 注文日の範囲（end_date のデフォルトは前日。再現性が必要な場合は日付を指定する）
+        end_date = date.fromisoformat(settings['end_date']) if settings.get('end_date') else date.today() - timedelta(days=1)
+        if settings.get('start_date'):
+            start_date = date.fromisoformat(settings['start_date'])
+        else:
+            start_date = end_date - timedelta(days=int(settings.get('days', DEFAULT_DAYS)) - 1)
+        if start_date > end_date:
+            raise ValueError(f"start_date {start_date} is after end_date {end_date}")
+
+        self.items_per_order = tuple(settings.get('items_per_order', DEFAULT_ITEMS_PER_ORDER))
+        if len(self.items_per_order) != 2 or not 1 <= self.items_per_order[0] <= self.items_per_order[1]:
+            raise ValueError(f"items_per_order must be [min, max] with 1 <= min <= max: {self.items_per_order}")
+        if min(self.customers, self.products, self.orders) < 1:
+            raise ValueError("customers, products and orders must be positive")
+
+        self.regions, self.region_cum_weights = _weighted(settings.get('region_weights', DEFAULT_REGION_WEIGHTS))
+        self.categories, self.category_cum_weights = _weighted(settings.get('category_weights', DEFAULT_CATEGORY_WEIGHTS))
+
+        weekday_weights = settings.get('weekday_weights', DEFAULT_WEEKDAY_WEIGHTS)
+        if len(weekday_weights) != 7:
+            raise ValueError("weekday_weights must have 7 values (Monday to Sunday)")
+        dates = [start_date + timedelta(days=offset) for offset in range((end_date - start_date).days + 1)]
+        self.order_dates, self.date_cum_weights = _weighted({day: weekday_weights[day.weekday()] for day in dates})
+
+        self.start_date = start_date
+        self.end_date = end_date
+        self._product_prices: List[Decimal] = []
+
+    def _rng(self, table: str) -> random.Random:
+        """テーブルごとの乱数生成器"""
+        return random.Random(f"{self.seed}:{table}")
+
+    def customer_rows(self) -> Iterator[Tuple]:
+        """(id, name, email, region)"""
+        rng = self._rng('customers')
+        for customer_id in range(1, self.customers + 1):
+            region = rng.choices(self.regions, cum_weights=self.region_cum_weights)[0]
+            yield customer_id, f'顧客{customer_id:08d}', f'customer{customer_id:08d}@example.com', region
+
+    def product_rows(self) -> Iterator[Tuple]:
+        """(id, name, category, price)"""
+        rng = self._rng('products')
+        self._product_prices = []
+        for product_id in range(1, self.products + 1):
+            category = rng.choices(self.categories, cum_weights=self.category_cum_weights)[0]
+            low, high = CATEGORY_PRICE_RANGES.get(category, DEFAULT_PRICE_RANGE)
+            price = Decimal(rng.randrange(low // 10, high // 10 + 1) * 10)
+            self._product_prices.append(price)
+            yield product_id, f'{category}-{product_id:06d}', category, price
+
+    def order_chunks(self, chunk_size: int) -> Iterator[Tuple[List[Tuple], List[Tuple]]]:
+        """
+        注文と注文明細を chunk_size 注文ずつ生成
+
+        注文金額は明細の合計と一致させる。product_rows() を先に読み切っておくこと（明細の単価に使用）
+
+        Yields:
+            (注文の行 [(id, customer_id, order_date, status, total_amount)],
+             明細の行 [(id, order_id, product_id, quantity, unit_price)])
+        """
+        if len(self._product_prices) != self.products:
+            raise RuntimeError("product_rows() must be consumed before generating orders")
+
+        rng = self._rng('orders')
+        customer_cum_weights = self._customer_activity()
+        product_cum_weights = self._product_popularity()
+        min_items, max_items = self.items_per_order
+        item_id = 0
+
+        for chunk_start in range(1, self.orders + 1, chunk_size):
+            orders, items = [], []
+            for order_id in range(chunk_start, min(chunk_start + chunk_size, self.orders + 1)):
+                customer_id = _pick_index(rng, customer_cum_weights) + 1
+                order_date = self.order_dates[_pick_index(rng, self.date_cum_weights)]
+                status = rng.choices(ORDER_STATUSES, cum_weights=ORDER_STATUS_CUM_WEIGHTS)[0]
+
+                total_amount = Decimal(0)
+                for _ in range(rng.randint(min_items, max_items)):
+                    product_id = _pick_index(rng, product_cum_weights) + 1
+                    quantity = rng.choices(QUANTITIES, cum_weights=QUANTITY_CUM_WEIGHTS)[0]
+                    unit_price = self._product_prices[product_id - 1]
+                    item_id += 1
+                    items.append((item_id, order_id, product_id, quantity, unit_price))
+                    total_amount += unit_price * quantity
+
+                orders.append((order_id, customer_id, order_date, status, total_amount))
+            yield orders, items
+
+    def _customer_activity(self) -> List[float]:
+        """顧客ごとの注文頻度の累積重み（パレート分布）"""
+        rng = self._rng('customer_activity')
+        return list(accumulate(rng.paretovariate(CUSTOMER_ACTIVITY_SHAPE) for _ in range(self.customers)))
+
+    def _product_popularity(self) -> List[float]:
+        """商品ごとの人気の累積重み（ランダムな順位に対するZipf分布）"""
+        rng = self._rng('product_popularity')
+        ranks = list(range(1, self.products + 1))
+        rng.shuffle(ranks)
+        return list(accumulate(rank ** -PRODUCT_POPULARITY_EXPONENT for rank in ranks))
+
+
+def _weighted(weights: Dict[Any, float]) -> Tuple[List[Any], List[float]]:
+    """{値: 重み} を値のリストと累積重みに変換"""
+    if not weights or any(weight < 0 for weight in weights.values()) or sum(weights.values()) <= 0:
+        raise ValueError(f"Weights must be non-negative with a positive total: {weights}")
+    return list(weights.keys()), list(accumulate(weights.values()))
+
+
+def _pick_index(rng: random.Random, cum_weights: Sequence[float]) -> int:
+    """累積重みに従ってインデックスを1つ選ぶ（random.choices と同じ方法で、リストを作らない）"""
+    return bisect(cum_weights, rng.random() * cum_weights[-1], 0, len(cum_weights) - 1)
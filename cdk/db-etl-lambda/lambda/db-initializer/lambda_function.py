@@ -1,36 +1,53 @@
 import json
 import os
+import time
 import psycopg2
 from typing import Dict, Any
 from aws_lambda_powertools import Logger, Metrics
 from aws_lambda_powertools.metrics import MetricUnit
 
 # 共通モジュールからインポート
-from etl_common import get_db_credentials, load_sql_file
+from etl_common import get_db_credentials, SqlRegistry, copy_rows
+
+from generator import SourceDataGenerator
 
 # Lambda Powertools設定
 logger = Logger()
 metrics = Metrics()
 
+# SQLテンプレート（コールドスタート時に一括読み込み）
+sql_registry = SqlRegistry(os.path.join(os.path.dirname(os.path.abspath(__file__)), 'sql'))
+
+# 合成データ生成時に1回のCOPYで投入する注文数（明細はその件数分）
+GENERATOR_CHUNK_ORDERS = int(os.environ.get('GENERATOR_CHUNK_ORDERS', '50000'))
+
 @logger.inject_lambda_context
 @metrics.log_metrics(capture_cold_start_metric=True)
 def lambda_handler(event, context):
     """
     手動実行用DB初期化Lambda関数
+    
+    {"mode": "generate", ...} の場合はソースDBに合成データを一括投入する
     """
     try:
-        logger.info("Starting database initialization...")
-        
-        # DB初期化処理
-        result = initialize_databases()
+        if (event or {}).get('mode') == 'generate':
+            logger.info("Starting synthetic data generation...")
+            result = generate_source_data(event)
+            message = 'Synthetic data generation completed successfully'
+        else:
+            logger.info("Starting database initialization...")
+            
+            # DB初期化処理
+            result = initialize_databases()
+            message = 'Database initialization completed successfully'
         
-        logger.info("Database initialization completed successfully", extra={"result": result})
+        logger.info(message, extra={"result": result})
         metrics.add_metric(name="DBInitializationSuccess", unit=MetricUnit.Count, value=1)
         
         return {
             'statusCode': 200,
             'body': json.dumps({
-                'message': 'Database initialization completed successfully',
+                'message': message,
                 'result': result
             })
         }
@@ -89,7 +106,7 @@ def initialize_source_db() -> Dict[str, Any]:
         cursor = conn.cursor()
         
         # テーブル作成SQL
-        create_tables_sql = load_sql_file('create_source_tables.sql')
+        create_tables_sql = sql_registry.get('create_source_tables.sql')
         
         # テーブル作成実行
         cursor.execute(create_tables_sql)
@@ -108,7 +125,7 @@ def initialize_source_db() -> Dict[str, Any]:
         conn.commit()
         
         # 作成されたテーブル数確認
-        cursor.execute(load_sql_file('count_tables.sql'))
+        cursor.execute(sql_registry.get('count_tables.sql'))
         table_count = cursor.fetchone()[0]
         
         return {
@@ -126,7 +143,7 @@ def insert_sample_data(cursor):
     サンプルデータの挿入
     """
     # SQLファイルから読み込んで実行
-    cursor.execute(load_sql_file('insert_source_sample_data.sql'))
+    cursor.execute(sql_registry.get('insert_source_sample_data.sql'))
 
 def initialize_target_db() -> Dict[str, Any]:
     """
@@ -152,10 +169,10 @@ def initialize_target_db() -> Dict[str, Any]:
         cursor = conn.cursor()
         
         # テーブル作成SQL
-        create_tables_sql = load_sql_file('create_target_tables.sql')
+        create_tables_sql = sql_registry.get('create_target_tables.sql')
         
         # ビュー作成SQL
-        create_views_sql = load_sql_file('create_target_views.sql')
+        create_views_sql = sql_registry.get('create_target_views.sql')
         
         # テーブル作成実行
         cursor.execute(create_tables_sql)
@@ -166,20 +183,93 @@ def initialize_target_db() -> Dict[str, Any]:
         conn.commit()
         
         # 作成されたテーブル数確認
-        cursor.execute(load_sql_file('count_tables.sql'))
+        cursor.execute(sql_registry.get('count_tables.sql'))
         table_count = cursor.fetchone()[0]
         
         # 作成されたビュー数確認
-        cursor.execute(load_sql_file('count_views.sql'))
+        cursor.execute(sql_registry.get('count_views.sql'))
         view_count = cursor.fetchone()[0]
         
+        # 作成されたマテリアライズドビュー数確認
+        cursor.execute(sql_registry.get('count_materialized_views.sql'))
+        materialized_view_count = cursor.fetchone()[0]
+        
         return {
             'status': 'success',
             'tables_created': table_count,
-            'views_created': view_count
+            'views_created': view_count,
+            'materialized_views_created': materialized_view_count
         }
         
     finally:
         cursor.close()
         conn.close()
 
+def generate_source_data(event: Dict[str, Any]) -> Dict[str, Any]:
+    """
+    ソースDBに合成データを生成してCOPYで一括投入
+    
+    既存のソースデータは削除して置き換える（データがある場合は "replace": true が必要）。
+    全テーブルを1つのトランザクションで投入するため、失敗時は元のデータが残る。
+    """
+    generator = SourceDataGenerator(event)
+    
+    host = os.environ['SOURCE_DB_HOST']
+    database = os.environ['SOURCE_DB_NAME']
+    secret_arn = os.environ['SOURCE_DB_SECRET_ARN']
+    
+    user, password = get_db_credentials(secret_arn)
+    
+    conn = psycopg2.connect(
+        host=host,
+        database=database,
+        user=user,
+        password=password,
+        port=5432
+    )
+    
+    start_time = time.time()
+    try:
+        with conn.cursor() as cursor:
+            cursor.execute(sql_registry.get('create_source_tables.sql'))
+            
+            cursor.execute("SELECT COUNT(*) FROM customers")
+            if cursor.fetchone()[0] > 0 and not event.get('replace'):
+                raise ValueError("Source database already has data. Set \"replace\": true to overwrite it")
+            
+            cursor.execute(sql_registry.get('truncate_source_tables.sql'))
+            
+            counts = {
+                'customers': copy_rows(cursor, 'customers', ('id', 'name', 'email', 'region'), generator.customer_rows()),
+                'products': copy_rows(cursor, 'products', ('id', 'name', 'category', 'price'), generator.product_rows()),
+                'orders': 0,
+                'order_items': 0,
+            }
+            for orders, items in generator.order_chunks(GENERATOR_CHUNK_ORDERS):
+                counts['orders'] += copy_rows(
+                    cursor, 'orders', ('id', 'customer_id', 'order_date', 'status', 'total_amount'), orders
+                )
+                counts['order_items'] += copy_rows(
+                    cursor, 'order_items', ('id', 'order_id', 'product_id', 'quantity', 'unit_price'), items
+                )
+                logger.info(f"Generated {counts['orders']} of {generator.orders} orders")
+            
+            cursor.execute(sql_registry.get('reset_source_sequences.sql'))
+            cursor.execute(sql_registry.get('analyze_source_tables.sql'))
+            conn.commit()
+        
+    finally:
+        conn.close()
+    
+    generation_time = time.time() - start_time
+    metrics.add_metric(name="DataGenerationTime", unit=MetricUnit.Seconds, value=generation_time)
+    metrics.add_metric(name="GeneratedRows", unit=MetricUnit.Count, value=sum(counts.values()))
+    
+    return {
+        'status': 'success',
+        'seed': generator.seed,
+        'start_date': generator.start_date.isoformat(),
+        'end_date': generator.end_date.isoformat(),
+        'rows': counts,
+        'generation_time': round(generation_time, 3)
+    }
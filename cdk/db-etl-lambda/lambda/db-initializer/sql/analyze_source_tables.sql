@@ -0,0 +1,2 @@
+-- 一括投入後に統計情報を更新
+ANALYZE customers, products, orders, order_items
\ No newline at end of file
@@ -0,0 +1,3 @@
+-- 作成されたマテリアライズドビュー数を確認
+SELECT COUNT(*) FROM pg_matviews 
+WHERE schemaname = 'public'
\ No newline at end of file
@@ -41,6 +41,65 @@ CREATE TABLE IF NOT EXISTS order_items (
 
 -- インデックス作成
 CREATE INDEX IF NOT EXISTS idx_orders_customer_id ON orders(customer_id);
-CREATE INDEX IF NOT EXISTS idx_orders_order_date ON orders(order_date);
-CREATE INDEX IF NOT EXISTS idx_order_items_order_id ON order_items(order_id);
-CREATE INDEX IF NOT EXISTS idx_order_items_product_id ON order_items(product_id);
\ No newline at end of file
+CREATE INDEX IF NOT EXISTS idx_order_items_product_id ON order_items(product_id);
+CREATE INDEX IF NOT EXISTS idx_orders_updated_at_id ON orders(updated_at, id);
+
+-- 抽出クエリ用のカバリングインデックス（対象日の注文と明細をテーブルを読まずにインデックスのみで取得）
+CREATE INDEX IF NOT EXISTS idx_orders_order_date_covering
+    ON orders(order_date) INCLUDE (id, customer_id, total_amount);
+CREATE INDEX IF NOT EXISTS idx_order_items_order_id_covering
+    ON order_items(order_id) INCLUDE (product_id, quantity, unit_price);
+
+-- カバリングインデックスと先頭列が同じ単一列インデックスは不要
+DROP INDEX IF EXISTS idx_orders_order_date;
+DROP INDEX IF EXISTS idx_order_items_order_id;
+
+-- 注文更新時に updated_at を更新（増分抽出のウォーターマークに使用）
+-- CURRENT_TIMESTAMP はトランザクションの開始時刻のため、INCREMENTAL_LAG_SECONDS より長いトランザクションの更新は
+-- コミット前にウォーターマークを追い越され、増分抽出で検知されないことがある
+CREATE OR REPLACE FUNCTION set_updated_at() RETURNS TRIGGER AS $$
+BEGIN
+    NEW.updated_at = CURRENT_TIMESTAMP;
+    RETURN NEW;
+END;
+$$ LANGUAGE plpgsql;
+
+DROP TRIGGER IF EXISTS trg_orders_updated_at ON orders;
+CREATE TRIGGER trg_orders_updated_at
+    BEFORE UPDATE ON orders
+    FOR EACH ROW EXECUTE FUNCTION set_updated_at();
+-- 注文明細の追加・変更・削除時に親の注文の updated_at を更新（明細のみの変更も増分抽出の対象にする）
+-- 文単位のトリガーで、変更された明細の注文をまとめて1回だけ更新する
+CREATE OR REPLACE FUNCTION touch_orders_from_items() RETURNS TRIGGER AS $$
+BEGIN
+    IF TG_OP IN ('INSERT', 'UPDATE') THEN
+        UPDATE orders SET updated_at = CURRENT_TIMESTAMP
+        WHERE id IN (SELECT order_id FROM new_items)
+          AND updated_at IS DISTINCT FROM CURRENT_TIMESTAMP;
+    END IF;
+    IF TG_OP IN ('UPDATE', 'DELETE') THEN
+        UPDATE orders SET updated_at = CURRENT_TIMESTAMP
+        WHERE id IN (SELECT order_id FROM old_items)
+          AND updated_at IS DISTINCT FROM CURRENT_TIMESTAMP;
+    END IF;
+    RETURN NULL;
+END;
+$$ LANGUAGE plpgsql;
+
+DROP TRIGGER IF EXISTS trg_order_items_insert_touch_orders ON order_items;
+CREATE TRIGGER trg_order_items_insert_touch_orders
+    AFTER INSERT ON order_items
+    REFERENCING NEW TABLE AS new_items
+    FOR EACH STATEMENT EXECUTE FUNCTION touch_orders_from_items();
+
+DROP TRIGGER IF EXISTS trg_order_items_update_touch_orders ON order_items;
+CREATE TRIGGER trg_order_items_update_touch_orders
+    AFTER UPDATE ON order_items
+    REFERENCING OLD TABLE AS old_items NEW TABLE AS new_items
+    FOR EACH STATEMENT EXECUTE FUNCTION touch_orders_from_items();
+
+DROP TRIGGER IF EXISTS trg_order_items_delete_touch_orders ON order_items;
+CREATE TRIGGER trg_order_items_delete_touch_orders
+    AFTER DELETE ON order_items
+    REFERENCING OLD TABLE AS old_items
+    FOR EACH STATEMENT EXECUTE FUNCTION touch_orders_from_items();
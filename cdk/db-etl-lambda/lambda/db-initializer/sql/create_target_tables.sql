@@ -6,6 +6,7 @@ CREATE TABLE IF NOT EXISTS customer_analytics (
     avg_order_value DECIMAL(15,2) NOT NULL DEFAULT 0,
     last_order_date DATE,
     region VARCHAR(50) NOT NULL,
+    row_hash CHAR(32),
     created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
     updated_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP
 );
@@ -18,6 +19,7 @@ CREATE TABLE IF NOT EXISTS product_sales_summary (
     total_revenue DECIMAL(15,2) NOT NULL DEFAULT 0,
     order_count INTEGER NOT NULL DEFAULT 0,
     date DATE NOT NULL,
+    row_hash CHAR(32),
     created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
     updated_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
     PRIMARY KEY (product_id, date)
@@ -30,11 +32,48 @@ CREATE TABLE IF NOT EXISTS daily_sales_summary (
     total_revenue DECIMAL(15,2) NOT NULL DEFAULT 0,
     unique_customers INTEGER NOT NULL DEFAULT 0,
     region VARCHAR(50) NOT NULL,
+    row_hash CHAR(32),
     created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
     updated_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
     PRIMARY KEY (date, region)
 );
 
+-- 週次売上ロールアップ（日次売上サマリから変更があった週のみロード時に再集計）
+CREATE TABLE IF NOT EXISTS weekly_sales_rollup (
+    week_start DATE PRIMARY KEY,
+    weekly_orders BIGINT NOT NULL DEFAULT 0,
+    weekly_revenue DECIMAL(17,2) NOT NULL DEFAULT 0,
+    weekly_unique_customers BIGINT NOT NULL DEFAULT 0,
+    active_regions INTEGER NOT NULL DEFAULT 0,
+    updated_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP
+);
+
+-- 月次売上ロールアップ（日次売上サマリから変更があった月のみロード時に再集計）
+CREATE TABLE IF NOT EXISTS monthly_sales_rollup (
+    month_start DATE PRIMARY KEY,
+    monthly_orders BIGINT NOT NULL DEFAULT 0,
+    monthly_revenue DECIMAL(17,2) NOT NULL DEFAULT 0,
+    monthly_unique_customers BIGINT NOT NULL DEFAULT 0,
+    avg_monthly_order_value DECIMAL(15,2),
+    updated_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP
+);
+
+-- ロード済みS3オブジェクトの台帳（同じオブジェクトの再配信・再試行時にロードをスキップ）
+CREATE TABLE IF NOT EXISTS etl_load_ledger (
+    bucket VARCHAR(63) NOT NULL,
+    object_key VARCHAR(1024) NOT NULL,
+    etag VARCHAR(64) NOT NULL,
+    version_id VARCHAR(1024) NOT NULL DEFAULT '',
+    record_counts JSONB,
+    loaded_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
+    PRIMARY KEY (bucket, object_key, etag, version_id)
+);
+
+-- 既存のテーブルに行ハッシュ列を追加
+ALTER TABLE customer_analytics ADD COLUMN IF NOT EXISTS row_hash CHAR(32);
+ALTER TABLE product_sales_summary ADD COLUMN IF NOT EXISTS row_hash CHAR(32);
+ALTER TABLE daily_sales_summary ADD COLUMN IF NOT EXISTS row_hash CHAR(32);
+
 -- インデックス作成
 CREATE INDEX IF NOT EXISTS idx_customer_analytics_region ON customer_analytics(region);
 CREATE INDEX IF NOT EXISTS idx_customer_analytics_total_amount ON customer_analytics(total_amount DESC);
@@ -42,4 +81,28 @@ CREATE INDEX IF NOT EXISTS idx_product_sales_summary_date ON product_sales_summa
 CREATE INDEX IF NOT EXISTS idx_product_sales_summary_category ON product_sales_summary(category);
 CREATE INDEX IF NOT EXISTS idx_product_sales_summary_revenue ON product_sales_summary(total_revenue DESC);
 CREATE INDEX IF NOT EXISTS idx_daily_sales_summary_date ON daily_sales_summary(date);
-CREATE INDEX IF NOT EXISTS idx_daily_sales_summary_region ON daily_sales_summary(region);
\ No newline at end of file
+CREATE INDEX IF NOT EXISTS idx_daily_sales_summary_region ON daily_sales_summary(region);
+CREATE INDEX IF NOT EXISTS idx_etl_load_ledger_loaded_at ON etl_load_ledger(loaded_at);
+
+-- 行の内容（キー・集計値）のハッシュを設定（UPSERTで内容が変わらない行の更新をスキップするために使用）
+CREATE OR REPLACE FUNCTION set_row_hash() RETURNS TRIGGER AS $$
+BEGIN
+    NEW.row_hash = md5((to_jsonb(NEW) - 'row_hash' - 'created_at' - 'updated_at')::text);
+    RETURN NEW;
+END;
+$$ LANGUAGE plpgsql;
+
+DROP TRIGGER IF EXISTS trg_customer_analytics_row_hash ON customer_analytics;
+CREATE TRIGGER trg_customer_analytics_row_hash
+    BEFORE INSERT OR UPDATE ON customer_analytics
+    FOR EACH ROW EXECUTE FUNCTION set_row_hash();
+
+DROP TRIGGER IF EXISTS trg_product_sales_summary_row_hash ON product_sales_summary;
+CREATE TRIGGER trg_product_sales_summary_row_hash
+    BEFORE INSERT OR UPDATE ON product_sales_summary
+    FOR EACH ROW EXECUTE FUNCTION set_row_hash();
+
+DROP TRIGGER IF EXISTS trg_daily_sales_summary_row_hash ON daily_sales_summary;
+CREATE TRIGGER trg_daily_sales_summary_row_hash
+    BEFORE INSERT OR UPDATE ON daily_sales_summary
+    FOR EACH ROW EXECUTE FUNCTION set_row_hash();
\ No newline at end of file
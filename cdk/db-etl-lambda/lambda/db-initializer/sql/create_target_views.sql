@@ -59,4 +59,64 @@ SELECT
     AVG(total_revenue / NULLIF(total_orders, 0)) as avg_monthly_order_value
 FROM daily_sales_summary
 GROUP BY DATE_TRUNC('month', date)
-ORDER BY month_start;
\ No newline at end of file
+ORDER BY month_start;
+
+-- 顧客ランキングのマテリアライズドビュー（ロード後にCONCURRENTLYでリフレッシュ）
+CREATE MATERIALIZED VIEW IF NOT EXISTS mv_top_customers AS
+SELECT * FROM top_customers;
+
+-- 商品カテゴリ別売上のマテリアライズドビュー（ロード後にCONCURRENTLYでリフレッシュ）
+CREATE MATERIALIZED VIEW IF NOT EXISTS mv_category_performance AS
+SELECT * FROM category_performance;
+
+-- REFRESH MATERIALIZED VIEW CONCURRENTLY に必要な一意インデックス
+CREATE UNIQUE INDEX IF NOT EXISTS idx_mv_top_customers_customer_id ON mv_top_customers(customer_id);
+CREATE UNIQUE INDEX IF NOT EXISTS idx_mv_category_performance_category ON mv_category_performance(category);
+CREATE INDEX IF NOT EXISTS idx_mv_top_customers_revenue_rank ON mv_top_customers(revenue_rank);
+
+-- 既存の日次売上サマリから週次・月次ロールアップを作成（以降はロード時に変更があった期間のみ再集計）
+-- 再実行時は既存の行を日次売上サマリの内容で置き換える。並行するロードの再集計と同じ
+-- 週・月ごとのアドバイザリロック（lock_sales_rollup_periods.sql と同じキー・順序）を取得してから集計する
+SELECT pg_advisory_xact_lock(hashtext(period))
+FROM (
+    SELECT 'weekly:' || DATE_TRUNC('week', date)::date AS period
+    FROM daily_sales_summary
+    UNION
+    SELECT 'monthly:' || DATE_TRUNC('month', date)::date
+    FROM daily_sales_summary
+) AS periods
+ORDER BY period;
+
+INSERT INTO weekly_sales_rollup (week_start, weekly_orders, weekly_revenue, weekly_unique_customers, active_regions)
+SELECT
+    DATE_TRUNC('week', date)::date,
+    SUM(total_orders),
+    SUM(total_revenue),
+    SUM(unique_customers),
+    COUNT(DISTINCT region)
+FROM daily_sales_summary
+GROUP BY DATE_TRUNC('week', date)
+ON CONFLICT (week_start)
+DO UPDATE SET
+    weekly_orders = EXCLUDED.weekly_orders,
+    weekly_revenue = EXCLUDED.weekly_revenue,
+    weekly_unique_customers = EXCLUDED.weekly_unique_customers,
+    active_regions = EXCLUDED.active_regions,
+    updated_at = CURRENT_TIMESTAMP;
+
+INSERT INTO monthly_sales_rollup (month_start, monthly_orders, monthly_revenue, monthly_unique_customers, avg_monthly_order_value)
+SELECT
+    DATE_TRUNC('month', date)::date,
+    SUM(total_orders),
+    SUM(total_revenue),
+    SUM(unique_customers),
+    AVG(total_revenue / NULLIF(total_orders, 0))
+FROM daily_sales_summary
+GROUP BY DATE_TRUNC('month', date)
+ON CONFLICT (month_start)
+DO UPDATE SET
+    monthly_orders = EXCLUDED.monthly_orders,
+    monthly_revenue = EXCLUDED.monthly_revenue,
+    monthly_unique_customers = EXCLUDED.monthly_unique_customers,
+    avg_monthly_order_value = EXCLUDED.avg_monthly_order_value,
+    updated_at = CURRENT_TIMESTAMP;
\ No newline at end of file
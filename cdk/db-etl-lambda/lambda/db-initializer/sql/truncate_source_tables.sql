@@ -0,0 +1,2 @@
+-- 合成データ生成の前にソースデータを削除（IDの採番もリセット）
+TRUNCATE order_items, orders, products, customers RESTART IDENTITY CASCADE
\ No newline at end of file
@@ -0,0 +1,82 @@
+"""
+抽出クエリの実行計画の診断（diagnosticsモード）
+
+EXPLAIN (ANALYZE, BUFFERS, FORMAT JSON) の結果から大きなテーブルのシーケンシャルスキャンを検出し、
+db-initializerが作成する推奨インデックスの有無を確認する。
+"""
+from typing import Any, Dict, Iterator, List, Set
+
+# db-initializerの create_source_tables.sql で作成する推奨インデックス（インデックス名 -> 用途）
+RECOMMENDED_INDEXES = {
+    'idx_orders_order_date_covering': '対象日の注文をインデックスのみで取得（customer_analytics / daily_sales / product_sales）',
+    'idx_order_items_order_id_covering': '対象日の注文の明細をインデックスのみで取得（product_sales / raw_order_lines）',
+    'idx_orders_updated_at_id': '増分抽出のウォーターマーク以降の注文を取得',
+}
+
+# 全行を出力するため、シーケンシャルスキャンが妥当な (クエリ, テーブル)
+EXPECTED_FULL_SCANS = {
+    ('customer_analytics.sql', 'customers'),
+    ('product_sales.sql', 'products'),
+    ('raw_customers.sql', 'customers'),
+    ('raw_products.sql', 'products'),
+}
+
+
+def explain_query(cursor, query: str, params: List[Any]) -> Dict[str, Any]:
+    """クエリを EXPLAIN (ANALYZE, BUFFERS, FORMAT JSON) で実行し、計画（JSONの先頭要素）を返す"""
+    cursor.execute(f"EXPLAIN (ANALYZE, BUFFERS, FORMAT JSON)\n{query}", params)
+    return cursor.fetchone()[0][0]
+
+
+def iter_plan_nodes(node: Dict[str, Any]) -> Iterator[Dict[str, Any]]:
+    """計画ノードを深さ優先で列挙"""
+    yield node
+    for child in node.get('Plans', []):
+        yield from iter_plan_nodes(child)
+
+
+def find_seq_scans(sql_file: str, plan: Dict[str, Any], table_rows: Dict[str, int],
+                   min_rows: int) -> List[Dict[str, Any]]:
+    """
+    推定行数が min_rows 以上のテーブルに対するシーケンシャルスキャンを検出
+
+    全行を出力するクエリの駆動表（EXPECTED_FULL_SCANS）は expected=True とする
+    """
+    findings = []
+    for node in iter_plan_nodes(plan['Plan']):
+        if node['Node Type'] != 'Seq Scan':
+            continue
+        relation = node['Relation Name']
+        if table_rows.get(relation, 0) < min_rows:
+            continue
+        loops = node.get('Actual Loops', 1)
+        findings.append({
+            'relation': relation,
+            'table_rows': table_rows[relation],
+            'actual_rows': node.get('Actual Rows', 0) * loops,
+            'rows_removed_by_filter': node.get('Rows Removed by Filter', 0) * loops,
+            'filter': node.get('Filter'),
+            'parallel': node.get('Parallel Aware', False),
+            'expected': (sql_file, relation) in EXPECTED_FULL_SCANS,
+        })
+    return findings
+
+
+def summarize_plan(sql_file: str, plan: Dict[str, Any], seq_scans: List[Dict[str, Any]]) -> Dict[str, Any]:
+    """計画の要約（実行時間・バッファ・検出したシーケンシャルスキャン）"""
+    root = plan['Plan']
+    return {
+        'sql_file': sql_file,
+        'planning_time_ms': plan.get('Planning Time'),
+        'execution_time_ms': plan.get('Execution Time'),
+        'actual_rows': root.get('Actual Rows'),
+        'shared_hit_blocks': root.get('Shared Hit Blocks'),
+        'shared_read_blocks': root.get('Shared Read Blocks'),
+        'temp_written_blocks': root.get('Temp Written Blocks'),
+        'seq_scans': seq_scans,
+    }
+
+
+def missing_indexes(existing_indexes: Set[str]) -> Dict[str, str]:
+    """推奨インデックスのうちソースDBに存在しないもの"""
+    return {name: purpose for name, purpose in RECOMMENDED_INDEXES.items() if name not in existing_indexes}
@@ -1,8 +1,11 @@
 import json
 import os
+import threading
 import pandas as pd
-from datetime import datetime, timedelta
-from typing import Dict, Any
+from concurrent.futures import FIRST_COMPLETED, ThreadPoolExecutor, wait
+from functools import partial
+from datetime import date, datetime, timedelta
+from typing import Dict, Any, Iterator, List, Tuple
 from aws_lambda_powertools import Logger, Metrics
 from aws_lambda_powertools.metrics import MetricUnit
 from aws_lambda_powertools.logging import correlation_paths
@@ -10,15 +13,83 @@ import time
 import boto3
 
 # 共通モジュールからインポート
-from etl_common import get_db_credentials, ConnectionPool, load_sql_file
+from etl_common import ConnectionPool, SqlRegistry, S3MultipartWriter, S3StateStore, MANIFEST_FILE_NAME
+from writers import JsonDocumentWriter, ParquetDatasetWriter, PartWriter
+from parallel import BackgroundBatches, run_timed
+from transform import transform_datasets
+from diagnostics import explain_query, find_seq_scans, missing_indexes, summarize_plan
 
 # Lambda Powertools設定
 logger = Logger()
 metrics = Metrics()
 
+# クライアント初期化
+s3_client = boto3.client('s3')
+
 # グローバル接続プール
 db_pool = ConnectionPool()
 
+# SQLテンプレート（コールドスタート時に一括読み込み）
+sql_registry = SqlRegistry(os.path.join(os.path.dirname(os.path.abspath(__file__)), 'sql'))
+
+# 抽出モード（batch: DataFrameで一括取得 / streaming: サーバーサイドカーソルでバッチ取得）
+EXTRACT_MODE = os.environ.get('EXTRACT_MODE', 'batch')
+EXTRACT_BATCH_SIZE = int(os.environ.get('EXTRACT_BATCH_SIZE', '10000'))
+
+# 抽出クエリを別々の接続で並列実行するか（streamingモードでの先読みバッチ数）
+EXTRACT_PARALLEL = os.environ.get('EXTRACT_PARALLEL', 'false').lower() == 'true'
+EXTRACT_PREFETCH_BATCHES = int(os.environ.get('EXTRACT_PREFETCH_BATCHES', '2'))
+
+# 集計方式（sql: データセットごとのSQLで集計 / pandas: 生データを1度だけ取得してDataFrameで集計）
+TRANSFORM_ENGINE = os.environ.get('TRANSFORM_ENGINE', 'sql')
+
+# 出力形式（json: transformed_data.json / parquet: データセットごとのParquetファイル）
+OUTPUT_FORMAT = os.environ.get('OUTPUT_FORMAT', 'json')
+
+# 出力レイアウト（single: 従来の1ファイル / partitioned: データセット・N行ごとのパート + マニフェスト）
+OUTPUT_LAYOUT = os.environ.get('OUTPUT_LAYOUT', 'single')
+OUTPUT_PART_ROWS = int(os.environ.get('OUTPUT_PART_ROWS', '100000'))
+
+# batchモードで抽出クエリを接続ごとのプリペアドステートメントとして実行するか
+SQL_PREPARE = os.environ.get('SQL_PREPARE', 'false').lower() == 'true'
+PARQUET_CONTENT_TYPE = 'application/vnd.apache.parquet'
+
+# 抽出対象データセット（出力キー, SQLファイル名）
+EXTRACT_DATASETS = [
+    ('customer_analytics', 'customer_analytics.sql'),
+    ('product_sales_summary', 'product_sales.sql'),
+    ('daily_sales_summary', 'daily_sales.sql'),
+]
+
+# 増分モードの抽出対象データセット（出力キー, SQLファイル名）
+INCREMENTAL_DATASETS = [
+    ('customer_analytics', 'incremental_customer_analytics.sql'),
+    ('product_sales_summary', 'incremental_product_sales.sql'),
+    ('daily_sales_summary', 'incremental_daily_sales.sql'),
+]
+
+# バックフィルで同時に処理するパーティション（日）数と、チェックポイントの保存先プレフィックス
+BACKFILL_CONCURRENCY = int(os.environ.get('BACKFILL_CONCURRENCY', '2'))
+BACKFILL_STATE_PREFIX = os.environ.get('BACKFILL_STATE_PREFIX', 'etl-state/backfill/')
+
+# 残り実行時間がこの秒数を下回ったら新しいパーティションを開始しない
+BACKFILL_MIN_REMAINING_SECONDS = int(os.environ.get('BACKFILL_MIN_REMAINING_SECONDS', '120'))
+
+# 診断モードでEXPLAIN ANALYZEするクエリ（日次抽出とpandas集計用の生データ取得）
+DIAGNOSTIC_QUERIES = [sql_file for _, sql_file in EXTRACT_DATASETS] + [
+    'raw_customers.sql', 'raw_products.sql', 'raw_order_lines.sql'
+]
+
+# 診断結果の保存先プレフィックスと、シーケンシャルスキャンを検出するテーブルの最小推定行数
+DIAGNOSTICS_PREFIX = os.environ.get('DIAGNOSTICS_PREFIX', 'etl-diagnostics/')
+DIAGNOSTICS_SEQ_SCAN_MIN_ROWS = int(os.environ.get('DIAGNOSTICS_SEQ_SCAN_MIN_ROWS', '100000'))
+
+# 増分モードのウォーターマーク保存先（S3_BUCKET内のキー）
+INCREMENTAL_STATE_KEY = os.environ.get('INCREMENTAL_STATE_KEY', 'etl-state/incremental_watermark.json')
+
+# 直近この秒数以内に更新された注文は次回の実行で抽出する（実行中のトランザクションの取りこぼし防止）
+INCREMENTAL_LAG_SECONDS = int(os.environ.get('INCREMENTAL_LAG_SECONDS', '60'))
+
 @logger.inject_lambda_context(correlation_id_path=correlation_paths.EVENT_BRIDGE)
 @metrics.log_metrics(capture_cold_start_metric=True)
 def lambda_handler(event, context):
@@ -32,30 +103,49 @@ def lambda_handler(event, context):
         secret_arn = os.environ['SOURCE_DB_SECRET_ARN']
         s3_bucket = os.environ['S3_BUCKET']
         
-        # Secrets Managerから認証情報を取得
-        source_db_user, source_db_password = get_db_credentials(secret_arn)
+        # 増分モード（前回のウォーターマーク以降に更新された注文の差分のみ抽出）
+        if event.get('mode') == 'incremental':
+            return run_incremental_extract(source_db_host, source_db_name, secret_arn, s3_bucket)
         
-        # 処理対象日の設定（前日）
-        target_date = datetime.now().date() - timedelta(days=1)
+        # バックフィルモード（指定期間を日単位のパーティションに分割して再処理）
+        if event.get('mode') == 'backfill':
+            return run_backfill(event, context, source_db_host, source_db_name, secret_arn, s3_bucket)
+        
+        # 処理対象日の設定（イベントで指定がなければ前日）
+        if event.get('target_date'):
+            target_date = date.fromisoformat(event['target_date'])
+        else:
+            target_date = datetime.now().date() - timedelta(days=1)
         logger.info(f"Processing data for date: {target_date}")
         
+        # 診断モード（抽出クエリの実行計画を取得してS3に保存）
+        if event.get('mode') == 'diagnostics':
+            return run_diagnostics(target_date, source_db_host, source_db_name, secret_arn, s3_bucket)
+        
         # DB接続とETL処理
-        with db_pool.get_connection(source_db_host, source_db_name, source_db_user, source_db_password) as conn:
-            # ETL処理を実行
-            start_time = time.time()
-            extracted_data = extract_transform_data(conn, target_date)
-            extraction_time = time.time() - start_time
-            
-            # メトリクスを記録
-            metrics.add_metric(name="ExtractionTime", unit=MetricUnit.Seconds, value=extraction_time)
-            metrics.add_metric(name="RecordsExtracted", unit=MetricUnit.Count, value=len(extracted_data))
+        start_time = time.time()
+        if EXTRACT_PARALLEL and TRANSFORM_ENGINE == 'sql':
+            # クエリごとにプールから別々の接続を取得して並列実行
+            connection_factory = partial(db_pool.get_connection_for_secret, source_db_host, source_db_name, secret_arn)
+            s3_keys, record_counts = extract_parallel_to_s3(connection_factory, target_date, s3_bucket)
+        else:
+            # 認証情報はSecrets Managerから取得（キャッシュ済みの値を再利用）
+            with db_pool.get_connection_for_secret(source_db_host, source_db_name, secret_arn) as conn:
+                s3_keys, record_counts = extract_to_s3(conn, target_date, s3_bucket)
+        extraction_time = time.time() - start_time
+        records_processed = sum(record_counts.values())
         
-        # S3に保存
-        s3_key = save_to_s3(extracted_data, s3_bucket, target_date)
+        # メトリクスを記録
+        metrics.add_metric(name="ExtractionTime", unit=MetricUnit.Seconds, value=extraction_time)
+        metrics.add_metric(name="RecordsExtracted", unit=MetricUnit.Count, value=records_processed)
         
         logger.info(f"ETL completed successfully for {target_date}", extra={
-            "s3_key": s3_key,
-            "records_processed": len(extracted_data),
+            "s3_keys": s3_keys,
+            "extract_mode": EXTRACT_MODE,
+            "output_format": OUTPUT_FORMAT,
+            "parallel": EXTRACT_PARALLEL,
+            "transform_engine": TRANSFORM_ENGINE,
+            "records_processed": records_processed,
             "extraction_time": extraction_time
         })
         
@@ -63,9 +153,9 @@ def lambda_handler(event, context):
             'statusCode': 200,
             'body': json.dumps({
                 'message': 'ETL extract-transform completed successfully',
-                's3_key': s3_key,
+                's3_keys': s3_keys,
                 'processed_date': str(target_date),
-                'records_processed': len(extracted_data)
+                'records_processed': records_processed
             })
         }
         
@@ -78,50 +168,633 @@ def lambda_handler(event, context):
             })
         }
 
+def run_incremental_extract(source_db_host: str, source_db_name: str, secret_arn: str,
+                            bucket: str) -> Dict[str, Any]:
+    """
+    前回のウォーターマーク（orders.updated_at, orders.id）以降に更新された注文の影響範囲のみを抽出してS3に保存
+    
+    ウォーターマークの取得と差分クエリは同一スナップショット（REPEATABLE READ）で実行し、
+    S3への書き出しが成功した後にウォーターマークを進める。
+    """
+    state_store = S3StateStore(bucket, INCREMENTAL_STATE_KEY, s3_client=s3_client)
+    low_watermark = load_watermark(state_store)
+    logger.info("Starting incremental extraction", extra={"low_watermark": [str(v) for v in low_watermark]})
+    
+    start_time = time.time()
+    with db_pool.get_connection_for_secret(source_db_host, source_db_name, secret_arn) as conn:
+        try:
+            with conn.cursor() as cursor:
+                cursor.execute("SET TRANSACTION ISOLATION LEVEL REPEATABLE READ")
+                cursor.execute(
+                    sql_registry.get('incremental_high_watermark.sql'),
+                    [*low_watermark, INCREMENTAL_LAG_SECONDS]
+                )
+                high_watermark = cursor.fetchone()
+            
+            if high_watermark is None:
+                logger.info("No orders changed since last watermark")
+                s3_keys, record_counts = [], {}
+            else:
+                params = [*low_watermark, *high_watermark]
+                dataset_batches = (
+                    (dataset_name, iter_query_batches(conn, sql_registry.get(sql_file), params, f"extract_{dataset_name}"))
+                    for dataset_name, sql_file in INCREMENTAL_DATASETS
+                )
+                partition = f"incremental/{high_watermark[0]:%Y-%m-%dT%H%M%S}-{high_watermark[1]}"
+                s3_keys, record_counts = write_batches_to_s3(dataset_batches, partition, bucket)
+        finally:
+            conn.rollback()
+    
+    if high_watermark is not None:
+        state_store.save({'updated_at': high_watermark[0].isoformat(), 'id': high_watermark[1]})
+    
+    extraction_time = time.time() - start_time
+    records_processed = sum(record_counts.values())
+    metrics.add_metric(name="ExtractionTime", unit=MetricUnit.Seconds, value=extraction_time)
+    metrics.add_metric(name="RecordsExtracted", unit=MetricUnit.Count, value=records_processed)
+    
+    logger.info("Incremental ETL completed successfully", extra={
+        "s3_keys": s3_keys,
+        "high_watermark": [str(v) for v in high_watermark] if high_watermark else None,
+        "records_processed": records_processed,
+        "extraction_time": extraction_time
+    })
+    
+    return {
+        'statusCode': 200,
+        'body': json.dumps({
+            'message': 'ETL incremental extract completed successfully',
+            's3_keys': s3_keys,
+            'watermark': {'updated_at': str(high_watermark[0]), 'id': high_watermark[1]} if high_watermark else None,
+            'records_processed': records_processed
+        })
+    }
+
+def run_backfill(event: Dict[str, Any], context, source_db_host: str, source_db_name: str, secret_arn: str,
+                 bucket: str) -> Dict[str, Any]:
+    """
+    指定期間（start_date〜end_date、両端を含む）を日単位のパーティションに分割し、並列に抽出してS3に保存
+    
+    各パーティションは etl-data/YYYY-MM-DD/ に出力される。完了したパーティションはチェックポイントとして
+    S3に記録し、同じ期間で再実行すると未完了のパーティションのみを処理する（"restart": true で最初から）。
+    Lambdaの残り実行時間が少なくなった場合は新しいパーティションを開始せずに終了する。
+    """
+    start_date = date.fromisoformat(event['start_date'])
+    end_date = date.fromisoformat(event['end_date'])
+    if end_date < start_date:
+        raise ValueError(f"end_date {end_date} is before start_date {start_date}")
+    
+    partitions = [start_date + timedelta(days=offset) for offset in range((end_date - start_date).days + 1)]
+    state_store = S3StateStore(bucket, f"{BACKFILL_STATE_PREFIX}{start_date}_{end_date}.json", s3_client=s3_client)
+    checkpoint = None if event.get('restart') else state_store.load()
+    completed = set(checkpoint['completed']) if checkpoint else set()
+    pending = [partition for partition in partitions if str(partition) not in completed]
+    
+    logger.info("Starting backfill", extra={
+        "start_date": str(start_date),
+        "end_date": str(end_date),
+        "partitions": len(partitions),
+        "already_completed": len(partitions) - len(pending),
+        "concurrency": BACKFILL_CONCURRENCY
+    })
+    
+    checkpoint_lock = threading.Lock()
+    
+    def run_partition(target_date):
+        with db_pool.get_connection_for_secret(source_db_host, source_db_name, secret_arn) as conn:
+            s3_keys, record_counts = extract_to_s3(conn, target_date, bucket)
+        
+        # 完了したパーティションをチェックポイントに記録
+        with checkpoint_lock:
+            completed.add(str(target_date))
+            state_store.save({'completed': sorted(completed)})
+        return s3_keys, record_counts
+    
+    results = {}
+    failures = {}
+    records_processed = 0
+    remaining = list(pending)
+    
+    with ThreadPoolExecutor(max_workers=BACKFILL_CONCURRENCY, thread_name_prefix='backfill') as executor:
+        running = {}
+        while remaining or running:
+            # 同時実行数と残り実行時間の範囲でパーティションを開始
+            while remaining and len(running) < BACKFILL_CONCURRENCY:
+                if context.get_remaining_time_in_millis() < BACKFILL_MIN_REMAINING_SECONDS * 1000:
+                    logger.warning("Not enough time left to start another partition", extra={
+                        "remaining_partitions": len(remaining)
+                    })
+                    break
+                target_date = remaining.pop(0)
+                running[executor.submit(run_partition, target_date)] = target_date
+            
+            if not running:
+                break
+            
+            done, _ = wait(running, return_when=FIRST_COMPLETED)
+            for future in done:
+                target_date = running.pop(future)
+                try:
+                    s3_keys, record_counts = future.result()
+                    results[str(target_date)] = s3_keys
+                    records_processed += sum(record_counts.values())
+                    metrics.add_metric(name="BackfillPartitionsCompleted", unit=MetricUnit.Count, value=1)
+                    logger.info(f"Backfill partition completed: {target_date}", extra={"record_counts": record_counts})
+                except Exception as e:
+                    failures[str(target_date)] = str(e)
+                    metrics.add_metric(name="BackfillPartitionsFailed", unit=MetricUnit.Count, value=1)
+                    logger.error(f"Backfill partition failed: {target_date}: {str(e)}")
+    
+    unfinished = sorted(str(partition) for partition in partitions if str(partition) not in completed)
+    logger.info("Backfill finished", extra={
+        "completed_partitions": len(results),
+        "failed_partitions": len(failures),
+        "unfinished_partitions": len(unfinished),
+        "records_processed": records_processed
+    })
+    
+    return {
+        'statusCode': 500 if failures else 200,
+        'body': json.dumps({
+            'message': 'ETL backfill finished' if not unfinished else 'ETL backfill stopped before all partitions completed',
+            'complete': not unfinished,
+            's3_keys': results,
+            'failed': failures,
+            'unfinished': unfinished,
+            'records_processed': records_processed
+        })
+    }
+
+def run_diagnostics(target_date, source_db_host: str, source_db_name: str, secret_arn: str,
+                    bucket: str) -> Dict[str, Any]:
+    """
+    抽出クエリを EXPLAIN (ANALYZE, BUFFERS) で実行し、実行計画と要約をS3に保存
+    
+    - etl-diagnostics/YYYY-MM-DD/<query>.json: クエリごとの実行計画（FORMAT JSON）
+    - etl-diagnostics/YYYY-MM-DD/summary.json: 実行時間・バッファ・大きなテーブルのシーケンシャルスキャン・不足している推奨インデックス
+    
+    クエリは実際に実行されるが、結果はS3のデータ出力（etl-data/）には書き出さない
+    """
+    partition = f"{DIAGNOSTICS_PREFIX}{target_date}"
+    queries = []
+    
+    with db_pool.get_connection_for_secret(source_db_host, source_db_name, secret_arn) as conn:
+        try:
+            with conn.cursor() as cursor:
+                cursor.execute(sql_registry.get('table_row_estimates.sql'))
+                table_rows = dict(cursor.fetchall())
+                cursor.execute(sql_registry.get('source_indexes.sql'))
+                existing_indexes = {row[0] for row in cursor.fetchall()}
+                
+                for sql_file in DIAGNOSTIC_QUERIES:
+                    plan = explain_query(cursor, sql_registry.get(sql_file),
+                                         [target_date] * sql_registry.param_count(sql_file))
+                    seq_scans = find_seq_scans(sql_file, plan, table_rows, DIAGNOSTICS_SEQ_SCAN_MIN_ROWS)
+                    
+                    plan_key = f"{partition}/{os.path.splitext(sql_file)[0]}.json"
+                    put_json_to_s3(bucket, plan_key, plan)
+                    queries.append({**summarize_plan(sql_file, plan, seq_scans), 'plan_key': plan_key})
+        finally:
+            conn.rollback()
+    
+    flagged = [
+        {'sql_file': query['sql_file'], **scan}
+        for query in queries for scan in query['seq_scans'] if not scan['expected']
+    ]
+    missing = missing_indexes(existing_indexes)
+    for scan in flagged:
+        logger.warning(f"Sequential scan on {scan['relation']} in {scan['sql_file']}", extra=scan)
+    if missing:
+        logger.warning("Recommended indexes are missing; run the DB initializer", extra={"missing_indexes": missing})
+    
+    summary = {
+        'target_date': str(target_date),
+        'created_at': datetime.now().isoformat(),
+        'seq_scan_min_rows': DIAGNOSTICS_SEQ_SCAN_MIN_ROWS,
+        'table_rows': table_rows,
+        'queries': queries,
+        'flagged_seq_scans': flagged,
+        'missing_indexes': missing
+    }
+    summary_key = f"{partition}/summary.json"
+    put_json_to_s3(bucket, summary_key, summary)
+    
+    metrics.add_metric(name="DiagnosticsSeqScans", unit=MetricUnit.Count, value=len(flagged))
+    metrics.add_metric(name="DiagnosticsMissingIndexes", unit=MetricUnit.Count, value=len(missing))
+    
+    return {
+        'statusCode': 200,
+        'body': json.dumps({
+            'message': 'ETL diagnostics completed successfully',
+            'summary_key': summary_key,
+            'flagged_seq_scans': len(flagged),
+            'missing_indexes': list(missing)
+        })
+    }
+
+def put_json_to_s3(bucket: str, key: str, data: Any):
+    """JSONとしてS3に保存"""
+    s3_client.put_object(
+        Bucket=bucket,
+        Key=key,
+        Body=json.dumps(data, default=str, ensure_ascii=False, indent=2).encode('utf-8'),
+        ContentType='application/json'
+    )
+
+def load_watermark(state_store: S3StateStore) -> Tuple[datetime, int]:
+    """
+    保存済みのウォーターマークを取得
+    
+    未保存の場合は前日0時から開始する（日次モードと同じ範囲を初回に抽出）
+    """
+    state = state_store.load()
+    if state is None:
+        start_of_yesterday = datetime.combine(datetime.now().date() - timedelta(days=1), datetime.min.time())
+        return start_of_yesterday, 0
+    return datetime.fromisoformat(state['updated_at']), int(state['id'])
+
+def extract_to_s3(conn, target_date, bucket: str) -> Tuple[List[str], Dict[str, int]]:
+    """
+    1つの接続で抽出クエリを順に実行してS3に保存
+    """
+    if TRANSFORM_ENGINE == 'pandas':
+        # 生データを1度だけ取得してDataFrameで集計（抽出モードによらず一括取得）
+        frames = extract_and_transform_frames(conn, target_date)
+        extracted_data = frames if OUTPUT_FORMAT == 'parquet' else {
+            name: df.to_dict('records') for name, df in frames.items()
+        }
+        s3_keys = save_to_s3(extracted_data, bucket, target_date)
+        return s3_keys, {name: len(df) for name, df in frames.items()}
+    
+    if EXTRACT_MODE == 'streaming':
+        # バッチ単位で抽出しながらS3へ書き出す
+        return stream_extract_to_s3(conn, target_date, bucket)
+    
+    if OUTPUT_FORMAT == 'parquet':
+        # Parquetは型を保持するためDataFrameのまま書き出す
+        extracted_data = extract_dataframes(conn, target_date)
+    else:
+        extracted_data = extract_transform_data(conn, target_date)
+    
+    s3_keys = save_to_s3(extracted_data, bucket, target_date)
+    return s3_keys, {name: len(records) for name, records in extracted_data.items()}
+
+def extract_parallel_to_s3(connection_factory, target_date, bucket: str) -> Tuple[List[str], Dict[str, int]]:
+    """
+    抽出クエリを別々の接続で同時に実行してS3に保存
+    
+    処理時間は各クエリの合計ではなく、最も遅いクエリの時間に近づく
+    """
+    logger.info("Starting parallel data extraction", extra={"extract_mode": EXTRACT_MODE})
+    
+    with ThreadPoolExecutor(max_workers=len(EXTRACT_DATASETS), thread_name_prefix='extract') as executor:
+        if EXTRACT_MODE == 'streaming':
+            # 各クエリのバッチを先読みしつつ、書き出しはデータセット順に行う
+            stop_event = threading.Event()
+            streams = {
+                dataset_name: BackgroundBatches(
+                    executor,
+                    partial(stream_dataset_batches, connection_factory, dataset_name, sql_file, target_date),
+                    EXTRACT_PREFETCH_BATCHES,
+                    stop_event
+                )
+                for dataset_name, sql_file in EXTRACT_DATASETS
+            }
+            try:
+                result = write_batches_to_s3(streams.items(), target_date, bucket)
+            finally:
+                stop_event.set()
+            timings = {name: stream.future.result() for name, stream in streams.items()}
+        else:
+            futures = {
+                dataset_name: executor.submit(
+                    run_timed, fetch_dataframe_with_connection, connection_factory, sql_file, target_date
+                )
+                for dataset_name, sql_file in EXTRACT_DATASETS
+            }
+            frames = {}
+            timings = {}
+            for dataset_name, future in futures.items():
+                frames[dataset_name], timings[dataset_name] = future.result()
+                logger.info(f"Extracted {len(frames[dataset_name])} {dataset_name} records")
+            
+            if OUTPUT_FORMAT == 'parquet':
+                extracted_data = frames
+            else:
+                extracted_data = {name: df.to_dict('records') for name, df in frames.items()}
+            s3_keys = save_to_s3(extracted_data, bucket, target_date)
+            result = (s3_keys, {name: len(df) for name, df in frames.items()})
+    
+    # クエリごとの所要時間を記録
+    for dataset_name, elapsed in timings.items():
+        metrics.add_metric(name=f"QueryTime_{dataset_name}", unit=MetricUnit.Seconds, value=elapsed)
+    logger.info("Parallel extraction query timings", extra={"query_timings": timings})
+    
+    return result
+
 def extract_transform_data(conn, target_date) -> Dict[str, Any]:
     """
     データの抽出・変換処理
     """
+    return {name: df.to_dict('records') for name, df in extract_dataframes(conn, target_date).items()}
+
+def extract_dataframes(conn, target_date) -> Dict[str, pd.DataFrame]:
+    """
+    データを抽出してデータセットごとのDataFrameとして返す
+    """
     logger.info("Starting data extraction and transformation")
     
-    # SQLファイルから読み込み
-    customer_analytics_query = load_sql_file('customer_analytics.sql')
-    product_sales_query = load_sql_file('product_sales.sql')
-    daily_sales_query = load_sql_file('daily_sales.sql')
+    frames = {}
+    for dataset_name, sql_file in EXTRACT_DATASETS:
+        frames[dataset_name] = fetch_dataframe(conn, sql_file, target_date)
+        logger.info(f"Extracted {len(frames[dataset_name])} {dataset_name} records")
     
-    # データフレームに変換
-    customer_analytics_df = pd.read_sql(customer_analytics_query, conn, params=[target_date, target_date])
-    product_sales_df = pd.read_sql(product_sales_query, conn, params=[target_date, target_date, target_date])
-    daily_sales_df = pd.read_sql(daily_sales_query, conn, params=[target_date, target_date, target_date])
+    return frames
+
+def extract_and_transform_frames(conn, target_date) -> Dict[str, pd.DataFrame]:
+    """
+    対象日の注文明細と顧客・商品マスタを1度ずつ取得し、pandasで3つのデータセットを集計
+    """
+    logger.info("Starting data extraction with pandas transform")
     
-    logger.info(f"Extracted {len(customer_analytics_df)} customer records")
-    logger.info(f"Extracted {len(product_sales_df)} product records")
-    logger.info(f"Extracted {len(daily_sales_df)} daily sales records")
+    start_time = time.time()
+    customers = fetch_dataframe(conn, 'raw_customers.sql', target_date)
+    products = fetch_dataframe(conn, 'raw_products.sql', target_date)
+    order_lines = fetch_dataframe(conn, 'raw_order_lines.sql', target_date)
+    fetch_time = time.time() - start_time
     
-    return {
-        'customer_analytics': customer_analytics_df.to_dict('records'),
-        'product_sales_summary': product_sales_df.to_dict('records'),
-        'daily_sales_summary': daily_sales_df.to_dict('records')
-    }
+    frames, transform_time = run_timed(transform_datasets, customers, products, order_lines, target_date)
+    
+    metrics.add_metric(name="RawFetchTime", unit=MetricUnit.Seconds, value=fetch_time)
+    metrics.add_metric(name="TransformTime", unit=MetricUnit.Seconds, value=transform_time)
+    for dataset_name, df in frames.items():
+        logger.info(f"Extracted {len(df)} {dataset_name} records")
+    logger.info("Pandas transform completed", extra={
+        "order_lines": len(order_lines),
+        "fetch_time": fetch_time,
+        "transform_time": transform_time
+    })
+    
+    return frames
 
-def save_to_s3(data: Dict[str, Any], bucket: str, target_date) -> str:
+def fetch_dataframe(conn, sql_file: str, target_date) -> pd.DataFrame:
+    """
+    抽出クエリを実行してDataFrameとして取得
+    """
+    if SQL_PREPARE and sql_registry.template(sql_file).preparable:
+        # 接続ごとに1度だけPREPAREし、以降はEXECUTEで解析・計画を省略
+        query = sql_registry.prepared(conn, sql_file)
+    else:
+        query = sql_registry.get(sql_file)
+    return pd.read_sql(query, conn, params=[target_date] * sql_registry.param_count(sql_file))
+
+def fetch_dataframe_with_connection(connection_factory, sql_file: str, target_date) -> pd.DataFrame:
+    """
+    プールから取得した接続で抽出クエリを実行してDataFrameとして取得（並列実行用）
+    """
+    with connection_factory() as conn:
+        try:
+            return fetch_dataframe(conn, sql_file, target_date)
+        finally:
+            conn.rollback()
+
+def save_to_s3(data: Dict[str, Any], bucket: str, partition) -> List[str]:
     """
     変換されたデータをS3に保存
     """
-    s3_client = boto3.client('s3')
+    if OUTPUT_LAYOUT == 'partitioned':
+        s3_keys, _ = stream_partitioned_to_s3(((name, [records]) for name, records in data.items()), partition, bucket)
+        return s3_keys
+    
+    if OUTPUT_FORMAT == 'parquet':
+        return save_parquet_to_s3(data, bucket, partition)
+    
+    s3_key = json_key(partition)
+    
+    # JSONとして保存（文字列全体を組み立てず、マルチパートアップロードへ逐次書き出す）
+    with S3MultipartWriter(bucket, s3_key, s3_client=s3_client, content_type='application/json') as out:
+        writer = JsonDocumentWriter(out)
+        for dataset_name, records in data.items():
+            writer.begin_dataset(dataset_name)
+            for start in range(0, len(records), EXTRACT_BATCH_SIZE):
+                writer.write_batch(records[start:start + EXTRACT_BATCH_SIZE])
+            writer.end_dataset()
+        writer.close()
+    
+    logger.info(f"Data saved to S3: s3://{bucket}/{s3_key}")
+    return [s3_key]
+
+def save_parquet_to_s3(data: Dict[str, pd.DataFrame], bucket: str, partition) -> List[str]:
+    """
+    データセットごとにParquetファイルとしてS3に保存
+    """
+    s3_keys = []
     
-    # S3キーの生成
-    s3_key = f"etl-data/{target_date}/transformed_data.json"
+    for dataset_name, df in data.items():
+        s3_key = parquet_key(partition, dataset_name)
+        with S3MultipartWriter(bucket, s3_key, s3_client=s3_client, content_type=PARQUET_CONTENT_TYPE) as out:
+            writer = ParquetDatasetWriter(out, dataset_name)
+            writer.write_batch(df)
+            writer.close()
+        
+        logger.info(f"Data saved to S3: s3://{bucket}/{s3_key}")
+        s3_keys.append(s3_key)
     
-    # JSONとして保存
-    json_data = json.dumps(data, default=str, ensure_ascii=False, indent=2)
+    return s3_keys
+
+def part_key(partition, dataset_name: str, part_number: int) -> str:
+    """パートのS3キー（Load Lambdaのトリガー対象外のプレフィックスに置く）"""
+    extension = 'parquet' if OUTPUT_FORMAT == 'parquet' else 'json'
+    return f"etl-parts/{partition}/{dataset_name}/part-{part_number:05d}.{extension}"
+
+def manifest_key(partition) -> str:
+    """マニフェストのS3キー"""
+    return f"etl-data/{partition}/{MANIFEST_FILE_NAME}"
+
+def json_key(partition) -> str:
+    """JSONドキュメントのS3キー（パーティションは処理対象日、または incremental/<実行時刻>）"""
+    return f"etl-data/{partition}/transformed_data.json"
+
+def parquet_key(partition, dataset_name: str) -> str:
+    """データセットごとのParquetファイルのS3キー"""
+    return f"etl-data/{partition}/{dataset_name}.parquet"
+
+def iter_query_batches(conn, query: str, params: List[Any], cursor_name: str,
+                       batch_size: int = EXTRACT_BATCH_SIZE) -> Iterator[List[Dict[str, Any]]]:
+    """
+    サーバーサイド（名前付き）カーソルでクエリ結果をバッチ単位に取得
     
+    結果セット全体をクライアントに保持しないため、件数に関わらずメモリ使用量は一定
+    """
+    with conn.cursor(name=cursor_name) as cursor:
+        cursor.itersize = batch_size
+        cursor.execute(query, params)
+        
+        columns = None
+        while True:
+            rows = cursor.fetchmany(batch_size)
+            if not rows:
+                break
+            if columns is None:
+                columns = [desc[0] for desc in cursor.description]
+            yield [dict(zip(columns, row)) for row in rows]
+
+def iter_dataset_batches(conn, dataset_name: str, sql_file: str, target_date):
+    """
+    データセット1つ分の抽出クエリをバッチ単位で実行
+    """
+    query = sql_registry.get(sql_file)
+    return iter_query_batches(conn, query, [target_date] * sql_registry.param_count(sql_file), f"extract_{dataset_name}")
+
+def stream_dataset_batches(connection_factory, dataset_name: str, sql_file: str, target_date):
+    """
+    プールから取得した接続でデータセット1つ分をバッチ単位で抽出（並列実行用）
+    """
+    with connection_factory() as conn:
+        try:
+            yield from iter_dataset_batches(conn, dataset_name, sql_file, target_date)
+        finally:
+            conn.rollback()
+
+def stream_extract_to_s3(conn, target_date, bucket: str) -> Tuple[List[str], Dict[str, int]]:
+    """
+    データをバッチ単位で抽出し、到着順にS3マルチパートアップロードへ書き出す
+    """
+    logger.info("Starting streaming data extraction", extra={
+        "batch_size": EXTRACT_BATCH_SIZE,
+        "output_format": OUTPUT_FORMAT
+    })
+    
+    # 1つの接続上で名前付きカーソルが重ならないよう、データセットごとに遅延して実行する
+    dataset_batches = (
+        (dataset_name, iter_dataset_batches(conn, dataset_name, sql_file, target_date))
+        for dataset_name, sql_file in EXTRACT_DATASETS
+    )
+    
+    try:
+        return write_batches_to_s3(dataset_batches, target_date, bucket)
+    finally:
+        # 読み取りトランザクションを終了（ウォームスタート時に古いスナップショットを使わないため）
+        conn.rollback()
+
+def write_batches_to_s3(dataset_batches, partition, bucket: str) -> Tuple[List[str], Dict[str, int]]:
+    """
+    (データセット名, バッチのイテレータ) の列を出力形式に応じてS3へ書き出す
+    """
+    if OUTPUT_LAYOUT == 'partitioned':
+        return stream_partitioned_to_s3(dataset_batches, partition, bucket)
+    if OUTPUT_FORMAT == 'parquet':
+        return stream_parquet_to_s3(dataset_batches, partition, bucket)
+    return stream_json_to_s3(dataset_batches, partition, bucket)
+
+def stream_json_to_s3(dataset_batches, partition, bucket: str) -> Tuple[List[str], Dict[str, int]]:
+    """
+    全データセットを1つのJSONドキュメントとして逐次書き出す
+    """
+    s3_key = json_key(partition)
+    
+    with S3MultipartWriter(bucket, s3_key, s3_client=s3_client, content_type='application/json') as out:
+        writer = JsonDocumentWriter(out)
+        for dataset_name, batches in dataset_batches:
+            writer.begin_dataset(dataset_name)
+            for batch in batches:
+                writer.write_batch(batch)
+            writer.end_dataset()
+            logger.info(f"Extracted {writer.record_counts[dataset_name]} {dataset_name} records")
+        writer.close()
+    
+    logger.info(f"Data saved to S3: s3://{bucket}/{s3_key}")
+    return [s3_key], writer.record_counts
+
+def stream_parquet_to_s3(dataset_batches, partition, bucket: str) -> Tuple[List[str], Dict[str, int]]:
+    """
+    データセットごとにバッチを行グループとしてParquetファイルへ逐次書き出す
+    """
+    s3_keys = []
+    record_counts = {}
+    
+    for dataset_name, batches in dataset_batches:
+        s3_key = parquet_key(partition, dataset_name)
+        
+        with S3MultipartWriter(bucket, s3_key, s3_client=s3_client, content_type=PARQUET_CONTENT_TYPE) as out:
+            writer = ParquetDatasetWriter(out, dataset_name)
+            for batch in batches:
+                writer.write_batch(batch)
+            writer.close()
+        
+        logger.info(f"Extracted {writer.record_count} {dataset_name} records")
+        logger.info(f"Data saved to S3: s3://{bucket}/{s3_key}")
+        s3_keys.append(s3_key)
+        record_counts[dataset_name] = writer.record_count
+    
+    return s3_keys, record_counts
+
+
+def stream_partitioned_to_s3(dataset_batches, partition, bucket: str) -> Tuple[List[str], Dict[str, int]]:
+    """
+    データセットごと・OUTPUT_PART_ROWS 行ごとのパートに分割して書き出し、最後にマニフェストを書き出す
+    
+    マニフェスト（etl-data/<partition>/_manifest.json）にはパートのキー・行数・サイズ・SHA-256を記録する。
+    Load Lambdaはマニフェストの作成をトリガーに全パートをロードする。
+    """
+    content_type = PARQUET_CONTENT_TYPE if OUTPUT_FORMAT == 'parquet' else 'application/json'
+    parts = []
+    record_counts = {}
+    
+    for dataset_name, batches in dataset_batches:
+        part_number = 0
+        out = writer = None
+        
+        try:
+            for batch in batches:
+                start = 0
+                while start < len(batch):
+                    if writer is None:
+                        key = part_key(partition, dataset_name, part_number)
+                        out = S3MultipartWriter(bucket, key, s3_client=s3_client, content_type=content_type)
+                        writer = PartWriter(out, dataset_name, OUTPUT_FORMAT)
+                    
+                    chunk = batch[start:start + OUTPUT_PART_ROWS - writer.record_count]
+                    writer.write_batch(chunk)
+                    start += len(chunk)
+                    
+                    if writer.record_count >= OUTPUT_PART_ROWS:
+                        parts.append(close_part(out, writer))
+                        part_number += 1
+                        out = writer = None
+            
+            if writer is not None:
+                parts.append(close_part(out, writer))
+                part_number += 1
+        except Exception:
+            if out is not None:
+                out.abort()
+            raise
+        
+        record_counts[dataset_name] = sum(part['rows'] for part in parts if part['dataset'] == dataset_name)
+        logger.info(f"Extracted {record_counts[dataset_name]} {dataset_name} records in {part_number} parts")
+    
+    # 全パートの書き出し完了後にマニフェストを作成
+    s3_key = manifest_key(partition)
+    manifest = {
+        'partition': str(partition),
+        'format': OUTPUT_FORMAT,
+        'created_at': datetime.now().isoformat(),
+        'record_counts': record_counts,
+        'parts': parts
+    }
     s3_client.put_object(
         Bucket=bucket,
         Key=s3_key,
-        Body=json_data,
+        Body=json.dumps(manifest).encode('utf-8'),
         ContentType='application/json'
     )
     
-    logger.info(f"Data saved to S3: s3://{bucket}/{s3_key}")
-    return s3_key
\ No newline at end of file
+    logger.info(f"Manifest saved to S3: s3://{bucket}/{s3_key}", extra={"parts": len(parts)})
+    return [s3_key], record_counts
+
+def close_part(out: S3MultipartWriter, writer: PartWriter) -> Dict[str, Any]:
+    """パートを閉じてアップロードを完了し、マニフェストのエントリを返す"""
+    entry = writer.close()
+    out.close()
+    return {'key': out.key, **entry}
@@ -0,0 +1,65 @@
+"""
+抽出クエリの並列実行ユーティリティ
+"""
+import queue
+import threading
+import time
+from concurrent.futures import Executor, Future
+from typing import Callable, Iterable, Iterator, Tuple
+
+# 終端を表す番兵
+_END = object()
+
+
+class BackgroundBatches:
+    """
+    バッチを生成する処理を別スレッドで実行し、有界キュー経由で受け取るイテレータ
+
+    生成側は最大 prefetch 個のバッチまで先行して取得するため、
+    クエリの実行（DB側の集計）は並列に進みつつ、メモリ使用量は一定に保たれる。
+    """
+    def __init__(self, executor: Executor, produce: Callable[[], Iterable], prefetch: int,
+                 stop_event: threading.Event):
+        self._queue = queue.Queue(maxsize=prefetch)
+        self._stop_event = stop_event
+        self.future: Future = executor.submit(self._run, produce)
+
+    def __iter__(self) -> Iterator:
+        while True:
+            item = self._queue.get()
+            if item is _END:
+                return
+            if isinstance(item, BaseException):
+                raise item
+            yield item
+
+    def _run(self, produce: Callable[[], Iterable]) -> float:
+        """生成処理を実行し、所要時間（秒）を返す"""
+        start_time = time.time()
+        try:
+            for batch in produce():
+                if not self._put(batch):
+                    break
+            else:
+                self._put(_END)
+        except Exception as e:
+            self._put(e)
+            raise
+        return time.time() - start_time
+
+    def _put(self, item) -> bool:
+        """受け取り側が中断していなければキューに追加"""
+        while not self._stop_event.is_set():
+            try:
+                self._queue.put(item, timeout=0.5)
+                return True
+            except queue.Full:
+                continue
+        return False
+
+
+def run_timed(func: Callable, *args) -> Tuple[object, float]:
+    """関数を実行し、結果と所要時間（秒）を返す"""
+    start_time = time.time()
+    result = func(*args)
+    return result, time.time() - start_time
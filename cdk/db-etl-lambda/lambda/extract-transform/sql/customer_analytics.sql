@@ -1,4 +1,5 @@
 -- 顧客分析データの作成
+-- params: date, date
 SELECT 
     c.id as customer_id,
     COUNT(o.id) as total_orders,
@@ -1,4 +1,5 @@
 -- 日次売上サマリの作成
+-- params: date, date, date
 SELECT 
     %s as date,
     COUNT(DISTINCT o.id) as total_orders,
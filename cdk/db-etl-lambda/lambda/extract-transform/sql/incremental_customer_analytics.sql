@@ -0,0 +1,25 @@
+-- 顧客分析データの増分作成
+-- ウォーターマーク範囲内で更新された注文を持つ顧客のみ、最新の更新日の注文から集計する
+-- params: timestamp, integer, timestamp, integer
+WITH changed_orders AS (
+    SELECT customer_id, order_date
+    FROM orders
+    WHERE (updated_at, id) > (%s, %s) AND (updated_at, id) <= (%s, %s)
+),
+customer_days AS (
+    SELECT customer_id, MAX(order_date) as order_date
+    FROM changed_orders
+    GROUP BY customer_id
+)
+SELECT 
+    c.id as customer_id,
+    COUNT(o.id) as total_orders,
+    COALESCE(SUM(o.total_amount), 0) as total_amount,
+    COALESCE(AVG(o.total_amount), 0) as avg_order_value,
+    MAX(o.order_date) as last_order_date,
+    c.region
+FROM customer_days cd
+JOIN customers c ON c.id = cd.customer_id
+LEFT JOIN orders o ON o.customer_id = cd.customer_id
+    AND o.order_date = cd.order_date
+GROUP BY c.id, c.region
@@ -0,0 +1,18 @@
+-- 日次売上サマリの増分作成
+-- ウォーターマーク範囲内で更新された注文の注文日のみ再集計する
+-- params: timestamp, integer, timestamp, integer
+WITH affected_dates AS (
+    SELECT DISTINCT order_date
+    FROM orders
+    WHERE (updated_at, id) > (%s, %s) AND (updated_at, id) <= (%s, %s)
+)
+SELECT 
+    o.order_date as date,
+    COUNT(DISTINCT o.id) as total_orders,
+    COALESCE(SUM(o.total_amount), 0) as total_revenue,
+    COUNT(DISTINCT o.customer_id) as unique_customers,
+    c.region
+FROM affected_dates ad
+JOIN orders o ON o.order_date = ad.order_date
+JOIN customers c ON o.customer_id = c.id
+GROUP BY o.order_date, c.region
@@ -0,0 +1,9 @@
+-- 増分抽出の上限ウォーターマーク（前回のウォーターマーク以降に更新された最新の注文）
+-- 指定秒数以内の更新は未コミットのトランザクションと競合しうるため次回に回す
+-- params: timestamp, integer, integer
+SELECT updated_at, id
+FROM orders
+WHERE (updated_at, id) > (%s, %s)
+    AND updated_at <= LOCALTIMESTAMP - make_interval(secs => %s)
+ORDER BY updated_at DESC, id DESC
+LIMIT 1
@@ -0,0 +1,26 @@
+-- 商品売上サマリの増分作成
+-- ウォーターマーク範囲内で更新された注文に含まれる (商品, 注文日) のみ再集計する
+-- params: timestamp, integer, timestamp, integer
+WITH changed_orders AS (
+    SELECT id, order_date
+    FROM orders
+    WHERE (updated_at, id) > (%s, %s) AND (updated_at, id) <= (%s, %s)
+),
+affected AS (
+    SELECT DISTINCT oi.product_id, co.order_date
+    FROM changed_orders co
+    JOIN order_items oi ON oi.order_id = co.id
+)
+SELECT 
+    p.id as product_id,
+    p.category,
+    COALESCE(SUM(oi.quantity), 0) as total_quantity,
+    COALESCE(SUM(oi.quantity * oi.unit_price), 0) as total_revenue,
+    COUNT(DISTINCT o.id) as order_count,
+    a.order_date as date
+FROM affected a
+JOIN products p ON p.id = a.product_id
+JOIN orders o ON o.order_date = a.order_date
+JOIN order_items oi ON oi.order_id = o.id
+    AND oi.product_id = a.product_id
+GROUP BY p.id, p.category, a.order_date
@@ -1,4 +1,5 @@
 -- 商品売上サマリの作成
+-- params: date, date, date
 SELECT 
     p.id as product_id,
     p.category,
@@ -7,7 +8,9 @@ SELECT
     COUNT(DISTINCT o.id) as order_count,
     %s as date
 FROM products p
-LEFT JOIN order_items oi ON p.id = oi.product_id
-LEFT JOIN orders o ON oi.order_id = o.id 
-    AND o.order_date >= %s AND o.order_date < %s + INTERVAL '1 day'
+LEFT JOIN (
+    order_items oi
+    JOIN orders o ON oi.order_id = o.id 
+        AND o.order_date >= %s AND o.order_date < %s + INTERVAL '1 day'
+) ON p.id = oi.product_id
 GROUP BY p.id, p.category
\ No newline at end of file
@@ -0,0 +1,4 @@
+-- 顧客マスタ（TRANSFORM_ENGINE=pandas 用）
+SELECT id as customer_id, region
+FROM customers
+ORDER BY id
\ No newline at end of file
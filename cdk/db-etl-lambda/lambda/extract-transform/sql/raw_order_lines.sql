@@ -0,0 +1,13 @@
+-- 対象日の注文と明細（TRANSFORM_ENGINE=pandas 用、金額は銭単位の整数）
+-- params: date, date
+SELECT 
+    o.id as order_id,
+    o.customer_id,
+    o.order_date,
+    (o.total_amount * 100)::bigint as order_amount_cents,
+    oi.product_id,
+    oi.quantity,
+    (oi.quantity * oi.unit_price * 100)::bigint as line_revenue_cents
+FROM orders o
+LEFT JOIN order_items oi ON oi.order_id = o.id
+WHERE o.order_date >= %s AND o.order_date < %s + INTERVAL '1 day'
\ No newline at end of file
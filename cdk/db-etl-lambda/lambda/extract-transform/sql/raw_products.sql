@@ -0,0 +1,4 @@
+-- 商品マスタ（TRANSFORM_ENGINE=pandas 用）
+SELECT id as product_id, category
+FROM products
+ORDER BY id
\ No newline at end of file
@@ -0,0 +1,2 @@
+-- ソースDBのインデックス名（診断モードで推奨インデックスの有無の確認に使用）
+SELECT indexname FROM pg_indexes WHERE schemaname = 'public'
\ No newline at end of file
@@ -0,0 +1,5 @@
+-- ソースDBのテーブルごとの推定行数（診断モードでシーケンシャルスキャンの対象規模の判定に使用）
+SELECT c.relname, GREATEST(c.reltuples, 0)::bigint
+FROM pg_class c
+JOIN pg_namespace n ON n.oid = c.relnamespace
+WHERE n.nspname = 'public' AND c.relkind IN ('r', 'p')
\ No newline at end of file
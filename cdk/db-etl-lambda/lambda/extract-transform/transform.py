@@ -0,0 +1,106 @@
+"""
+pandasによる集計（TRANSFORM_ENGINE=pandas）
+
+対象日の注文明細・顧客・商品を1度だけ取得し、3つのデータセットを共有のDataFrameからベクトル化した
+groupbyで集計する。金額は整数の銭単位（x100）で集計し、出力時にDecimalへ戻すため丸め誤差は生じない。
+"""
+from decimal import Decimal
+from typing import Dict
+import numpy as np
+import pandas as pd
+
+
+def transform_datasets(customers: pd.DataFrame, products: pd.DataFrame, order_lines: pd.DataFrame,
+                       target_date) -> Dict[str, pd.DataFrame]:
+    """
+    生データから3つのデータセットを集計
+
+    Args:
+        customers: customer_id, region
+        products: product_id, category
+        order_lines: 対象日の注文と明細（明細のない注文は product_id 等がNULL）
+            order_id, customer_id, order_date, order_amount_cents, product_id, quantity, line_revenue_cents
+        target_date: 処理対象日
+    """
+    # 注文単位のフレーム（明細の行数分重複しているため注文IDで一意にする）
+    orders = order_lines.drop_duplicates('order_id')[['order_id', 'customer_id', 'order_date', 'order_amount_cents']]
+    items = order_lines.dropna(subset=['product_id']).astype({
+        'product_id': 'int64', 'quantity': 'int64', 'line_revenue_cents': 'int64'
+    })
+
+    return {
+        'customer_analytics': customer_analytics(customers, orders),
+        'product_sales_summary': product_sales_summary(products, items, target_date),
+        'daily_sales_summary': daily_sales_summary(customers, orders, target_date),
+    }
+
+
+def customer_analytics(customers: pd.DataFrame, orders: pd.DataFrame) -> pd.DataFrame:
+    """顧客別の集計（注文のない顧客も0件として含む）"""
+    per_customer = orders.groupby('customer_id').agg(
+        total_orders=('order_id', 'size'),
+        total_amount_cents=('order_amount_cents', 'sum'),
+        last_order_date=('order_date', 'max'),
+    )
+    df = customers.join(per_customer, on='customer_id')
+
+    total_orders = df['total_orders'].fillna(0).astype('int64').to_numpy()
+    total_cents = df['total_amount_cents'].fillna(0).astype('int64').to_numpy()
+
+    return pd.DataFrame({
+        'customer_id': df['customer_id'].to_numpy(),
+        'total_orders': total_orders,
+        'total_amount': cents_to_decimal(total_cents),
+        'avg_order_value': cents_to_decimal(rounded_average(total_cents, total_orders)),
+        'last_order_date': df['last_order_date'].astype(object).where(df['last_order_date'].notna(), None).to_numpy(),
+        'region': df['region'].to_numpy(),
+    })
+
+
+def product_sales_summary(products: pd.DataFrame, items: pd.DataFrame, target_date) -> pd.DataFrame:
+    """商品別の集計（売上のない商品も0件として含む）"""
+    per_product = items.groupby('product_id').agg(
+        total_quantity=('quantity', 'sum'),
+        total_revenue_cents=('line_revenue_cents', 'sum'),
+        order_count=('order_id', 'nunique'),
+    )
+    df = products.join(per_product, on='product_id')
+
+    return pd.DataFrame({
+        'product_id': df['product_id'].to_numpy(),
+        'category': df['category'].to_numpy(),
+        'total_quantity': df['total_quantity'].fillna(0).astype('int64').to_numpy(),
+        'total_revenue': cents_to_decimal(df['total_revenue_cents'].fillna(0).astype('int64').to_numpy()),
+        'order_count': df['order_count'].fillna(0).astype('int64').to_numpy(),
+        'date': target_date,
+    })
+
+
+def daily_sales_summary(customers: pd.DataFrame, orders: pd.DataFrame, target_date) -> pd.DataFrame:
+    """地域別の集計（注文のある地域のみ）"""
+    df = orders.merge(customers, on='customer_id')
+    per_region = df.groupby('region', sort=False).agg(
+        total_orders=('order_id', 'nunique'),
+        total_revenue_cents=('order_amount_cents', 'sum'),
+        unique_customers=('customer_id', 'nunique'),
+    ).reset_index()
+
+    return pd.DataFrame({
+        'date': target_date,
+        'total_orders': per_region['total_orders'].astype('int64').to_numpy(),
+        'total_revenue': cents_to_decimal(per_region['total_revenue_cents'].astype('int64').to_numpy()),
+        'unique_customers': per_region['unique_customers'].astype('int64').to_numpy(),
+        'region': per_region['region'].to_numpy(),
+    })
+
+
+def rounded_average(total_cents: np.ndarray, counts: np.ndarray) -> np.ndarray:
+    """銭単位の平均を四捨五入（DECIMALの丸めと同じく0から遠い方向）で整数に丸める（件数0は0）"""
+    safe_counts = np.where(counts == 0, 1, counts)
+    magnitude = (2 * np.abs(total_cents) + safe_counts) // (2 * safe_counts)
+    return np.where(counts == 0, 0, np.sign(total_cents) * magnitude)
+
+
+def cents_to_decimal(cents: np.ndarray) -> np.ndarray:
+    """銭単位の整数を小数点以下2桁のDecimalに変換"""
+    return np.array([Decimal(int(value)).scaleb(-2) for value in cents], dtype=object)
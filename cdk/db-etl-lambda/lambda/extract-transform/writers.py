@@ -0,0 +1,149 @@
+"""
+抽出データの出力ライター
+"""
+import hashlib
+import json
+from typing import Dict, List, Any
+import pyarrow.parquet as pq
+
+from etl_common import DATASET_SCHEMAS, PARQUET_COMPRESSION, to_arrow_table
+
+
+class JsonDocumentWriter:
+    """
+    データセットごとのレコード配列を1つのJSONドキュメントとして逐次書き出す
+
+    出力形式は従来の transformed_data.json と同じ
+    ({"customer_analytics": [...], "product_sales_summary": [...], ...})
+    """
+    def __init__(self, fileobj):
+        self.fileobj = fileobj
+        self.record_counts: Dict[str, int] = {}
+        self._current_dataset = None
+        self._first_record = True
+        self.fileobj.write(b'{')
+
+    def begin_dataset(self, name: str):
+        """データセットの配列を開始"""
+        if self._current_dataset is not None:
+            raise RuntimeError(f"Dataset {self._current_dataset} is not finished")
+
+        separator = ',' if self.record_counts else ''
+        self._write(f'{separator}{json.dumps(name)}:[')
+        self._current_dataset = name
+        self._first_record = True
+        self.record_counts[name] = 0
+
+    def write_batch(self, records: List[Dict[str, Any]]):
+        """レコードのバッチを書き出す"""
+        if not records:
+            return
+
+        encoded = ','.join(
+            json.dumps(record, default=str, ensure_ascii=False) for record in records
+        )
+        self._write(encoded if self._first_record else f',{encoded}')
+        self._first_record = False
+        self.record_counts[self._current_dataset] += len(records)
+
+    def end_dataset(self):
+        """データセットの配列を終了"""
+        self._write(']')
+        self._current_dataset = None
+
+    def close(self):
+        """ドキュメントを閉じる"""
+        self._write('}')
+
+    def _write(self, text: str):
+        self.fileobj.write(text.encode('utf-8'))
+
+
+class ParquetDatasetWriter:
+    """
+    1つのデータセットをParquetファイルとして逐次書き出す
+
+    バッチごとに行グループとして書き込むため、全件をメモリに保持しない
+    """
+    def __init__(self, fileobj, dataset: str):
+        self.dataset = dataset
+        self.record_count = 0
+        self._writer = pq.ParquetWriter(fileobj, DATASET_SCHEMAS[dataset], compression=PARQUET_COMPRESSION)
+
+    def write_batch(self, data):
+        """レコードのリストまたはDataFrameを書き出す"""
+        if len(data) == 0:
+            return
+
+        table = to_arrow_table(self.dataset, data)
+        self._writer.write_table(table)
+        self.record_count += table.num_rows
+
+    def close(self):
+        """フッターを書き込んでファイルを閉じる"""
+        self._writer.close()
+
+
+class HashingWriter:
+    """書き込まれたバイト列のSHA-256を計算しながら下位のファイルライクオブジェクトへ渡す"""
+    def __init__(self, fileobj):
+        self.fileobj = fileobj
+        self.sha256 = hashlib.sha256()
+
+    @property
+    def closed(self) -> bool:
+        return self.fileobj.closed
+
+    def writable(self) -> bool:
+        return True
+
+    def tell(self) -> int:
+        return self.fileobj.tell()
+
+    def flush(self):
+        self.fileobj.flush()
+
+    def write(self, data) -> int:
+        self.sha256.update(data)
+        return self.fileobj.write(data)
+
+
+class PartWriter:
+    """
+    1つのデータセットのパート（N行ごとに分割したオブジェクト）を書き出す
+
+    JSONパートは従来と同じドキュメント形式（{"<dataset>": [...]}）で、ロード側の読み込み処理をそのまま使える
+    """
+    def __init__(self, fileobj, dataset: str, output_format: str):
+        self.dataset = dataset
+        self.output_format = output_format
+        self.record_count = 0
+        self._out = HashingWriter(fileobj)
+        if output_format == 'parquet':
+            self._writer = ParquetDatasetWriter(self._out, dataset)
+        else:
+            self._writer = JsonDocumentWriter(self._out)
+            self._writer.begin_dataset(dataset)
+
+    def write_batch(self, data):
+        """レコードのリストまたはDataFrameを書き出す"""
+        if len(data) == 0:
+            return
+        if self.output_format != 'parquet' and hasattr(data, 'columns'):
+            data = data.to_dict('records')
+        self._writer.write_batch(data)
+        self.record_count += len(data)
+
+    def close(self) -> Dict[str, Any]:
+        """パートを閉じ、マニフェストに記録する情報（行数・サイズ・SHA-256）を返す"""
+        if self.output_format == 'parquet':
+            self._writer.close()
+        else:
+            self._writer.end_dataset()
+            self._writer.close()
+        return {
+            'dataset': self.dataset,
+            'rows': self.record_count,
+            'size': self._out.tell(),
+            'sha256': self._out.sha256.hexdigest(),
+        }
@@ -1,16 +1,25 @@
+import hashlib
 import json
 import os
+import threading
+import uuid
+from concurrent.futures import ThreadPoolExecutor, wait
+from functools import partial
 import boto3
 import psycopg2
+from psycopg2 import sql
 from psycopg2.extras import execute_values
-from typing import Dict, Any, List
+from typing import Dict, Any, Iterable, Iterator, List, Optional, Set, Tuple
 from aws_lambda_powertools import Logger, Metrics
 from aws_lambda_powertools.metrics import MetricUnit
 from aws_lambda_powertools.logging import correlation_paths
 import time
 
 # 共通モジュールからインポート
-from etl_common import get_db_credentials, ConnectionPool, load_sql_file
+from etl_common import (
+    ConnectionPool, SqlRegistry, S3ResumableReader, bulk_merge, copy_rows, create_staging_table, merge_staging, drop_table,
+    dataset_from_key, iter_json_batches, iter_parquet_batches, MANIFEST_FILE_NAME
+)
 
 # Lambda Powertools設定
 logger = Logger()
@@ -22,15 +31,95 @@ s3_client = boto3.client('s3')
 # グローバル接続プール
 db_pool = ConnectionPool()
 
-def read_s3_with_retry(bucket_name: str, object_key: str, max_retries: int = 3) -> Dict[str, Any]:
+# SQLテンプレート（コールドスタート時に一括読み込み）
+sql_registry = SqlRegistry(os.path.join(os.path.dirname(os.path.abspath(__file__)), 'sql'))
+
+# この行数以上のテーブルはCOPY + ステージングテーブルからのマージでロード
+BULK_LOAD_THRESHOLD = int(os.environ.get('BULK_LOAD_THRESHOLD', '5000'))
+
+# 並列にロードするS3オブジェクト数（接続プールの最大接続数以下にする）
+LOAD_CONCURRENCY = int(os.environ.get('LOAD_CONCURRENCY', '2'))
+
+# ロード中に先読みしておくS3オブジェクト数
+LOAD_PREFETCH_OBJECTS = int(os.environ.get('LOAD_PREFETCH_OBJECTS', '1'))
+
+# マニフェストのパートを並列にステージングする数（全マニフェスト合計。LOAD_CONCURRENCY との合計が DB_POOL_MAX_SIZE 以下）
+MANIFEST_PART_CONCURRENCY = int(os.environ.get('MANIFEST_PART_CONCURRENCY', '2'))
+
+# この秒数より前に作成されたステージングテーブルは、削除されずに残ったものとしてマニフェストのロード開始時に削除
+# （Lambdaの最大実行時間より長くする）
+STAGING_TABLE_MAX_AGE_SECONDS = int(os.environ.get('STAGING_TABLE_MAX_AGE_SECONDS', '3600'))
+
+# ロードスレッド（1スレッド1接続）とパートのステージングの合計が接続プールの上限を超えると、
+# 接続の取得待ちがタイムアウト（PoolTimeoutError）してマニフェスト全体が失敗する
+if LOAD_CONCURRENCY + MANIFEST_PART_CONCURRENCY > db_pool.max_size:
+    raise ValueError(
+        f"LOAD_CONCURRENCY ({LOAD_CONCURRENCY}) + MANIFEST_PART_CONCURRENCY ({MANIFEST_PART_CONCURRENCY}) "
+        f"must not exceed DB_POOL_MAX_SIZE ({db_pool.max_size})"
+    )
+
+# マニフェストのパートのステージング用（同時に処理する全マニフェストで共有）
+part_executor = ThreadPoolExecutor(max_workers=MANIFEST_PART_CONCURRENCY, thread_name_prefix='part')
+
+# S3オブジェクトを逐次読み込む際の1バッチのレコード数
+LOAD_BATCH_SIZE = int(os.environ.get('LOAD_BATCH_SIZE', '10000'))
+
+# execute_valuesで1文にまとめる行数
+UPSERT_PAGE_SIZE = int(os.environ.get('UPSERT_PAGE_SIZE', '1000'))
+
+# テーブルごとの列（UPSERT / マージSQLの列順）
+CUSTOMER_ANALYTICS_COLUMNS = ('customer_id', 'total_orders', 'total_amount', 'avg_order_value', 'last_order_date', 'region')
+PRODUCT_SALES_SUMMARY_COLUMNS = ('product_id', 'category', 'total_quantity', 'total_revenue', 'order_count', 'date')
+DAILY_SALES_SUMMARY_COLUMNS = ('date', 'total_orders', 'total_revenue', 'unique_customers', 'region')
+
+TABLE_COLUMNS = {
+    'customer_analytics': CUSTOMER_ANALYTICS_COLUMNS,
+    'product_sales_summary': PRODUCT_SALES_SUMMARY_COLUMNS,
+    'daily_sales_summary': DAILY_SALES_SUMMARY_COLUMNS,
+}
+
+# テーブル -> ロードで変更があった場合にリフレッシュするマテリアライズドビュー
+MATERIALIZED_VIEWS = {
+    'customer_analytics': ('mv_top_customers',),
+    'product_sales_summary': ('mv_category_performance',),
+}
+
+# 変更があった日の週・月を再集計するロールアップ（日次売上サマリから集計）
+SALES_ROLLUP_QUERIES = ('refresh_weekly_sales_rollup.sql', 'refresh_monthly_sales_rollup.sql')
+
+def read_s3_with_retry(bucket_name: str, object_key: str, max_retries: int = 3) -> Iterator[Tuple[str, List[Dict]]]:
     """
-    S3からデータを読み込み（リトライ対応）
+    S3からデータを読み込み（リトライ対応）、(データセット名, レコードのバッチ) のイテレータを返す
+    
+    JSONは本文を逐次パースするため、オブジェクト全体をメモリに保持しない（GETは最初のバッチの読み込み時に行う）。
+    Parquetファイル（etl-data/YYYY-MM-DD/<dataset>.parquet）は該当データセットのみを返す
     """
+    parquet_dataset = dataset_from_key(object_key) if object_key.endswith('.parquet') else None
+    
+    if parquet_dataset:
+        body = get_object_with_retry(bucket_name, object_key, max_retries, read=True)
+        return ((parquet_dataset, batch) for batch in iter_parquet_batches(body, LOAD_BATCH_SIZE))
+    return iter_json_batches(get_object_with_retry(bucket_name, object_key, max_retries), LOAD_BATCH_SIZE)
+
+def read_manifest(bucket_name: str, object_key: str, max_retries: int = 3) -> Dict[str, Any]:
+    """
+    マニフェスト（etl-data/<partition>/_manifest.json）を読み込む
+    """
+    return json.loads(get_object_with_retry(bucket_name, object_key, max_retries, read=True).decode('utf-8'))
+
+def get_object_with_retry(bucket_name: str, object_key: str, max_retries: int = 3, read: bool = False):
+    """
+    S3オブジェクトを取得（リトライ対応）
+    
+    read=True の場合は本文のバイト列、False の場合は逐次読み込み用のリーダーを返す。
+    リーダーは最初のread()でGETし、読み込み中の切断・タイムアウトは読み込み済みの位置からのRange GETで再開する
+    """
+    if not read:
+        return S3ResumableReader(bucket_name, object_key, s3_client, max_retries)
     for attempt in range(max_retries):
         try:
             response = s3_client.get_object(Bucket=bucket_name, Key=object_key)
-            data = json.loads(response['Body'].read().decode('utf-8'))
-            return data
+            return response['Body'].read()
         except Exception as e:
             if attempt == max_retries - 1:
                 logger.error(f"Failed to read S3 object after {max_retries} attempts: {str(e)}")
@@ -46,51 +135,25 @@ def lambda_handler(event, context):
     S3からデータを読み込んでAurora Serverless v2に挿入するLambda関数
     """
     try:
-        # S3イベントから情報を取得（複数レコード対応）
-        for record in event['Records']:
-            s3_event = record['s3']
-            bucket_name = s3_event['bucket']['name']
-            object_key = s3_event['object']['key']
-            
-            logger.info(f"Processing S3 object: s3://{bucket_name}/{object_key}")
-            
-            # 環境変数から設定を取得
-            target_db_host = os.environ['TARGET_DB_HOST']
-            target_db_name = os.environ['TARGET_DB_NAME']
-            secret_arn = os.environ['TARGET_DB_SECRET_ARN']
-            
-            # Secrets Managerから認証情報を取得
-            target_db_user, target_db_password = get_db_credentials(secret_arn)
-            
-            # S3からデータを読み込み（リトライ対応）
-            start_time = time.time()
-            data = read_s3_with_retry(bucket_name, object_key)
-            s3_read_time = time.time() - start_time
-            
-            metrics.add_metric(name="S3ReadTime", unit=MetricUnit.Seconds, value=s3_read_time)
-            
-            # DB接続とデータロード
-            with db_pool.get_connection(target_db_host, target_db_name, target_db_user, target_db_password) as conn:
-                start_time = time.time()
-                load_results = load_data_to_aurora(conn, data)
-                load_time = time.time() - start_time
-                
-                # メトリクスを記録
-                metrics.add_metric(name="DataLoadTime", unit=MetricUnit.Seconds, value=load_time)
-                for table, count in load_results.items():
-                    metrics.add_metric(name=f"RecordsLoaded_{table}", unit=MetricUnit.Count, value=count)
-            
-            logger.info("Load completed successfully", extra={
-                "s3_object": f"s3://{bucket_name}/{object_key}",
-                "load_results": load_results,
-                "load_time": load_time
-            })
+        # 環境変数から設定を取得
+        target_db_host = os.environ['TARGET_DB_HOST']
+        target_db_name = os.environ['TARGET_DB_NAME']
+        secret_arn = os.environ['TARGET_DB_SECRET_ARN']
         
+        # S3イベントの各レコードを並列に処理（レコードごとに別接続・別トランザクション）
+        connection_factory = partial(db_pool.get_connection_for_secret, target_db_host, target_db_name, secret_arn)
+        results = process_records(event['Records'], connection_factory)
+        
+        failed = [result for result in results if result['status'] == 'failed']
+        skipped = [result for result in results if result['status'] == 'skipped']
         return {
-            'statusCode': 200,
+            'statusCode': 500 if failed else 200,
             'body': json.dumps({
-                'message': 'ETL load completed successfully',
-                'records_processed': len(event['Records'])
+                'message': 'ETL load failed for some objects' if failed else 'ETL load completed successfully',
+                'records_processed': len(results) - len(failed),
+                'records_skipped': len(skipped),
+                'records_failed': len(failed),
+                'results': results
             })
         }
         
@@ -103,32 +166,328 @@ def lambda_handler(event, context):
             })
         }
 
+def process_records(records: List[Dict[str, Any]], connection_factory) -> List[Dict[str, Any]]:
+    """
+    S3イベントレコードを並列に処理し、レコードごとの結果を返す
+
+    S3オブジェクトのダウンロード（Parquet・マニフェスト）は LOAD_PREFETCH_OBJECTS 並列で先行して行い、
+    ロードは LOAD_CONCURRENCY 並列で実行する。同時に扱うオブジェクトは最大 LOAD_CONCURRENCY + LOAD_PREFETCH_OBJECTS 個。
+    JSONはロードの開始後に読み込みを始める（ロードの順番待ちの間にストリームがタイムアウトしないように）。
+    挿入・更新があったテーブルのマテリアライズドビューは、全オブジェクトのロード後に1度だけリフレッシュする。
+    """
+    slots = threading.BoundedSemaphore(LOAD_CONCURRENCY + LOAD_PREFETCH_OBJECTS)
+    changed_tables: Set[str] = set()
+    
+    with ThreadPoolExecutor(max_workers=max(LOAD_PREFETCH_OBJECTS, 1), thread_name_prefix='s3-read') as read_executor, \
+            ThreadPoolExecutor(max_workers=LOAD_CONCURRENCY, thread_name_prefix='load') as load_executor:
+        load_futures = []
+        for record in records:
+            slots.acquire()
+            bucket_name = record['s3']['bucket']['name']
+            object_key = record['s3']['object']['key']
+            reader = read_manifest if is_manifest_key(object_key) else read_s3_with_retry
+            read_future = read_executor.submit(run_timed, reader, bucket_name, object_key)
+            load_futures.append(load_executor.submit(
+                load_record, bucket_name, record['s3']['object'], read_future, connection_factory, slots,
+                changed_tables
+            ))
+        
+        results = [future.result() for future in load_futures]
+    
+    # マテリアライズドビューは全オブジェクトのロード後に1度だけリフレッシュ
+    if changed_tables:
+        with connection_factory() as conn:
+            refresh_materialized_views(conn, changed_tables)
+    return results
+
+def load_record(bucket_name: str, s3_object_info: Dict[str, Any], read_future, connection_factory,
+                slots, changed_tables: Set[str]) -> Dict[str, Any]:
+    """
+    1つのS3オブジェクトをロードし、結果（成功・スキップ・失敗）を返す
+    
+    台帳に同じオブジェクト（バケット・キー・ETag・バージョン）が記録済みの場合はロードしない。
+    挿入・更新があったテーブルを changed_tables に追加する
+    """
+    object_key = s3_object_info['key']
+    s3_object = f"s3://{bucket_name}/{object_key}"
+    try:
+        ledger_key = get_ledger_key(bucket_name, s3_object_info)
+        loaded_at = find_loaded_object(connection_factory, ledger_key)
+        if loaded_at is not None:
+            logger.info(f"Skipping already loaded S3 object: {s3_object}", extra={"loaded_at": str(loaded_at)})
+            metrics.add_metric(name="LoadSkippedDuplicate", unit=MetricUnit.Count, value=1)
+            return {
+                's3_object': s3_object,
+                'status': 'skipped',
+                'loaded_at': str(loaded_at)
+            }
+        
+        payload, s3_read_time = read_future.result()
+        metrics.add_metric(name="S3ReadTime", unit=MetricUnit.Seconds, value=s3_read_time)
+        
+        logger.info(f"Processing S3 object: {s3_object}")
+        
+        if is_manifest_key(object_key):
+            # マニフェストの全パートをステージングしてから1度だけコミット
+            load_results, load_time = run_timed(load_manifest, connection_factory, bucket_name, payload, ledger_key,
+                                                changed_tables)
+        else:
+            # DB接続とデータロード（認証情報はレコード間でキャッシュを再利用）
+            with connection_factory() as conn:
+                load_results, load_time = run_timed(load_batches_to_aurora, conn, payload, ledger_key,
+                                                    changed_tables)
+        
+        # メトリクスを記録
+        metrics.add_metric(name="DataLoadTime", unit=MetricUnit.Seconds, value=load_time)
+        for table, count in load_results.items():
+            metrics.add_metric(name=f"RecordsLoaded_{table}", unit=MetricUnit.Count, value=count)
+        
+        logger.info("Load completed successfully", extra={
+            "s3_object": s3_object,
+            "load_results": load_results,
+            "load_time": load_time
+        })
+        return {
+            's3_object': s3_object,
+            'status': 'succeeded',
+            'load_results': load_results,
+            'load_time': round(load_time, 3)
+        }
+    
+    except Exception as e:
+        logger.error(f"Error loading {s3_object}: {str(e)}")
+        metrics.add_metric(name="LoadRecordError", unit=MetricUnit.Count, value=1)
+        return {
+            's3_object': s3_object,
+            'status': 'failed',
+            'error': str(e)
+        }
+    finally:
+        slots.release()
+
+def get_ledger_key(bucket_name: str, s3_object_info: Dict[str, Any]) -> Tuple[str, str, str, str]:
+    """
+    台帳のキー（バケット, キー, ETag, バージョンID）を返す
+    
+    S3イベントにETagが含まれない場合（手動実行など）はHEADで取得する。バージョニング無効のバケットはバージョンIDを空文字とする
+    """
+    object_key = s3_object_info['key']
+    etag = s3_object_info.get('eTag')
+    version_id = s3_object_info.get('versionId')
+    if not etag:
+        response = s3_client.head_object(Bucket=bucket_name, Key=object_key)
+        etag = response['ETag']
+        version_id = response.get('VersionId')
+    return bucket_name, object_key, etag.strip('"'), version_id or ''
+
+def find_loaded_object(connection_factory, ledger_key: Tuple[str, str, str, str]):
+    """台帳からロード済みの日時を取得（未ロードの場合はNone）"""
+    with connection_factory() as conn:
+        with conn.cursor() as cursor:
+            cursor.execute(sql_registry.get('select_load_ledger.sql'), ledger_key)
+            row = cursor.fetchone()
+        conn.rollback()
+    return row[0] if row else None
+
+def record_loaded_object(cursor, ledger_key: Tuple[str, str, str, str], load_results: Dict[str, int]):
+    """ロードしたオブジェクトを台帳に記録（コミットは呼び出し元のトランザクションで行う）"""
+    cursor.execute(sql_registry.get('insert_load_ledger.sql'), (*ledger_key, json.dumps(load_results)))
+
+def is_manifest_key(object_key: str) -> bool:
+    """分割出力のマニフェストか"""
+    return object_key.rsplit('/', 1)[-1] == MANIFEST_FILE_NAME
+
+def load_manifest(connection_factory, bucket_name: str, manifest: Dict[str, Any],
+                  ledger_key: Optional[Tuple[str, str, str, str]] = None,
+                  changed_tables: Optional[Set[str]] = None) -> Dict[str, int]:
+    """
+    マニフェストに記載された全パートをロード
+    
+    1. 削除されずに残った古いステージングテーブルを削除し、データセットごとにUNLOGGEDのステージングテーブルを作成
+    2. パートを共有のスレッドプール（全マニフェストで MANIFEST_PART_CONCURRENCY 並列）で別々の接続からCOPY（行数・SHA-256を検証）
+    3. 全パートの成功後、1つのトランザクションでターゲットへマージし、台帳に記録してコミット
+    
+    いずれかのパートが失敗した場合はターゲットを変更しない。ステージングテーブルは最後に削除する。
+    挿入・更新があったテーブルを changed_tables に追加する（マテリアライズドビューのリフレッシュは呼び出し元で行う）
+    """
+    parts = manifest['parts']
+    datasets = sorted({part['dataset'] for part in parts})
+    unknown = [dataset for dataset in datasets if dataset not in TABLE_COLUMNS]
+    if unknown:
+        raise ValueError(f"Unknown datasets in manifest: {unknown}")
+    
+    # 作成時刻を名前に含め、削除されずに残った場合に後のロードで判別できるようにする
+    token = f"{int(time.time())}_{uuid.uuid4().hex[:12]}"
+    staging_tables = {dataset: f"etl_stage_{dataset}_{token}" for dataset in datasets}
+    
+    logger.info("Loading manifest", extra={
+        "partition": manifest.get('partition'),
+        "parts": len(parts),
+        "record_counts": manifest.get('record_counts')
+    })
+    
+    try:
+        with connection_factory() as conn:
+            with conn.cursor() as cursor:
+                drop_stale_staging_tables(cursor)
+                for dataset, staging_table in staging_tables.items():
+                    create_staging_table(cursor, staging_table, dataset, TABLE_COLUMNS[dataset], unlogged=True)
+            conn.commit()
+        
+        # パートを並列にステージング
+        futures = [
+            part_executor.submit(stage_part, connection_factory, bucket_name, part,
+                                 staging_tables[part['dataset']], manifest['format'])
+            for part in parts
+        ]
+        wait(futures)
+        errors = [future.exception() for future in futures if future.exception() is not None]
+        if errors:
+            raise RuntimeError(f"{len(errors)} of {len(parts)} manifest parts failed: {errors[0]}")
+        
+        load_results = {
+            dataset: sum(part['rows'] for part in parts if part['dataset'] == dataset)
+            for dataset in datasets
+        }
+        changes = {}
+        changed_dates = set()
+        
+        # 全パートが揃ってからターゲットへマージ（1回のコミット）
+        with connection_factory() as conn:
+            try:
+                with conn.cursor() as cursor:
+                    for dataset, staging_table in staging_tables.items():
+                        summary = merge_staging(cursor, staging_table, sql_registry.get(f'merge_{dataset}.sql'))
+                        changes[dataset] = count_changes(summary, load_results[dataset])
+                        changed_dates.update(get_changed_dates(summary))
+                    refresh_sales_rollups(cursor, changed_dates)
+                    if ledger_key:
+                        record_loaded_object(cursor, ledger_key, load_results)
+                conn.commit()
+            except Exception:
+                conn.rollback()
+                raise
+    finally:
+        drop_staging_tables(connection_factory, staging_tables.values())
+    
+    record_change_metrics(changes)
+    if changed_tables is not None:
+        changed_tables.update(get_changed_tables(changes))
+    return load_results
+
+def stage_part(connection_factory, bucket_name: str, part: Dict[str, Any], staging_table: str, output_format: str):
+    """
+    1つのパートをステージングテーブルにCOPYし、マニフェストの行数・SHA-256と一致した場合のみコミット
+    """
+    dataset = part['dataset']
+    columns = TABLE_COLUMNS[dataset]
+    body = HashingReader(get_object_with_retry(bucket_name, part['key']))
+    
+    if output_format == 'parquet':
+        batches = iter_parquet_batches(body.read(), LOAD_BATCH_SIZE)
+    else:
+        batches = (batch for batch_dataset, batch in iter_json_batches(body, LOAD_BATCH_SIZE) if batch_dataset == dataset)
+    rows = (tuple(record[column] for column in columns) for batch in batches for record in batch)
+    
+    with connection_factory() as conn:
+        try:
+            with conn.cursor() as cursor:
+                row_count = copy_rows(cursor, staging_table, columns, rows)
+            
+            # 末尾まで読み切ってからチェックサムを検証
+            body.read()
+            if row_count != part['rows']:
+                raise ValueError(f"Row count mismatch for {part['key']}: expected {part['rows']}, got {row_count}")
+            if body.hexdigest() != part['sha256']:
+                raise ValueError(f"Checksum mismatch for {part['key']}")
+            conn.commit()
+        except Exception:
+            conn.rollback()
+            raise
+    
+    metrics.add_metric(name="ManifestPartsLoaded", unit=MetricUnit.Count, value=1)
+    logger.info(f"Staged {row_count} rows from {part['key']}")
+
+def drop_stale_staging_tables(cursor):
+    """Lambdaのタイムアウト等で削除されずに残ったステージングテーブルを削除"""
+    cursor.execute(sql_registry.get('select_stale_staging_tables.sql'), (STAGING_TABLE_MAX_AGE_SECONDS,))
+    stale_tables = [row[0] for row in cursor.fetchall()]
+    for staging_table in stale_tables:
+        drop_table(cursor, staging_table)
+    if stale_tables:
+        logger.warning(f"Dropped {len(stale_tables)} stale staging tables", extra={"tables": stale_tables})
+        metrics.add_metric(name="StaleStagingTablesDropped", unit=MetricUnit.Count, value=len(stale_tables))
+
+def drop_staging_tables(connection_factory, staging_tables: Iterable[str]):
+    """ステージングテーブルを削除（失敗してもロード結果には影響させない）"""
+    try:
+        with connection_factory() as conn:
+            with conn.cursor() as cursor:
+                for staging_table in staging_tables:
+                    drop_table(cursor, staging_table)
+            conn.commit()
+    except Exception as e:
+        logger.error(f"Failed to drop staging tables: {str(e)}")
+        metrics.add_metric(name="StagingCleanupError", unit=MetricUnit.Count, value=1)
+
+class HashingReader:
+    """読み込んだバイト列のSHA-256を計算するファイルライクオブジェクト"""
+    def __init__(self, fileobj):
+        self.fileobj = fileobj
+        self.sha256 = hashlib.sha256()
+    
+    def read(self, size: int = -1) -> bytes:
+        data = self.fileobj.read(size if size >= 0 else None)
+        self.sha256.update(data)
+        return data
+    
+    def hexdigest(self) -> str:
+        return self.sha256.hexdigest()
+
+def run_timed(func, *args):
+    """関数を実行し、結果と所要時間（秒）を返す"""
+    start_time = time.time()
+    result = func(*args)
+    return result, time.time() - start_time
+
 def load_data_to_aurora(conn, data: Dict[str, Any]) -> Dict[str, int]:
     """
-    データをAurora Serverless v2にロード
+    データをAurora Serverless v2にロードし、挿入・更新があったテーブルのマテリアライズドビューをリフレッシュ
+    """
+    changed_tables = set()
+    results = load_batches_to_aurora(conn, data.items(), changed_tables=changed_tables)
+    refresh_materialized_views(conn, changed_tables)
+    return results
+
+def load_batches_to_aurora(conn, batches: Iterable[Tuple[str, List[Dict]]],
+                           ledger_key: Optional[Tuple[str, str, str, str]] = None,
+                           changed_tables: Optional[Set[str]] = None) -> Dict[str, int]:
+    """
+    (データセット名, レコードのバッチ) を順にUPSERTし、最後に1度だけコミットする
+    
+    ledger_key を指定した場合は同じトランザクションで台帳に記録する（ロードと記録の一方だけが残ることはない）。
+    挿入・更新があったテーブルを changed_tables に追加する（マテリアライズドビューのリフレッシュは呼び出し元で行う）
     """
     cursor = conn.cursor()
     results = {}
+    changes = {}
+    changed_dates = set()
     
     try:
-        # 顧客分析データの挿入/更新
-        if 'customer_analytics' in data and data['customer_analytics']:
-            customer_count = upsert_customer_analytics(cursor, data['customer_analytics'])
-            results['customer_analytics'] = customer_count
-            logger.info(f"Processed {customer_count} customer analytics records")
-        
-        # 商品売上サマリの挿入/更新
-        if 'product_sales_summary' in data and data['product_sales_summary']:
-            product_count = upsert_product_sales_summary(cursor, data['product_sales_summary'])
-            results['product_sales_summary'] = product_count
-            logger.info(f"Processed {product_count} product sales summary records")
-        
-        # 日次売上サマリの挿入/更新
-        if 'daily_sales_summary' in data and data['daily_sales_summary']:
-            daily_count = upsert_daily_sales_summary(cursor, data['daily_sales_summary'])
-            results['daily_sales_summary'] = daily_count
-            logger.info(f"Processed {daily_count} daily sales summary records")
+        for dataset, records in batches:
+            upsert = UPSERT_FUNCTIONS.get(dataset)
+            if upsert is None or not records:
+                continue
+            batch_changes, batch_dates = upsert(cursor, records)
+            results[dataset] = results.get(dataset, 0) + sum(batch_changes.values())
+            changes[dataset] = {
+                change: changes.get(dataset, {}).get(change, 0) + count for change, count in batch_changes.items()
+            }
+            changed_dates.update(batch_dates)
         
+        refresh_sales_rollups(cursor, changed_dates)
+        if ledger_key:
+            record_loaded_object(cursor, ledger_key, results)
         conn.commit()
         
     except Exception as e:
@@ -137,66 +496,126 @@ def load_data_to_aurora(conn, data: Dict[str, Any]) -> Dict[str, int]:
     finally:
         cursor.close()
     
+    record_change_metrics(changes)
+    if changed_tables is not None:
+        changed_tables.update(get_changed_tables(changes))
     return results
 
-def upsert_customer_analytics(cursor, customer_data: List[Dict]) -> int:
+def count_changes(summary_rows: List[tuple], row_count: int) -> Dict[str, int]:
     """
-    顧客分析データのUPSERT
+    UPSERT / マージがSQL側で集計した (挿入行数, 更新行数[, 変更があった日]) から挿入・更新・変更なしの行数を集計
+    
+    execute_values はページごとに1行を返すため合計する。
+    内容が変わらない行は ON CONFLICT ... WHERE で更新されず、挿入・更新のいずれにも数えられない
+    """
+    inserted = sum(row[0] for row in summary_rows)
+    updated = sum(row[1] for row in summary_rows)
+    return {
+        'inserted': inserted,
+        'updated': updated,
+        'unchanged': row_count - inserted - updated
+    }
+
+def record_change_metrics(changes: Dict[str, Dict[str, int]]):
+    """テーブル別の挿入・更新・変更なしの行数をメトリクスとログに記録（コミット後に呼び出す）"""
+    for dataset, counts in changes.items():
+        metrics.add_metric(name=f"RowsInserted_{dataset}", unit=MetricUnit.Count, value=counts['inserted'])
+        metrics.add_metric(name=f"RowsUpdated_{dataset}", unit=MetricUnit.Count, value=counts['updated'])
+        metrics.add_metric(name=f"RowsUnchanged_{dataset}", unit=MetricUnit.Count, value=counts['unchanged'])
+        logger.info(f"Processed {sum(counts.values())} {dataset} records", extra=counts)
+
+def get_changed_tables(changes: Dict[str, Dict[str, int]]) -> Set[str]:
+    """行の挿入・更新があったテーブル"""
+    return {dataset for dataset, counts in changes.items() if counts['inserted'] + counts['updated'] > 0}
+
+def get_changed_dates(summary_rows: List[tuple]) -> Set:
+    """日次売上サマリのUPSERT / マージで挿入・更新された日（集計結果の3列目。他のテーブルは集計結果に含まない）"""
+    return {date for row in summary_rows if len(row) > 2 and row[2] for date in row[2]}
+
+def refresh_sales_rollups(cursor, changed_dates: Set):
     """
-    upsert_query = load_sql_file('upsert_customer_analytics.sql')
+    変更があった日を含む週・月のロールアップのみを日次売上サマリから再集計
     
-    values = [
-        (
-            record['customer_id'],
-            record['total_orders'],
-            record['total_amount'],
-            record['avg_order_value'],
-            record['last_order_date'],
-            record['region']
-        )
-        for record in customer_data
-    ]
+    ロードと同じトランザクションで実行するため、ロードとロールアップの一方だけがコミットされることはない。
+    同じ週・月に変更がある並行ロードは、再集計の前に取得する週・月ごとのアドバイザリロックで直列化する。
+    ロックは再集計とは別の文で取得するため、待機した場合も再集計の文は先のロードのコミット後のスナップショットで
+    実行される（READ COMMITTEDの場合）。ロード以外で日次売上サマリを直接変更した場合は、その週・月に次に変更が
+    あるまでロールアップに反映されない
+    """
+    if not changed_dates:
+        return
+    dates = sorted(changed_dates)
+    cursor.execute(sql_registry.get('lock_sales_rollup_periods.sql'), {'changed_dates': dates})
+    for query_file in SALES_ROLLUP_QUERIES:
+        cursor.execute(sql_registry.get(query_file), (dates,))
+    logger.info(f"Refreshed sales rollups for {len(changed_dates)} changed dates",
+                extra={"first_date": str(min(changed_dates)), "last_date": str(max(changed_dates))})
+
+def refresh_materialized_views(conn, changed_tables: Set[str]):
+    """
+    挿入・更新があったテーブルのマテリアライズドビューをCONCURRENTLYでリフレッシュ（ロードのコミット後に呼び出す）
     
-    execute_values(cursor, upsert_query, values)
-    return len(values)
+    ビュー全体を再計算するため、ロードごとではなく呼び出し（process_records）ごとに1度だけ実行する。
+    リフレッシュ中も参照はブロックされない。失敗してもロード済みのデータには影響しないため、
+    エラーを記録して続行する（次回のロードで再度リフレッシュされる）
+    """
+    views = [view for dataset in sorted(changed_tables) for view in MATERIALIZED_VIEWS.get(dataset, ())]
+    for view in views:
+        start_time = time.time()
+        try:
+            with conn.cursor() as cursor:
+                cursor.execute(sql.SQL("REFRESH MATERIALIZED VIEW CONCURRENTLY {}").format(sql.Identifier(view)))
+            conn.commit()
+        except Exception as e:
+            conn.rollback()
+            logger.error(f"Error refreshing materialized view {view}: {str(e)}")
+            metrics.add_metric(name="ViewRefreshError", unit=MetricUnit.Count, value=1)
+            continue
+        metrics.add_metric(name=f"ViewRefreshTime_{view}", unit=MetricUnit.Seconds, value=time.time() - start_time)
+
+def upsert_customer_analytics(cursor, customer_data: List[Dict]) -> Tuple[Dict[str, int], Set]:
+    """
+    顧客分析データのUPSERT
+    """
+    return upsert_rows(cursor, 'customer_analytics', CUSTOMER_ANALYTICS_COLUMNS, customer_data)
 
-def upsert_product_sales_summary(cursor, product_data: List[Dict]) -> int:
+def upsert_product_sales_summary(cursor, product_data: List[Dict]) -> Tuple[Dict[str, int], Set]:
     """
     商品売上サマリのUPSERT
     """
-    upsert_query = load_sql_file('upsert_product_sales_summary.sql')
-    
-    values = [
-        (
-            record['product_id'],
-            record['category'],
-            record['total_quantity'],
-            record['total_revenue'],
-            record['order_count'],
-            record['date']
-        )
-        for record in product_data
-    ]
-    
-    execute_values(cursor, upsert_query, values)
-    return len(values)
+    return upsert_rows(cursor, 'product_sales_summary', PRODUCT_SALES_SUMMARY_COLUMNS, product_data)
 
-def upsert_daily_sales_summary(cursor, daily_data: List[Dict]) -> int:
+def upsert_daily_sales_summary(cursor, daily_data: List[Dict]) -> Tuple[Dict[str, int], Set]:
     """
     日次売上サマリのUPSERT
     """
-    upsert_query = load_sql_file('upsert_daily_sales_summary.sql')
-    
-    values = [
-        (
-            record['date'],
-            record['total_orders'],
-            record['total_revenue'],
-            record['unique_customers'],
-            record['region']
-        )
-        for record in daily_data
-    ]
-    
-    execute_values(cursor, upsert_query, values)
-    return len(values)
\ No newline at end of file
+    return upsert_rows(cursor, 'daily_sales_summary', DAILY_SALES_SUMMARY_COLUMNS, daily_data)
+
+def upsert_rows(cursor, table: str, columns: tuple, records: List[Dict]) -> Tuple[Dict[str, int], Set]:
+    """
+    レコードをテーブルにUPSERTし、(挿入・更新・変更なしの行数, 挿入・更新された日) を返す
+
+    BULK_LOAD_THRESHOLD 行以上の場合はCOPYで一時ステージングテーブルに流し込み、
+    merge_<table>.sql の1文でマージする。それ未満は upsert_<table>.sql を execute_values で実行する。
+    いずれも row_hash が一致する（内容が変わらない）行は更新しない。
+    RETURNINGの結果はSQL側で集計するため、ロードした行数によらず受け取るのは集計結果のみ。
+    """
+    values = (tuple(record[column] for column in columns) for record in records)
+    
+    if len(records) >= BULK_LOAD_THRESHOLD:
+        logger.info(f"Using bulk load for {table}", extra={"rows": len(records)})
+        metrics.add_metric(name=f"BulkLoad_{table}", unit=MetricUnit.Count, value=1)
+        row_count, summary = bulk_merge(cursor, table, columns, values, sql_registry.get(f'merge_{table}.sql'))
+        return count_changes(summary, row_count), get_changed_dates(summary)
+    
+    upsert_query = sql_registry.get(f'upsert_{table}.sql')
+    summary = execute_values(cursor, upsert_query, list(values), page_size=UPSERT_PAGE_SIZE, fetch=True)
+    return count_changes(summary, len(records)), get_changed_dates(summary)
+
+
+# データセット名 -> UPSERT関数
+UPSERT_FUNCTIONS = {
+    'customer_analytics': upsert_customer_analytics,
+    'product_sales_summary': upsert_product_sales_summary,
+    'daily_sales_summary': upsert_daily_sales_summary,
+}
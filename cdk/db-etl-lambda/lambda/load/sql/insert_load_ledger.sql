@@ -0,0 +1,4 @@
+-- ロードしたS3オブジェクトを台帳に記録（ロードと同じトランザクションで実行）
+INSERT INTO etl_load_ledger (bucket, object_key, etag, version_id, record_counts)
+VALUES (%s, %s, %s, %s, %s)
+ON CONFLICT (bucket, object_key, etag, version_id) DO NOTHING
\ No newline at end of file
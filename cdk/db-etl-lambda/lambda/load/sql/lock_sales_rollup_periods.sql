@@ -0,0 +1,12 @@
+-- 変更があった日を含む週・月のロールアップを再集計する前に、週・月ごとのアドバイザリロック（トランザクション終了まで）を取得
+-- 同じ週・月を再集計する並行ロードを直列化し、後のロードの再集計が先にコミットされた日次の変更を含むようにする
+-- デッドロックを避けるため、常に同じ順序（期間の文字列順）で取得する
+SELECT pg_advisory_xact_lock(hashtext(period))
+FROM (
+    SELECT 'weekly:' || DATE_TRUNC('week', changed_date)::date AS period
+    FROM UNNEST(%(changed_dates)s::date[]) AS changed_date
+    UNION
+    SELECT 'monthly:' || DATE_TRUNC('month', changed_date)::date
+    FROM UNNEST(%(changed_dates)s::date[]) AS changed_date
+) AS periods
+ORDER BY period
@@ -0,0 +1,20 @@
+-- 日次売上サマリのマージ（ステージングテーブルから一括UPSERT）
+-- 挿入・更新した行はRETURNINGの結果をSQL側で集計して1行で返す（内容が変わらず更新しなかった行は含まない）
+WITH changed AS (
+    INSERT INTO daily_sales_summary (date, total_orders, total_revenue, unique_customers, region)
+    SELECT date, total_orders, total_revenue, unique_customers, region
+    FROM {staging_table}
+    ON CONFLICT (date, region)
+    DO UPDATE SET
+        total_orders = EXCLUDED.total_orders,
+        total_revenue = EXCLUDED.total_revenue,
+        unique_customers = EXCLUDED.unique_customers,
+        updated_at = CURRENT_TIMESTAMP
+    WHERE daily_sales_summary.row_hash IS DISTINCT FROM EXCLUDED.row_hash
+    RETURNING (xmax = 0) AS inserted, date
+)
+SELECT
+    count(*) FILTER (WHERE inserted) AS inserted,
+    count(*) FILTER (WHERE NOT inserted) AS updated,
+    array_agg(DISTINCT date) AS changed_dates
+FROM changed
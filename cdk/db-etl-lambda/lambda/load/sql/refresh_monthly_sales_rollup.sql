@@ -0,0 +1,23 @@
+-- 変更があった日を含む月の月次売上ロールアップを日次売上サマリから再集計
+WITH target_months AS (
+    SELECT DISTINCT DATE_TRUNC('month', changed_date)::date AS month_start
+    FROM UNNEST(%s::date[]) AS changed_date
+)
+INSERT INTO monthly_sales_rollup (month_start, monthly_orders, monthly_revenue, monthly_unique_customers, avg_monthly_order_value)
+SELECT
+    target_months.month_start,
+    SUM(d.total_orders),
+    SUM(d.total_revenue),
+    SUM(d.unique_customers),
+    AVG(d.total_revenue / NULLIF(d.total_orders, 0))
+FROM target_months
+JOIN daily_sales_summary d
+    ON d.date >= target_months.month_start AND d.date < (target_months.month_start + INTERVAL '1 month')::date
+GROUP BY target_months.month_start
+ON CONFLICT (month_start)
+DO UPDATE SET
+    monthly_orders = EXCLUDED.monthly_orders,
+    monthly_revenue = EXCLUDED.monthly_revenue,
+    monthly_unique_customers = EXCLUDED.monthly_unique_customers,
+    avg_monthly_order_value = EXCLUDED.avg_monthly_order_value,
+    updated_at = CURRENT_TIMESTAMP
\ No newline at end of file
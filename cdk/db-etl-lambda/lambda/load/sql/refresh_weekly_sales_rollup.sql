@@ -0,0 +1,23 @@
+-- 変更があった日を含む週の週次売上ロールアップを日次売上サマリから再集計
+WITH target_weeks AS (
+    SELECT DISTINCT DATE_TRUNC('week', changed_date)::date AS week_start
+    FROM UNNEST(%s::date[]) AS changed_date
+)
+INSERT INTO weekly_sales_rollup (week_start, weekly_orders, weekly_revenue, weekly_unique_customers, active_regions)
+SELECT
+    target_weeks.week_start,
+    SUM(d.total_orders),
+    SUM(d.total_revenue),
+    SUM(d.unique_customers),
+    COUNT(DISTINCT d.region)
+FROM target_weeks
+JOIN daily_sales_summary d
+    ON d.date >= target_weeks.week_start AND d.date < target_weeks.week_start + 7
+GROUP BY target_weeks.week_start
+ON CONFLICT (week_start)
+DO UPDATE SET
+    weekly_orders = EXCLUDED.weekly_orders,
+    weekly_revenue = EXCLUDED.weekly_revenue,
+    weekly_unique_customers = EXCLUDED.weekly_unique_customers,
+    active_regions = EXCLUDED.active_regions,
+    updated_at = CURRENT_TIMESTAMP
\ No newline at end of file
@@ -0,0 +1,3 @@
+-- ロード済みのS3オブジェクトか確認
+SELECT loaded_at FROM etl_load_ledger
+WHERE bucket = %s AND object_key = %s AND etag = %s AND version_id = %s
\ No newline at end of file
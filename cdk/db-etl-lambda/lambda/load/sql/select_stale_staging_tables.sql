@@ -0,0 +1,9 @@
+-- 作成から一定時間が経過したマニフェストのステージングテーブル（Lambdaのタイムアウト等で削除されなかったもの）
+-- テーブル名は etl_stage_<データセット>_<作成時刻（UNIX秒）>_<トークン>
+SELECT c.relname
+FROM pg_class c
+JOIN pg_namespace n ON n.oid = c.relnamespace
+WHERE c.relkind = 'r'
+  AND n.nspname = current_schema()
+  AND c.relname ~ '^etl_stage_[a-z_]+_[0-9]{10}_[0-9a-f]{12}$'
+  AND substring(c.relname from '_([0-9]{10})_[0-9a-f]{12}$')::bigint < extract(epoch FROM now()) - %s
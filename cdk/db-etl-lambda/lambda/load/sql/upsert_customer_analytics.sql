@@ -1,11 +1,20 @@
 -- 顧客分析データのUPSERT
-INSERT INTO customer_analytics (customer_id, total_orders, total_amount, avg_order_value, last_order_date, region)
-VALUES %s
-ON CONFLICT (customer_id) 
-DO UPDATE SET
-    total_orders = EXCLUDED.total_orders,
-    total_amount = EXCLUDED.total_amount,
-    avg_order_value = EXCLUDED.avg_order_value,
-    last_order_date = EXCLUDED.last_order_date,
-    region = EXCLUDED.region,
-    updated_at = CURRENT_TIMESTAMP
\ No newline at end of file
+-- 挿入・更新した行はRETURNINGの結果をSQL側で集計して1行で返す（内容が変わらず更新しなかった行は含まない）
+WITH changed AS (
+    INSERT INTO customer_analytics (customer_id, total_orders, total_amount, avg_order_value, last_order_date, region)
+    VALUES %s
+    ON CONFLICT (customer_id)
+    DO UPDATE SET
+        total_orders = EXCLUDED.total_orders,
+        total_amount = EXCLUDED.total_amount,
+        avg_order_value = EXCLUDED.avg_order_value,
+        last_order_date = EXCLUDED.last_order_date,
+        region = EXCLUDED.region,
+        updated_at = CURRENT_TIMESTAMP
+    WHERE customer_analytics.row_hash IS DISTINCT FROM EXCLUDED.row_hash
+    RETURNING (xmax = 0) AS inserted
+)
+SELECT
+    count(*) FILTER (WHERE inserted) AS inserted,
+    count(*) FILTER (WHERE NOT inserted) AS updated
+FROM changed
@@ -1,10 +1,19 @@
 -- 商品売上サマリのUPSERT
-INSERT INTO product_sales_summary (product_id, category, total_quantity, total_revenue, order_count, date)
-VALUES %s
-ON CONFLICT (product_id, date) 
-DO UPDATE SET
-    category = EXCLUDED.category,
-    total_quantity = EXCLUDED.total_quantity,
-    total_revenue = EXCLUDED.total_revenue,
-    order_count = EXCLUDED.order_count,
-    updated_at = CURRENT_TIMESTAMP
\ No newline at end of file
+-- 挿入・更新した行はRETURNINGの結果をSQL側で集計して1行で返す（内容が変わらず更新しなかった行は含まない）
+WITH changed AS (
+    INSERT INTO product_sales_summary (product_id, category, total_quantity, total_revenue, order_count, date)
+    VALUES %s
+    ON CONFLICT (product_id, date)
+    DO UPDATE SET
+        category = EXCLUDED.category,
+        total_quantity = EXCLUDED.total_quantity,
+        total_revenue = EXCLUDED.total_revenue,
+        order_count = EXCLUDED.order_count,
+        updated_at = CURRENT_TIMESTAMP
+    WHERE product_sales_summary.row_hash IS DISTINCT FROM EXCLUDED.row_hash
+    RETURNING (xmax = 0) AS inserted
+)
+SELECT
+    count(*) FILTER (WHERE inserted) AS inserted,
+    count(*) FILTER (WHERE NOT inserted) AS updated
+FROM changed
@@ -2,7 +2,23 @@
 ETL共通ユーティリティモジュール
 """
 
-from .db_utils import get_db_credentials, ConnectionPool
-from .sql_utils import load_sql_file
+from .db_utils import (
+    get_db_credentials, invalidate_db_credentials, ConnectionPool, PoolTimeoutError, open_connection
+)
+from .sql_utils import load_sql_file, SqlRegistry, get_sql_registry
+from .s3_utils import S3MultipartWriter, S3ResumableReader
+from .copy_utils import copy_rows, bulk_merge, create_staging_table, merge_staging, drop_table
+from .state_utils import S3StateStore
+from .json_utils import iter_json_batches
+from .formats import (
+    DATASET_SCHEMAS, PARQUET_COMPRESSION, MANIFEST_FILE_NAME, to_arrow_table, dataset_from_key,
+    read_parquet_records, iter_parquet_batches
+)
 
-__all__ = ['get_db_credentials', 'ConnectionPool', 'load_sql_file']
\ No newline at end of file
+__all__ = [
+    'get_db_credentials', 'invalidate_db_credentials', 'ConnectionPool', 'PoolTimeoutError', 'open_connection',
+    'load_sql_file', 'SqlRegistry', 'get_sql_registry', 'S3MultipartWriter', 'S3ResumableReader',
+    'copy_rows', 'bulk_merge', 'create_staging_table', 'merge_staging', 'drop_table',
+    'S3StateStore', 'DATASET_SCHEMAS', 'PARQUET_COMPRESSION', 'MANIFEST_FILE_NAME', 'to_arrow_table',
+    'dataset_from_key', 'read_parquet_records', 'iter_parquet_batches', 'iter_json_batches',
+]
\ No newline at end of file
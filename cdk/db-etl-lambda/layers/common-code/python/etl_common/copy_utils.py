@@ -0,0 +1,118 @@
+"""
+COPYによる一括ロード関連のユーティリティ
+"""
+import io
+from typing import Iterable, List, Sequence, Tuple
+from psycopg2 import sql
+from aws_lambda_powertools import Logger
+
+logger = Logger()
+
+
+class CsvRowStream(io.RawIOBase):
+    """
+    行のイテレータをCSVとして逐次読み出すファイルライクオブジェクト（COPY FROM STDIN用）
+
+    全行をCSV文字列として組み立てずに、COPYが読み出す分だけエンコードする。
+    NoneはクォートなしのNULL、それ以外の値はすべてクォートして出力する（空文字列とNULLを区別するため）。
+    """
+    def __init__(self, rows: Iterable[Sequence]):
+        self._rows = iter(rows)
+        self._pending = b''
+        self.row_count = 0
+
+    def readable(self) -> bool:
+        return True
+
+    def readinto(self, buffer) -> int:
+        while len(self._pending) < len(buffer):
+            row = next(self._rows, None)
+            if row is None:
+                break
+            self._pending += _encode_csv_row(row)
+            self.row_count += 1
+
+        size = min(len(buffer), len(self._pending))
+        buffer[:size] = self._pending[:size]
+        self._pending = self._pending[size:]
+        return size
+
+
+def _encode_csv_row(row: Sequence) -> bytes:
+    """1行をPostgreSQLのCSV形式にエンコード"""
+    return (','.join(
+        '' if value is None else '"' + str(value).replace('"', '""') + '"' for value in row
+    ) + '\n').encode('utf-8')
+
+
+def copy_rows(cursor, table: str, columns: Sequence[str], rows: Iterable[Sequence]) -> int:
+    """
+    行をCOPY FROM STDIN（CSV形式）でテーブルに流し込む
+
+    Returns:
+        投入した行数
+    """
+    stream = CsvRowStream(rows)
+    copy_query = sql.SQL("COPY {} ({}) FROM STDIN WITH (FORMAT csv)").format(
+        sql.Identifier(table),
+        sql.SQL(', ').join(map(sql.Identifier, columns))
+    )
+    cursor.copy_expert(copy_query.as_string(cursor), io.BufferedReader(stream))
+    return stream.row_count
+
+
+def create_staging_table(cursor, staging_table: str, target_table: str, columns: Sequence[str],
+                         unlogged: bool = False):
+    """
+    ターゲットと同じ列型で空のステージングテーブルを作成
+
+    unlogged=False の場合はセッション内の一時テーブル、True の場合は複数の接続から
+    書き込めるUNLOGGEDテーブル（呼び出し元で削除する）を作成する。
+    """
+    kind = sql.SQL("UNLOGGED TABLE") if unlogged else sql.SQL("TEMP TABLE")
+    cursor.execute(sql.SQL("CREATE {} {} AS SELECT {} FROM {} WITH NO DATA").format(
+        kind,
+        sql.Identifier(staging_table),
+        sql.SQL(', ').join(map(sql.Identifier, columns)),
+        sql.Identifier(target_table)
+    ))
+
+
+def merge_staging(cursor, staging_table: str, merge_query: str) -> List[tuple]:
+    """
+    ステージングテーブルからターゲットへマージ
+
+    マージSQLはステージングテーブルを {staging_table} として参照する。
+    RETURNINGの結果を受け取る場合は、行数に比例して転送しないようマージSQL側で集計して返す
+
+    Returns:
+        マージSQLが返した行（結果がない場合は空）
+    """
+    cursor.execute(sql.SQL(merge_query).format(staging_table=sql.Identifier(staging_table)))
+    return cursor.fetchall() if cursor.description else []
+
+
+def drop_table(cursor, table: str):
+    """テーブルを削除（存在しない場合は何もしない）"""
+    cursor.execute(sql.SQL("DROP TABLE IF EXISTS {}").format(sql.Identifier(table)))
+
+
+def bulk_merge(cursor, target_table: str, columns: Sequence[str], rows: Iterable[Sequence],
+               merge_query: str) -> Tuple[int, List[tuple]]:
+    """
+    一時ステージングテーブルにCOPYで投入し、1回のINSERT ... ON CONFLICTでターゲットにマージする
+
+    作成・削除は呼び出し元のトランザクション内で行うため、ロールバック時は何も残らない。
+
+    Returns:
+        (ステージングに投入した行数, マージSQLが返した行)
+    """
+    staging_table = f"staging_{target_table}"
+
+    create_staging_table(cursor, staging_table, target_table, columns)
+    row_count = copy_rows(cursor, staging_table, columns, rows)
+    result = merge_staging(cursor, staging_table, merge_query)
+    drop_table(cursor, staging_table)
+
+    logger.info(f"Bulk merged {row_count} rows into {target_table}")
+    return row_count, result
@@ -2,7 +2,12 @@
 データベース関連のユーティリティ
 """
 import json
+import os
+import threading
+import time
+from typing import Dict, List, Tuple
 import psycopg2
+import psycopg2.extensions
 from contextlib import contextmanager
 import boto3
 from aws_lambda_powertools import Logger, Metrics
@@ -15,49 +20,318 @@ metrics = Metrics()
 # クライアント初期化
 secrets_client = boto3.client('secretsmanager')
 
+# 接続プール設定
+DB_POOL_MIN_SIZE = int(os.environ.get('DB_POOL_MIN_SIZE', '0'))
+DB_POOL_MAX_SIZE = int(os.environ.get('DB_POOL_MAX_SIZE', '4'))
+DB_POOL_MAX_IDLE_SECONDS = int(os.environ.get('DB_POOL_MAX_IDLE_SECONDS', '300'))
+DB_POOL_HEALTH_CHECK_AFTER_SECONDS = int(os.environ.get('DB_POOL_HEALTH_CHECK_AFTER_SECONDS', '30'))
+DB_POOL_CHECKOUT_TIMEOUT_SECONDS = int(os.environ.get('DB_POOL_CHECKOUT_TIMEOUT_SECONDS', '30'))
 
-def get_db_credentials(secret_arn: str) -> tuple:
+
+# 認証情報キャッシュの有効期間（秒）
+SECRET_CACHE_TTL_SECONDS = int(os.environ.get('SECRET_CACHE_TTL_SECONDS', '300'))
+
+# シークレットARN -> (ユーザー名, パスワード, 有効期限)
+_credentials_cache: Dict[str, Tuple[str, str, float]] = {}
+_credentials_lock = threading.Lock()
+
+
+def get_db_credentials(secret_arn: str, force_refresh: bool = False) -> tuple:
     """
     Secrets Managerから認証情報を取得
+    
+    取得結果はシークレットARNごとに SECRET_CACHE_TTL_SECONDS 秒間キャッシュする。
+    パスワードのローテーション等で認証に失敗した場合は force_refresh=True で再取得する。
     """
+    if not force_refresh:
+        with _credentials_lock:
+            cached = _credentials_cache.get(secret_arn)
+        if cached and time.time() < cached[2]:
+            metrics.add_metric(name="SecretCacheHit", unit=MetricUnit.Count, value=1)
+            return cached[0], cached[1]
+    
+    metrics.add_metric(name="SecretCacheMiss", unit=MetricUnit.Count, value=1)
     try:
         response = secrets_client.get_secret_value(SecretId=secret_arn)
         secret = json.loads(response['SecretString'])
-        return secret['username'], secret['password']
     except Exception as e:
         logger.error(f"Failed to retrieve secret: {str(e)}")
         metrics.add_metric(name="SecretRetrievalError", unit=MetricUnit.Count, value=1)
         raise
+    
+    with _credentials_lock:
+        _credentials_cache[secret_arn] = (secret['username'], secret['password'], time.time() + SECRET_CACHE_TTL_SECONDS)
+    return secret['username'], secret['password']
 
 
-class ConnectionPool:
-    """DB接続プールの管理"""
+def invalidate_db_credentials(secret_arn: str):
+    """キャッシュ済みの認証情報を破棄"""
+    with _credentials_lock:
+        _credentials_cache.pop(secret_arn, None)
+
+
+def is_auth_error(error: Exception) -> bool:
+    """認証失敗（パスワード不一致）による接続エラーか判定"""
+    return isinstance(error, psycopg2.OperationalError) and (
+        getattr(error, 'pgcode', None) == '28P01' or 'password authentication failed' in str(error)
+    )
+
+
+def connect(host, database, user, password, port=5432):
+    """タイムアウト・キープアライブ設定付きでDBに接続"""
+    return psycopg2.connect(
+        host=host,
+        database=database,
+        user=user,
+        password=password,
+        port=port,
+        connect_timeout=10,
+        keepalives=1,
+        keepalives_idle=30,
+        keepalives_interval=10,
+        keepalives_count=5
+    )
+
+
+@contextmanager
+def open_connection(host, database, user, password, port=5432):
+    """
+    専用の接続をコンテキストマネージャとして取得（終了時にクローズ）
+
+    スレッドごとに別の接続が必要な並列処理で使用する
+    """
+    try:
+        conn = connect(host, database, user, password, port)
+    except psycopg2.OperationalError as e:
+        logger.error(f"Database connection error: {str(e)}")
+        metrics.add_metric(name="DBConnectionError", unit=MetricUnit.Count, value=1)
+        raise
+
+    try:
+        yield conn
+    finally:
+        conn.close()
+
+
+class PoolTimeoutError(Exception):
+    """接続プールから制限時間内に接続を取得できなかった"""
+
+
+class _PooledConnection:
+    """プール内の接続と利用状況"""
+    def __init__(self, conn):
+        self.conn = conn
+        self.created_at = time.time()
+        # Lambdaのフリーズ中も進む壁時計で記録し、解凍後の長いアイドルを検出する
+        self.last_used = self.created_at
+
+
+class _KeyedPool:
+    """接続先（ホスト・ポート・DB・ユーザー）1つ分の接続の集合"""
     def __init__(self):
-        self.conn = None
+        self.idle: List[_PooledConnection] = []
+        self.size = 0
+
+
+class ConnectionPool:
+    """
+    DB接続プールの管理
+
+    接続先ごとに最小・最大接続数を持つ有界なプールを保持し、スレッド間で安全に接続を貸し出す。
+    貸し出し時にアイドル時間が長い接続（Lambdaのフリーズ・解凍後を含む）はヘルスチェックし、
+    切断されていれば破棄して新しい接続に置き換える。
+    """
+    def __init__(self, min_size: int = DB_POOL_MIN_SIZE, max_size: int = DB_POOL_MAX_SIZE,
+                 max_idle_seconds: int = DB_POOL_MAX_IDLE_SECONDS,
+                 health_check_after_seconds: int = DB_POOL_HEALTH_CHECK_AFTER_SECONDS,
+                 checkout_timeout: int = DB_POOL_CHECKOUT_TIMEOUT_SECONDS):
+        if min_size < 0 or max_size < 1 or min_size > max_size:
+            raise ValueError("Pool size must satisfy 0 <= min_size <= max_size and max_size >= 1")
+
+        self.min_size = min_size
+        self.max_size = max_size
+        self.max_idle_seconds = max_idle_seconds
+        self.health_check_after_seconds = health_check_after_seconds
+        self.checkout_timeout = checkout_timeout
+        self._pools: Dict[Tuple, _KeyedPool] = {}
+        self._condition = threading.Condition()
     
     @contextmanager
     def get_connection(self, host, database, user, password, port=5432):
-        """接続をコンテキストマネージャとして取得"""
+        """接続をコンテキストマネージャとして取得（終了時にプールへ返却）"""
+        key = (host, port, database, user)
+        entry = self._checkout(key, host, database, user, password, port)
+        with self._lease(key, entry) as conn:
+            yield conn
+
+    @contextmanager
+    def get_connection_for_secret(self, host, database, secret_arn: str, port=5432):
+        """
+        Secrets Managerの認証情報（キャッシュ済み）で接続を取得
+        
+        認証に失敗した場合は認証情報を再取得して1度だけ接続し直す
+        """
+        user, password = get_db_credentials(secret_arn)
         try:
-            if self.conn is None or self.conn.closed:
-                self.conn = psycopg2.connect(
-                    host=host,
-                    database=database,
-                    user=user,
-                    password=password,
-                    port=port,
-                    connect_timeout=10,
-                    keepalives=1,
-                    keepalives_idle=30,
-                    keepalives_interval=10,
-                    keepalives_count=5
-                )
-            yield self.conn
+            entry = self._checkout((host, port, database, user), host, database, user, password, port)
+        except psycopg2.OperationalError as e:
+            if not is_auth_error(e):
+                raise
+            logger.warning("Authentication failed with cached credentials, refreshing secret")
+            invalidate_db_credentials(secret_arn)
+            user, password = get_db_credentials(secret_arn, force_refresh=True)
+            entry = self._checkout((host, port, database, user), host, database, user, password, port)
+        
+        with self._lease((host, port, database, user), entry) as conn:
+            yield conn
+
+    @contextmanager
+    def _lease(self, key, entry: _PooledConnection):
+        """取り出した接続を利用者に渡し、終了時にプールへ返却"""
+        try:
+            yield entry.conn
         except psycopg2.OperationalError as e:
             logger.error(f"Database connection error: {str(e)}")
             metrics.add_metric(name="DBConnectionError", unit=MetricUnit.Count, value=1)
             raise
-        except Exception as e:
-            if self.conn:
-                self.conn.rollback()
-            raise
\ No newline at end of file
+        except Exception:
+            if not entry.conn.closed:
+                try:
+                    entry.conn.rollback()
+                except psycopg2.Error:
+                    pass
+            raise
+        finally:
+            self._checkin(key, entry)
+
+    def close_all(self):
+        """アイドル中の接続をすべてクローズ"""
+        with self._condition:
+            for pool in self._pools.values():
+                for entry in pool.idle:
+                    self._discard(pool, entry)
+                pool.idle.clear()
+            self._condition.notify_all()
+
+    def _checkout(self, key, host, database, user, password, port) -> _PooledConnection:
+        """プールから接続を取り出す（上限に達している場合は返却を待つ）"""
+        start_time = time.time()
+        deadline = start_time + self.checkout_timeout
+
+        with self._condition:
+            pool = self._pools.setdefault(key, _KeyedPool())
+            self._evict_idle(pool)
+
+            while True:
+                if pool.idle:
+                    entry = pool.idle.pop()
+                    break
+                if pool.size < self.max_size:
+                    # 接続はロック外で確立するため、先に枠を確保する
+                    pool.size += 1
+                    entry = None
+                    break
+
+                remaining = deadline - time.time()
+                if remaining <= 0:
+                    metrics.add_metric(name="DBPoolTimeout", unit=MetricUnit.Count, value=1)
+                    raise PoolTimeoutError(f"Timed out waiting for a connection to {host}/{database}")
+                self._condition.wait(remaining)
+
+        if entry is not None and not self._is_healthy(entry):
+            # 切断済みの接続は破棄し、同じ枠で接続し直す
+            entry.conn.close()
+            entry = None
+
+        if entry is None:
+            try:
+                entry = _PooledConnection(connect(host, database, user, password, port))
+            except Exception as e:
+                with self._condition:
+                    pool.size -= 1
+                    self._condition.notify()
+                if isinstance(e, psycopg2.OperationalError):
+                    logger.error(f"Database connection error: {str(e)}")
+                    metrics.add_metric(name="DBConnectionError", unit=MetricUnit.Count, value=1)
+                raise
+            self._prefill(key, host, database, user, password, port)
+
+        metrics.add_metric(name="DBPoolCheckoutWait", unit=MetricUnit.Milliseconds,
+                           value=(time.time() - start_time) * 1000)
+        return entry
+
+    def _checkin(self, key, entry: _PooledConnection):
+        """接続をプールへ返却（使用不能な接続は破棄）"""
+        conn = entry.conn
+        reusable = not conn.closed
+        if reusable and conn.get_transaction_status() != psycopg2.extensions.TRANSACTION_STATUS_IDLE:
+            # 開いたままのトランザクションを次の利用者に引き継がない
+            try:
+                conn.rollback()
+            except psycopg2.Error:
+                reusable = False
+
+        with self._condition:
+            pool = self._pools[key]
+            if reusable:
+                entry.last_used = time.time()
+                pool.idle.append(entry)
+            else:
+                self._discard(pool, entry)
+            self._condition.notify()
+
+    def _is_healthy(self, entry: _PooledConnection) -> bool:
+        """接続が利用可能か確認（一定時間以上アイドルだった場合のみ問い合わせる）"""
+        conn = entry.conn
+        if conn.closed or conn.get_transaction_status() == psycopg2.extensions.TRANSACTION_STATUS_UNKNOWN:
+            return False
+        if time.time() - entry.last_used < self.health_check_after_seconds:
+            return True
+
+        try:
+            with conn.cursor() as cursor:
+                cursor.execute("SELECT 1")
+            conn.rollback()
+            return True
+        except psycopg2.Error as e:
+            logger.warning(f"Discarding stale pooled connection: {str(e)}")
+            metrics.add_metric(name="DBPoolStaleConnection", unit=MetricUnit.Count, value=1)
+            return False
+
+    def _evict_idle(self, pool: _KeyedPool):
+        """最小接続数を超えるアイドル接続のうち、アイドル時間が上限を超えたものをクローズ（ロック内で呼び出す）"""
+        now = time.time()
+        for entry in list(pool.idle):
+            if pool.size <= self.min_size:
+                break
+            if now - entry.last_used > self.max_idle_seconds:
+                pool.idle.remove(entry)
+                self._discard(pool, entry)
+
+    def _prefill(self, key, host, database, user, password, port):
+        """最小接続数に満たない場合は接続を追加で確立"""
+        while True:
+            with self._condition:
+                pool = self._pools[key]
+                if pool.size >= self.min_size:
+                    return
+                pool.size += 1
+
+            try:
+                entry = _PooledConnection(connect(host, database, user, password, port))
+            except psycopg2.Error as e:
+                logger.warning(f"Failed to prefill connection pool: {str(e)}")
+                with self._condition:
+                    pool.size -= 1
+                return
+
+            with self._condition:
+                pool.idle.append(entry)
+                self._condition.notify()
+
+    @staticmethod
+    def _discard(pool: _KeyedPool, entry: _PooledConnection):
+        """接続をクローズしてプールの接続数から外す（ロック内で呼び出す）"""
+        pool.size -= 1
+        if not entry.conn.closed:
+            entry.conn.close()
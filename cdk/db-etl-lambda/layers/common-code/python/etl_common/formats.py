@@ -0,0 +1,85 @@
+"""
+ETLデータセットのスキーマと列指向フォーマット（Parquet）関連のユーティリティ
+"""
+import io
+from typing import Dict, Iterator, List, Any
+import pyarrow as pa
+import pyarrow.compute as pc
+import pyarrow.parquet as pq
+
+# 分割出力（パート + マニフェスト）のマニフェストファイル名
+MANIFEST_FILE_NAME = '_manifest.json'
+
+# データセットごとのスキーマ（ターゲットDBのテーブル定義に合わせる）
+DATASET_SCHEMAS = {
+    'customer_analytics': pa.schema([
+        ('customer_id', pa.int32()),
+        ('total_orders', pa.int64()),
+        ('total_amount', pa.decimal128(15, 2)),
+        ('avg_order_value', pa.decimal128(15, 2)),
+        ('last_order_date', pa.date32()),
+        ('region', pa.string()),
+    ]),
+    'product_sales_summary': pa.schema([
+        ('product_id', pa.int32()),
+        ('category', pa.string()),
+        ('total_quantity', pa.int64()),
+        ('total_revenue', pa.decimal128(15, 2)),
+        ('order_count', pa.int64()),
+        ('date', pa.date32()),
+    ]),
+    'daily_sales_summary': pa.schema([
+        ('date', pa.date32()),
+        ('total_orders', pa.int64()),
+        ('total_revenue', pa.decimal128(15, 2)),
+        ('unique_customers', pa.int64()),
+        ('region', pa.string()),
+    ]),
+}
+
+PARQUET_COMPRESSION = 'zstd'
+
+
+def to_arrow_table(dataset: str, data) -> pa.Table:
+    """
+    レコードのリストまたはDataFrameをデータセットのスキーマに沿ったArrowテーブルに変換
+
+    金額列はDB側（DECIMAL(15,2)）と同じく小数点以下2桁に丸める
+    """
+    schema = DATASET_SCHEMAS[dataset]
+
+    if isinstance(data, pa.Table):
+        table = data
+    elif hasattr(data, 'columns'):
+        table = pa.Table.from_pandas(data, preserve_index=False)
+    else:
+        table = pa.Table.from_pylist(data)
+
+    columns = []
+    for field in schema:
+        column = table[field.name]
+        if pa.types.is_decimal(field.type) and not pa.types.is_null(column.type):
+            column = pc.round(column, ndigits=field.type.scale, round_mode='half_towards_infinity')
+        columns.append(column.cast(field.type, safe=False))
+
+    return pa.Table.from_arrays(columns, schema=schema)
+
+
+def dataset_from_key(object_key: str) -> str:
+    """S3キー（etl-data/YYYY-MM-DD/<dataset>.parquet）からデータセット名を取得"""
+    dataset = object_key.rsplit('/', 1)[-1].rsplit('.', 1)[0]
+    if dataset not in DATASET_SCHEMAS:
+        raise ValueError(f"Unknown dataset in object key: {object_key}")
+    return dataset
+
+
+def read_parquet_records(body: bytes) -> List[Dict[str, Any]]:
+    """Parquetのバイト列をレコードのリストとして読み込む"""
+    return pq.read_table(io.BytesIO(body)).to_pylist()
+
+
+def iter_parquet_batches(body: bytes, batch_size: int) -> Iterator[List[Dict[str, Any]]]:
+    """Parquetのバイト列をレコードのバッチとして逐次読み込む"""
+    parquet_file = pq.ParquetFile(io.BytesIO(body))
+    for record_batch in parquet_file.iter_batches(batch_size=batch_size):
+        yield record_batch.to_pylist()
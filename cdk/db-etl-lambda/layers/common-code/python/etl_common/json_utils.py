@@ -0,0 +1,38 @@
+"""
+JSONの逐次パース関連のユーティリティ
+"""
+from typing import Any, Dict, Iterator, List, Tuple
+import ijson
+
+
+def iter_json_batches(fileobj, batch_size: int) -> Iterator[Tuple[str, List[Dict[str, Any]]]]:
+    """
+    {"<dataset>": [{...}, ...], ...} 形式のJSONを逐次パースし、(データセット名, レコードのバッチ) を返す
+
+    ストリーム全体やデータセット全体をメモリに保持せず、保持するのは最大 batch_size 件のレコードのみ。
+    数値はDecimal（整数はint）として読み込む。
+    """
+    dataset = None
+    item_prefix = None
+    builder = None
+    batch: List[Dict[str, Any]] = []
+
+    for prefix, event, value in ijson.parse(fileobj):
+        if builder is not None:
+            builder.event(event, value)
+            if prefix == item_prefix and event == 'end_map':
+                batch.append(builder.value)
+                builder = None
+                if len(batch) >= batch_size:
+                    yield dataset, batch
+                    batch = []
+        elif prefix == '' and event == 'map_key':
+            dataset = value
+            item_prefix = f'{value}.item'
+        elif prefix == item_prefix and event == 'start_map':
+            builder = ijson.ObjectBuilder()
+            builder.event(event, value)
+        elif prefix == dataset and event == 'end_array':
+            if batch:
+                yield dataset, batch
+                batch = []
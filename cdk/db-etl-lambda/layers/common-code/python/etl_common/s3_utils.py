@@ -0,0 +1,194 @@
+"""
+S3関連のユーティリティ
+"""
+import os
+import time
+import boto3
+from aws_lambda_powertools import Logger, Metrics
+from aws_lambda_powertools.metrics import MetricUnit
+
+# Lambda Powertools設定
+logger = Logger()
+metrics = Metrics()
+
+# マルチパートアップロードの最小パートサイズ（最終パートを除く）
+MIN_PART_SIZE = 5 * 1024 * 1024
+DEFAULT_PART_SIZE = int(os.environ.get('S3_PART_SIZE_MB', '8')) * 1024 * 1024
+
+
+class S3MultipartWriter:
+    """
+    書き込まれたバイト列をS3マルチパートアップロードのパートとして逐次送信するファイルライクオブジェクト
+
+    保持するのは送信前の1パート分のみのため、オブジェクト全体をメモリや/tmpに置かずにアップロードできる。
+    with文で使用すると正常終了時にアップロードを完了し、例外発生時は中断（abort）する。
+    """
+    def __init__(self, bucket: str, key: str, s3_client=None, part_size: int = DEFAULT_PART_SIZE,
+                 content_type: str = 'application/octet-stream'):
+        if part_size < MIN_PART_SIZE:
+            raise ValueError(f"part_size must be at least {MIN_PART_SIZE} bytes")
+
+        self.bucket = bucket
+        self.key = key
+        self.part_size = part_size
+        self.s3_client = s3_client or boto3.client('s3')
+        self._buffer = bytearray()
+        self._parts = []
+        self._bytes_written = 0
+        self._closed = False
+
+        response = self.s3_client.create_multipart_upload(Bucket=bucket, Key=key, ContentType=content_type)
+        self.upload_id = response['UploadId']
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc_value, traceback):
+        if exc_type is None:
+            self.close()
+        else:
+            self.abort()
+        return False
+
+    @property
+    def closed(self) -> bool:
+        return self._closed
+
+    def writable(self) -> bool:
+        return True
+
+    def tell(self) -> int:
+        return self._bytes_written
+
+    def flush(self):
+        pass
+
+    def write(self, data) -> int:
+        """データをバッファに追加し、パートサイズに達したらアップロード"""
+        if self._closed:
+            raise ValueError("I/O operation on closed S3MultipartWriter")
+
+        self._buffer.extend(data)
+        self._bytes_written += len(data)
+        while len(self._buffer) >= self.part_size:
+            self._upload_part(bytes(self._buffer[:self.part_size]))
+            del self._buffer[:self.part_size]
+        return len(data)
+
+    def close(self):
+        """残りのバッファを最終パートとして送信し、アップロードを完了"""
+        if self._closed:
+            return
+
+        try:
+            # パートが1つもない場合も空のパートでオブジェクトを作成する
+            if self._buffer or not self._parts:
+                self._upload_part(bytes(self._buffer))
+                self._buffer.clear()
+
+            self.s3_client.complete_multipart_upload(
+                Bucket=self.bucket,
+                Key=self.key,
+                UploadId=self.upload_id,
+                MultipartUpload={'Parts': self._parts}
+            )
+        except Exception:
+            self.abort()
+            raise
+
+        self._closed = True
+        metrics.add_metric(name="S3UploadParts", unit=MetricUnit.Count, value=len(self._parts))
+        logger.info(f"Multipart upload completed: s3://{self.bucket}/{self.key}", extra={
+            "parts": len(self._parts),
+            "size_bytes": self._bytes_written
+        })
+
+    def abort(self):
+        """アップロードを中断し、送信済みのパートを破棄"""
+        if self._closed:
+            return
+
+        self._closed = True
+        self._buffer.clear()
+        try:
+            self.s3_client.abort_multipart_upload(Bucket=self.bucket, Key=self.key, UploadId=self.upload_id)
+            logger.warning(f"Multipart upload aborted: s3://{self.bucket}/{self.key}")
+        except Exception as e:
+            logger.error(f"Failed to abort multipart upload: {str(e)}")
+            metrics.add_metric(name="S3UploadAbortError", unit=MetricUnit.Count, value=1)
+
+    def _upload_part(self, body: bytes):
+        part_number = len(self._parts) + 1
+        response = self.s3_client.upload_part(
+            Bucket=self.bucket,
+            Key=self.key,
+            UploadId=self.upload_id,
+            PartNumber=part_number,
+            Body=body
+        )
+        self._parts.append({'PartNumber': part_number, 'ETag': response['ETag']})
+
+
+class S3ResumableReader:
+    """
+    S3オブジェクトの本文を逐次読み込むファイルライクオブジェクト
+
+    最初のread()でGETするため、読み込みを始めるまで接続を保持しない。読み込み中のタイムアウト・切断は、
+    読み込み済みの位置からのRange GET（同じETagのオブジェクトのみ）で再開する。
+    """
+    def __init__(self, bucket: str, key: str, s3_client=None, max_retries: int = 3):
+        self.bucket = bucket
+        self.key = key
+        self.s3_client = s3_client or boto3.client('s3')
+        self.max_retries = max_retries
+        self._body = None
+        self._etag = None
+        self._content_length = None
+        self._position = 0
+
+    def readable(self) -> bool:
+        return True
+
+    def tell(self) -> int:
+        return self._position
+
+    def read(self, size: int = -1) -> bytes:
+        for attempt in range(self.max_retries):
+            try:
+                if self._body is None:
+                    if self._content_length is not None and self._position >= self._content_length:
+                        return b''
+                    self._open()
+                data = self._body.read(size if size is not None and size >= 0 else None)
+                self._position += len(data)
+                return data
+            except Exception as e:
+                self._discard_body()
+                if attempt == self.max_retries - 1:
+                    logger.error(f"Failed to read S3 object after {self.max_retries} attempts: {str(e)}")
+                    metrics.add_metric(name="S3ReadError", unit=MetricUnit.Count, value=1)
+                    raise
+                logger.warning(f"S3 read attempt {attempt + 1} failed at byte {self._position}, retrying: {str(e)}")
+                time.sleep(2 ** attempt)  # 指数バックオフ
+
+    def close(self):
+        self._discard_body()
+
+    def _open(self):
+        params = {'Bucket': self.bucket, 'Key': self.key}
+        if self._etag is not None:
+            # 読み込み済みの位置から、同じ内容のオブジェクトの続きを取得
+            params.update(IfMatch=self._etag, Range=f"bytes={self._position}-")
+        response = self.s3_client.get_object(**params)
+        if self._etag is None:
+            self._etag = response['ETag']
+            self._content_length = response['ContentLength']
+        self._body = response['Body']
+
+    def _discard_body(self):
+        if self._body is not None:
+            try:
+                self._body.close()
+            except Exception:
+                pass
+            self._body = None
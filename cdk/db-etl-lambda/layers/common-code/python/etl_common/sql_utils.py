@@ -2,34 +2,150 @@
 SQLファイル関連のユーティリティ
 """
 import os
+import re
+import threading
+import weakref
+from typing import Dict, List, Optional
 from aws_lambda_powertools import Logger
 
 logger = Logger()
 
+# プリペアドステートメント用のパラメータ型宣言（例: "-- params: date, date"）
+_PARAMS_ANNOTATION = re.compile(r'^--\s*params:\s*(.+)$', re.MULTILINE)
+_PLACEHOLDER = re.compile(r'%(s|%)')
+
+
+class SqlTemplate:
+    """読み込み・検証済みのSQLテンプレート"""
+    def __init__(self, name: str, sql: str):
+        self.name = name
+        self.sql = sql
+        self.param_count = sql.count('%s')
+
+        annotation = _PARAMS_ANNOTATION.search(sql)
+        self.param_types: Optional[List[str]] = (
+            [t.strip() for t in annotation.group(1).split(',')] if annotation else None
+        )
+        # プリペアドステートメント名（英数字とアンダースコアのみ）
+        self.statement_name = 'etl_' + re.sub(r'\W', '_', os.path.splitext(name)[0])
+
+    def validate(self):
+        """テンプレートが実行可能な形か検証"""
+        body = '\n'.join(line for line in self.sql.splitlines() if not line.strip().startswith('--'))
+        if not body.strip():
+            raise ValueError(f"SQL file is empty: {self.name}")
+        if self.param_types is not None and len(self.param_types) != self.param_count:
+            raise ValueError(
+                f"SQL file {self.name} declares {len(self.param_types)} params but has {self.param_count} placeholders"
+            )
+
+    @property
+    def preparable(self) -> bool:
+        """パラメータ型が宣言されており、サーバーサイドのプリペアドステートメントにできるか"""
+        return self.param_types is not None
+
+    def to_prepare_statement(self) -> str:
+        """%s プレースホルダを $1, $2, ... に置き換えたPREPARE文"""
+        counter = iter(range(1, self.param_count + 1))
+        body = _PLACEHOLDER.sub(lambda m: f'${next(counter)}' if m.group(1) == 's' else '%', self.sql)
+        return f"PREPARE {self.statement_name} ({', '.join(self.param_types)}) AS {body}"
+
+
+class SqlRegistry:
+    """
+    SQLテンプレートのレジストリ
+
+    生成時（コールドスタート時）にディレクトリ内の全SQLファイルを読み込んで検証し、メモリに保持する。
+    ウォームスタート時はファイル読み込みを行わない。
+    """
+    def __init__(self, base_path: str):
+        self.base_path = base_path
+        self._templates: Dict[str, SqlTemplate] = {}
+        # 接続ごとに準備済みのステートメント名（接続の破棄とともに消える）
+        self._prepared = weakref.WeakKeyDictionary()
+        self._lock = threading.Lock()
+        self._load_all()
+
+    def _load_all(self):
+        """ベースパス内の全SQLファイルを読み込む"""
+        try:
+            file_names = sorted(f for f in os.listdir(self.base_path) if f.endswith('.sql'))
+        except FileNotFoundError:
+            logger.error(f"SQL directory not found: {self.base_path}")
+            raise
+
+        for file_name in file_names:
+            with open(os.path.join(self.base_path, file_name), 'r', encoding='utf-8') as f:
+                template = SqlTemplate(file_name, f.read())
+            template.validate()
+            self._templates[file_name] = template
+
+        logger.info(f"Loaded {len(self._templates)} SQL templates from {self.base_path}")
+
+    def template(self, sql_file_name: str) -> SqlTemplate:
+        """SQLテンプレートを取得"""
+        try:
+            return self._templates[sql_file_name]
+        except KeyError:
+            logger.error(f"SQL file not found: {sql_file_name} at {self.base_path}")
+            raise FileNotFoundError(os.path.join(self.base_path, sql_file_name)) from None
+
+    def get(self, sql_file_name: str) -> str:
+        """SQL文字列を取得"""
+        return self.template(sql_file_name).sql
+
+    def param_count(self, sql_file_name: str) -> int:
+        """SQLのプレースホルダ数を取得"""
+        return self.template(sql_file_name).param_count
+
+    def prepared(self, conn, sql_file_name: str) -> str:
+        """
+        接続上でテンプレートをプリペアドステートメントとして準備し、実行用のEXECUTE文を返す
+
+        準備は接続ごとに1度だけ行う。返されるEXECUTE文は元のSQLと同じ %s パラメータで実行できる。
+        """
+        template = self.template(sql_file_name)
+        if not template.preparable:
+            raise ValueError(f"SQL file {sql_file_name} has no '-- params:' declaration")
+
+        with self._lock:
+            prepared = self._prepared.setdefault(conn, set())
+            needs_prepare = template.statement_name not in prepared
+
+        if needs_prepare:
+            with conn.cursor() as cursor:
+                cursor.execute(template.to_prepare_statement())
+            with self._lock:
+                prepared.add(template.statement_name)
+            logger.debug(f"Prepared statement {template.statement_name}")
+
+        placeholders = ', '.join(['%s'] * template.param_count)
+        return f"EXECUTE {template.statement_name} ({placeholders})" if placeholders else f"EXECUTE {template.statement_name}"
+
+
+# ベースパスごとのレジストリ（load_sql_file用）
+_registries: Dict[str, SqlRegistry] = {}
+_registries_lock = threading.Lock()
+
+
+def get_sql_registry(base_path: str) -> SqlRegistry:
+    """ベースパスに対応するレジストリを取得（初回のみ読み込み）"""
+    with _registries_lock:
+        registry = _registries.get(base_path)
+        if registry is None:
+            registry = _registries[base_path] = SqlRegistry(base_path)
+        return registry
+
 
 def load_sql_file(sql_file_name: str, base_path: str = '/var/task/sql') -> str:
     """
     SQLファイルを読み込んで文字列として返す
-    
+
     Args:
         sql_file_name: SQLファイル名
         base_path: SQLファイルが格納されているベースパス（デフォルトはLambda実行環境のsqlディレクトリ）
-    
+
     Returns:
-        SQL文字列
+        SQL文字列（2回目以降はメモリ上のレジストリから返す）
     """
-    try:
-        sql_path = os.path.join(base_path, sql_file_name)
-        
-        with open(sql_path, 'r', encoding='utf-8') as f:
-            sql_content = f.read()
-        
-        logger.info(f"Loaded SQL file: {sql_file_name}")
-        return sql_content
-        
-    except FileNotFoundError:
-        logger.error(f"SQL file not found: {sql_file_name} at {sql_path}")
-        raise
-    except Exception as e:
-        logger.error(f"Error loading SQL file {sql_file_name}: {str(e)}")
-        raise
\ No newline at end of file
+    return get_sql_registry(base_path).get(sql_file_name)
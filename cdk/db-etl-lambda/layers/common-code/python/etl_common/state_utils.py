@@ -0,0 +1,40 @@
+"""
+ETL実行状態（ウォーターマーク等）の保存関連のユーティリティ
+"""
+import json
+from typing import Any, Dict, Optional
+import boto3
+from aws_lambda_powertools import Logger
+
+logger = Logger()
+
+
+class S3StateStore:
+    """
+    小さな状態オブジェクトをS3上のJSONとして保存・取得する
+
+    状態は毎回1つのオブジェクトを上書きするため、実行は同時に1つだけ行う前提とする。
+    """
+    def __init__(self, bucket: str, key: str, s3_client=None):
+        self.bucket = bucket
+        self.key = key
+        self.s3_client = s3_client or boto3.client('s3')
+
+    def load(self) -> Optional[Dict[str, Any]]:
+        """保存済みの状態を取得（未保存の場合はNone）"""
+        try:
+            response = self.s3_client.get_object(Bucket=self.bucket, Key=self.key)
+        except self.s3_client.exceptions.NoSuchKey:
+            logger.info(f"No saved state at s3://{self.bucket}/{self.key}")
+            return None
+        return json.loads(response['Body'].read().decode('utf-8'))
+
+    def save(self, state: Dict[str, Any]):
+        """状態を保存"""
+        self.s3_client.put_object(
+            Bucket=self.bucket,
+            Key=self.key,
+            Body=json.dumps(state).encode('utf-8'),
+            ContentType='application/json'
+        )
+        logger.info(f"State saved to s3://{self.bucket}/{self.key}", extra={"state": state})
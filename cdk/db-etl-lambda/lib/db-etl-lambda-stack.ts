@@ -123,7 +123,7 @@ export class DbEtlLambdaStack extends cdk.Stack {
         },
       }),
       compatibleRuntimes: [lambda.Runtime.PYTHON_3_11],
-      description: 'Common Python dependencies (psycopg2, pandas, boto3, powertools)',
+      description: 'Common Python dependencies (psycopg2, pandas, pyarrow, ijson, boto3, powertools)',
     });
 
     // 共通コードLayer
@@ -160,7 +160,8 @@ export class DbEtlLambdaStack extends cdk.Stack {
     // Lambda関数にデータベースとS3への権限を付与
     sourceDb.connections.allowDefaultPortFrom(extractTransformLambda);
     sourceDbCredentials.grantRead(extractTransformLambda);
-    etlBucket.grantWrite(extractTransformLambda);
+    // 増分モードのウォーターマーク（etl-state/）を読み書きする
+    etlBucket.grantReadWrite(extractTransformLambda);
 
     // S3からLambdaを呼び出す構成（AWS Solutions Constructs使用）
     const s3ToLoadLambda = new S3ToLambda(this, 'S3ToLoadLambda', {
@@ -187,6 +188,10 @@ export class DbEtlLambdaStack extends cdk.Stack {
         layers: [pythonCommonLayer, commonCodeLayer],
       },
       bucketProps: undefined,  // 既存のバケットを使用
+      s3EventSourceProps: {
+        events: [s3.EventType.OBJECT_CREATED],
+        filters: [{ prefix: 'etl-data/' }],  // 抽出結果のみ（状態ファイル・アクセスログは対象外）
+      },
     });
 
     // Load Lambda関数にターゲットDBへの権限を付与
@@ -238,6 +243,16 @@ export class DbEtlLambdaStack extends cdk.Stack {
 
     dailyEtlRule.addTarget(new targets.LambdaFunction(extractTransformLambda));
 
+    // 増分抽出のスケジュール（1時間ごと、初期状態は無効）
+    const incrementalEtlRule = new events.Rule(this, 'IncrementalEtlSchedule', {
+      schedule: events.Schedule.rate(cdk.Duration.hours(1)),
+      enabled: false,
+    });
+
+    incrementalEtlRule.addTarget(new targets.LambdaFunction(extractTransformLambda, {
+      event: events.RuleTargetInput.fromObject({ mode: 'incremental' }),
+    }));
+
     // 出力
     new cdk.CfnOutput(this, 'SourceDbEndpoint', {
       value: sourceDb.instanceEndpoint.hostname,
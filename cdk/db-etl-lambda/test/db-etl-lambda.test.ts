@@ -90,6 +90,18 @@ describe('DbEtlLambdaStack', () => {
     });
   });
 
+  test('Incremental EventBridge Rule Created Disabled', () => {
+    const app = new cdk.App();
+    const stack = new DbEtlLambda.DbEtlLambdaStack(app, 'TestStack');
+    const template = Template.fromStack(stack);
+
+    // 増分抽出のルールが無効状態で作成されることを確認
+    template.hasResourceProperties('AWS::Events::Rule', {
+      ScheduleExpression: 'rate(1 hour)',
+      State: 'DISABLED',
+    });
+  });
+
   test('Secrets Created', () => {
     const app = new cdk.App();
     const stack = new DbEtlLambda.DbEtlLambdaStack(app, 'TestStack');
@@ -0,0 +1,21 @@
+"""
+Lambda関数・共通コード（Python）のテストの共通設定
+
+共通コード（etl_common）は Lambda Layer と同じくトップレベルのパッケージとして読み込む。
+boto3クライアント・Lambda Powertoolsはモジュールの読み込み時に初期化されるため、AWSの設定がない環境でも
+読み込めるよう、未設定の場合のみダミーの値を設定する（テストからAWSにはアクセスしない）。
+"""
+import os
+import sys
+from pathlib import Path
+
+sys.path.insert(0, str(Path(__file__).resolve().parents[2] / 'layers' / 'common-code' / 'python'))
+
+for name, value in {
+    'AWS_DEFAULT_REGION': 'ap-northeast-1',
+    'AWS_ACCESS_KEY_ID': 'testing',
+    'AWS_SECRET_ACCESS_KEY': 'testing',
+    'POWERTOOLS_SERVICE_NAME': 'db-etl-test',
+    'POWERTOOLS_METRICS_NAMESPACE': 'DbEtlTest',
+}.items():
+    os.environ.setdefault(name, value)
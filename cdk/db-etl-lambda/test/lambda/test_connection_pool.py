@@ -0,0 +1,238 @@
+import threading
+import time
+
+import psycopg2
+import psycopg2.extensions
+import pytest
+
+from etl_common import db_utils
+from etl_common.db_utils import ConnectionPool, PoolTimeoutError
+
+SERVER = ('db.example.com', 'appdb', 'etl', 'secret')
+
+
+class FakeConnection:
+    """ConnectionPool が使う範囲のpsycopg2の接続"""
+    def __init__(self, number):
+        self.number = number
+        self.closed = 0
+        self.status = psycopg2.extensions.TRANSACTION_STATUS_IDLE
+        self.rollbacks = 0
+        self.broken = False
+
+    def get_transaction_status(self):
+        return self.status
+
+    def rollback(self):
+        self.rollbacks += 1
+        self.status = psycopg2.extensions.TRANSACTION_STATUS_IDLE
+
+    def close(self):
+        self.closed = 1
+
+    def cursor(self):
+        return FakeCursor(self)
+
+
+class FakeCursor:
+    def __init__(self, conn):
+        self.conn = conn
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *args):
+        return False
+
+    def execute(self, query):
+        if self.conn.broken:
+            raise psycopg2.OperationalError('server closed the connection unexpectedly')
+
+
+@pytest.fixture()
+def connections(monkeypatch):
+    """確立した接続の一覧（db_utils.connect を置き換える）"""
+    opened = []
+
+    def connect(host, database, user, password, port=5432):
+        conn = FakeConnection(len(opened) + 1)
+        opened.append(conn)
+        return conn
+
+    monkeypatch.setattr(db_utils, 'connect', connect)
+    return opened
+
+
+def make_pool(**options):
+    settings = {'min_size': 0, 'max_size': 2, 'max_idle_seconds': 300, 'health_check_after_seconds': 30,
+                'checkout_timeout': 1}
+    settings.update(options)
+    return ConnectionPool(**settings)
+
+
+@pytest.mark.parametrize('min_size, max_size', [(0, 0), (3, 2), (-1, 0), (-1, 2)])
+def test_rejects_invalid_sizes(min_size, max_size):
+    with pytest.raises(ValueError):
+        ConnectionPool(min_size=min_size, max_size=max_size)
+
+
+def test_reuses_returned_connection(connections):
+    pool = make_pool()
+
+    with pool.get_connection(*SERVER) as first:
+        pass
+    with pool.get_connection(*SERVER) as second:
+        pass
+
+    assert first is second
+    assert len(connections) == 1 and not first.closed
+
+
+def test_pools_are_separate_per_server(connections):
+    pool = make_pool(max_size=1)
+
+    with pool.get_connection(*SERVER) as first, pool.get_connection('other-host', 'appdb', 'etl', 'secret') as second:
+        assert first is not second
+
+
+def test_checkout_times_out_at_max_size(connections):
+    pool = make_pool(max_size=2, checkout_timeout=0.2)
+
+    with pool.get_connection(*SERVER), pool.get_connection(*SERVER):
+        start = time.time()
+        with pytest.raises(PoolTimeoutError):
+            with pool.get_connection(*SERVER):
+                pass
+        assert time.time() - start >= 0.2
+
+    assert len(connections) == 2
+
+
+def test_waiting_checkout_receives_returned_connection(connections):
+    pool = make_pool(max_size=1, checkout_timeout=5)
+    released = threading.Event()
+    received = []
+
+    def hold():
+        with pool.get_connection(*SERVER):
+            time.sleep(0.1)
+        released.set()
+
+    with pool.get_connection(*SERVER) as held:
+        pass
+    holder = threading.Thread(target=hold)
+    holder.start()
+    time.sleep(0.02)
+    with pool.get_connection(*SERVER) as conn:
+        received.append(conn)
+    holder.join()
+
+    assert released.is_set()
+    assert received == [held] and len(connections) == 1
+
+
+def test_failed_connect_releases_slot(connections, monkeypatch):
+    pool = make_pool(max_size=1, checkout_timeout=0.1)
+
+    def refuse(*args, **kwargs):
+        raise psycopg2.OperationalError('could not connect to server')
+
+    with monkeypatch.context() as patch:
+        patch.setattr(db_utils, 'connect', refuse)
+        with pytest.raises(psycopg2.OperationalError):
+            with pool.get_connection(*SERVER):
+                pass
+
+    with pool.get_connection(*SERVER) as conn:
+        assert conn is connections[0]
+
+
+def test_rolls_back_open_transaction_on_return(connections):
+    pool = make_pool()
+
+    with pool.get_connection(*SERVER) as conn:
+        conn.status = psycopg2.extensions.TRANSACTION_STATUS_INTRANS
+
+    assert conn.rollbacks == 1
+    with pool.get_connection(*SERVER) as reused:
+        assert reused is conn
+
+
+def test_discards_closed_connection_on_return(connections):
+    pool = make_pool()
+
+    with pool.get_connection(*SERVER) as conn:
+        conn.close()
+    with pool.get_connection(*SERVER) as replacement:
+        pass
+
+    assert replacement is not conn and len(connections) == 2
+
+
+def test_evicts_connections_idle_longer_than_limit(connections):
+    pool = make_pool(max_idle_seconds=0)
+
+    with pool.get_connection(*SERVER) as first:
+        pass
+    time.sleep(0.01)
+    with pool.get_connection(*SERVER) as second:
+        pass
+
+    assert first.closed and second is not first
+
+
+def test_keeps_min_size_connections_when_evicting(connections):
+    pool = make_pool(min_size=1, max_idle_seconds=0)
+
+    with pool.get_connection(*SERVER) as first:
+        pass
+    time.sleep(0.01)
+    with pool.get_connection(*SERVER) as second:
+        pass
+
+    assert second is first and not first.closed
+
+
+def test_replaces_stale_connection_after_health_check(connections):
+    pool = make_pool(health_check_after_seconds=0)
+
+    with pool.get_connection(*SERVER) as first:
+        pass
+    first.broken = True
+    with pool.get_connection(*SERVER) as second:
+        pass
+
+    assert first.closed and second is not first and len(connections) == 2
+
+
+def test_skips_health_check_for_recently_used_connection(connections):
+    pool = make_pool(health_check_after_seconds=30)
+
+    with pool.get_connection(*SERVER) as first:
+        pass
+    first.broken = True
+    with pool.get_connection(*SERVER) as second:
+        pass
+
+    assert second is first
+
+
+def test_prefills_to_min_size(connections):
+    pool = make_pool(min_size=2, max_size=3)
+
+    with pool.get_connection(*SERVER):
+        pass
+
+    assert len(connections) == 2
+
+
+def test_close_all_closes_idle_connections(connections):
+    pool = make_pool()
+
+    with pool.get_connection(*SERVER) as conn:
+        pass
+    pool.close_all()
+
+    assert conn.closed
+    with pool.get_connection(*SERVER) as replacement:
+        assert replacement is not conn
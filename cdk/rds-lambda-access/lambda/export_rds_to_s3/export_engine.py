@@ -0,0 +1,342 @@
+"""
+設定駆動のエクスポートエンジン
+
+エクスポートジョブ（テーブルまたはクエリ、出力形式、パーティション列、出力先プレフィックス）の一覧を受け取り、
+独立したジョブを並列に実行する。Lambdaの残り時間が足りないジョブは開始せずにスキップする。
+
+ジョブの設定項目:
+    name          ジョブ名（出力ファイル名に使用。英数字・_・-）
+    table / query エクスポートするテーブル（'schema.table' 形式も可）またはSELECT文（いずれか一方）
+    format        'csv'（デフォルト） / 'jsonl' / 'parquet'
+    gzip          gzip圧縮するか（csv・jsonlのみ）
+    prefix        出力先プレフィックス（デフォルト: 'exports'）
+    partition_by  パーティション列のリスト。値ごとに <prefix>/<name>_<timestamp>/col=value/ に出力
+                  （値ごとに col = 値 の条件でクエリを実行する。値の組は EXPORT_MAX_PARTITIONS まで）
+    parallelism   ジョブ内の接続数（デフォルト: 1）。パーティションごと、またはテーブルの範囲ごとに並列に出力
+    partitions    テーブルの範囲の分割数（デフォルト: parallelism）
+    split_by      テーブルの範囲の分割方法 'pk' / 'ctid'（デフォルト: 主キーがあれば 'pk'）
+    incremental_column      差分エクスポートの高水位に使う列（updated_at や id）。指定すると差分エクスポートになる
+    incremental_lag_seconds 日付・タイムスタンプ列の場合に、現在時刻から何秒以内の行を次回に回すか（デフォルト: 60）
+    default       空のイベント（{}）で実行するか（デフォルト: true）。false のジョブは names・mode で指定したときのみ実行
+
+分割しないジョブは <prefix>/<name>_<timestamp><拡張子> の1ファイル、分割するジョブは
+<prefix>/<name>_<timestamp>/ 以下のファイルとマニフェスト（_manifest.json）を出力する。
+差分エクスポートのジョブの出力先は incremental.py を参照。
+"""
+import json
+import re
+import time
+from concurrent.futures import ThreadPoolExecutor
+from datetime import datetime, timezone
+from psycopg2 import sql
+from formats import EXPORT_FORMATS
+from incremental import CheckpointConflictError, CheckpointStore, delete_objects, delta_condition, find_upper_bound
+from parallel_export import (
+    MANIFEST_FILE_NAME, parse_table_name, plan_range_slices, plan_partition_slices, begin_snapshot, export_slices
+)
+
+JOB_KEYS = {'name', 'table', 'query', 'format', 'gzip', 'prefix', 'partition_by', 'parallelism', 'partitions',
+            'split_by', 'incremental_column', 'incremental_lag_seconds', 'default'}
+JOB_NAME_PATTERN = re.compile(r'^[A-Za-z0-9_-]+$')
+
+
+class ExportTimeoutError(Exception):
+    """Lambdaの残り時間が足りずにエクスポートを開始できない"""
+
+
+def load_config(path):
+    """設定ファイル（JSON）を読み込む: {"defaults": {...}, "exports": [{...}, ...]}"""
+    with open(path, 'r') as file:
+        return json.load(file)
+
+
+def build_jobs(exports, defaults=None):
+    """ジョブ定義にデフォルト値を適用して検証"""
+    jobs = [{**(defaults or {}), **export} for export in exports]
+    for job in jobs:
+        validate_job(job)
+    names = [job['name'] for job in jobs]
+    duplicates = sorted({name for name in names if names.count(name) > 1})
+    if duplicates:
+        raise ValueError(f"Duplicate export names: {duplicates}")
+    return jobs
+
+
+def validate_job(job):
+    """ジョブ定義を検証し、デフォルト値を設定する"""
+    unknown = set(job) - JOB_KEYS
+    if unknown:
+        raise ValueError(f"Unknown export settings: {sorted(unknown)}")
+    name = job.get('name') or job.get('table')
+    if not name or not JOB_NAME_PATTERN.match(name.replace('.', '_')):
+        raise ValueError(f"Invalid export name: {name}")
+    job['name'] = name.replace('.', '_')
+    if bool(job.get('table')) == bool(job.get('query')):
+        raise ValueError(f"Export {name} must specify exactly one of table or query")
+    if job.get('query'):
+        job['query'] = job['query'].strip().rstrip(';')
+
+    job['default'] = bool(job.get('default', True))
+    job.setdefault('format', 'csv')
+    if job['format'] not in EXPORT_FORMATS:
+        raise ValueError(f"Export {name} has unsupported format: {job['format']}")
+    job['gzip'] = bool(job.get('gzip', False))
+    if job['gzip'] and not EXPORT_FORMATS[job['format']][3]:
+        raise ValueError(f"Export {name}: gzip is not supported for {job['format']}")
+
+    job['prefix'] = job.get('prefix', 'exports').strip('/')
+    job['partition_by'] = list(job.get('partition_by') or [])
+    job['parallelism'] = int(job.get('parallelism', 1))
+    if job['parallelism'] < 1:
+        raise ValueError(f"Export {name}: parallelism must be at least 1")
+    if (job.get('partitions') or job.get('split_by')) and not (job.get('table') and not job['partition_by']):
+        raise ValueError(f"Export {name}: partitions and split_by apply only to unpartitioned table exports")
+    if job.get('incremental_column'):
+        if job['partition_by']:
+            raise ValueError(f"Export {name}: partition_by is not supported for incremental exports")
+        job['incremental_lag_seconds'] = int(job.get('incremental_lag_seconds', 60))
+
+
+class ExportEngine:
+    """
+    ジョブを最大 job_concurrency 並列で実行する
+
+    Args:
+        connect: 新しいDB接続を返す関数。statement_timeout（ミリ秒）を受け取る
+        deadline: 処理を終える時刻（time.time()）。この時刻を過ぎるクエリはstatement_timeoutで中断する
+    """
+    def __init__(self, connect, s3_client, bucket, writer_options, job_concurrency, deadline):
+        self.connect = connect
+        self.s3_client = s3_client
+        self.bucket = bucket
+        self.writer_options = writer_options
+        self.job_concurrency = job_concurrency
+        self.deadline = deadline
+        self.checkpoints = CheckpointStore(s3_client, bucket)
+
+    def run(self, jobs, compact=False):
+        """
+        全ジョブを実行し、ジョブごとの結果（succeeded / failed / skipped）を返す
+
+        compact=True の場合、差分エクスポートのジョブは全件のスナップショットを出力して以前の出力を置き換える
+        """
+        timestamp = datetime.now().strftime("%Y%m%d_%H%M%S")
+        with ThreadPoolExecutor(max_workers=self.job_concurrency) as executor:
+            futures = [executor.submit(self.run_job, job, timestamp, compact) for job in jobs]
+        return [future.result() for future in futures]
+
+    def run_job(self, job, timestamp, compact=False):
+        """1つのジョブを実行して結果を返す（例外は結果に変換する）"""
+        start_time = time.time()
+        try:
+            if job.get('incremental_column'):
+                result = self.export_incremental(job, timestamp, compact)
+            else:
+                result = self.export(job, timestamp)
+            result.pop('keys')
+        except ExportTimeoutError as e:
+            print(f"Skipped export {job['name']}: {str(e)}")
+            return {'name': job['name'], 'status': 'skipped', 'error': str(e)}
+        except Exception as e:
+            print(f"Error exporting {job['name']}: {str(e)}")
+            return {'name': job['name'], 'status': 'failed', 'error': str(e)}
+        result.update(name=job['name'], status='succeeded', export_time=round(time.time() - start_time, 3))
+        print(f"Exported {result['record_count']} records for {job['name']} to {result.get('s3_location')}")
+        return result
+
+    def export_incremental(self, job, timestamp, compact):
+        """
+        前回の高水位より後に変更された行を差分として出力し、チェックポイントを更新する
+
+        チェックポイントがない場合と compact=True の場合は全件をスナップショットとして出力し、
+        チェックポイントを置き換えてから以前のスナップショット・差分を削除する。
+        読み込み後にチェックポイントが他の実行で更新されていた場合は、今回の出力を削除して失敗とする
+        """
+        column = job['incremental_column']
+        checkpoint, etag = self.checkpoints.load(job)
+        job_key = f"{job['prefix']}/{job['name']}"
+
+        if compact or checkpoint is None:
+            def plan_snapshot(cursor, relation):
+                upper = find_upper_bound(cursor, relation, column, job['incremental_lag_seconds'])
+                return sql.SQL('TRUE'), {'high_water_mark': upper}
+
+            result = self.export(job, timestamp, f"{job_key}/snapshots/{job['name']}_{timestamp}", plan_snapshot)
+            if result['high_water_mark'] is None and checkpoint:
+                result['high_water_mark'] = checkpoint['high_water_mark']
+            self._save_checkpoint(job, {
+                'name': job['name'],
+                'column': column,
+                'high_water_mark': result['high_water_mark'],
+                'snapshot': _output_entry(result),
+                'deltas': [],
+            }, etag, result['keys'])
+            if checkpoint:
+                delete_objects(self.s3_client, self.bucket, _checkpoint_keys(checkpoint))
+                result['compacted_deltas'] = len(checkpoint['deltas'])
+            result['mode'] = 'snapshot'
+            return result
+
+        lower = checkpoint['high_water_mark']
+
+        def plan_delta(cursor, relation):
+            upper = find_upper_bound(cursor, relation, column, job['incremental_lag_seconds'])
+            if upper is None:
+                return None, {'high_water_mark': lower}
+            condition = delta_condition(column, lower, upper)
+            cursor.execute(sql.SQL("SELECT EXISTS (SELECT 1 FROM {} WHERE {})").format(relation, condition))
+            if not cursor.fetchone()[0]:
+                return None, {'high_water_mark': lower}
+            return condition, {'high_water_mark': upper}
+
+        # 差分は件数が少ないため、テーブル全体の範囲で分割せず1ファイルに出力する
+        delta_job = {**job, 'parallelism': 1}
+        export_date = datetime.strptime(timestamp, "%Y%m%d_%H%M%S").strftime("%Y-%m-%d")
+        result = self.export(delta_job, timestamp, f"{job_key}/deltas/dt={export_date}/{job['name']}_{timestamp}",
+                             plan_delta)
+        result['mode'] = 'delta'
+        if not result['keys']:
+            print(f"No changes for {job['name']} since {lower}")
+            return result
+
+        entry = _output_entry(result)
+        entry.update(lower=lower, upper=result['high_water_mark'])
+        checkpoint['deltas'].append(entry)
+        checkpoint['high_water_mark'] = result['high_water_mark']
+        self._save_checkpoint(job, checkpoint, etag, result['keys'])
+        return result
+
+    def _save_checkpoint(self, job, checkpoint, etag, output_keys):
+        """
+        チェックポイントを条件付きで更新し、競合した場合はチェックポイントに記録されない今回の出力を削除する
+
+        同じ秒に開始した実行は出力先のキーが同じになるため、更新後のチェックポイントが参照するキーは削除しない
+        """
+        try:
+            self.checkpoints.save(job, checkpoint, etag)
+        except CheckpointConflictError:
+            current, _ = self.checkpoints.load(job)
+            referenced = set(_checkpoint_keys(current)) if current else set()
+            delete_objects(self.s3_client, self.bucket, [key for key in output_keys if key not in referenced])
+            raise
+
+    def export(self, job, timestamp, base_key=None, plan=None):
+        """
+        ジョブのスライスを計画し、同じスナップショットから出力する
+
+        Args:
+            base_key: 出力先キー（拡張子なし。デフォルトは <prefix>/<name>_<timestamp>）
+            plan: スナップショット内で呼び出す関数 plan(cursor, relation) -> (追加の抽出条件, 結果に加える値)。
+                  抽出条件がNoneの場合は何も出力しない
+        """
+        write_format, extension, content_type, _ = EXPORT_FORMATS[job['format']]
+        if job['gzip']:
+            extension += '.gz'
+        writer_options = {
+            **self.writer_options,
+            'compress': job['gzip'],
+            'content_type': 'application/gzip' if job['gzip'] else content_type,
+        }
+        base_key = base_key or f"{job['prefix']}/{job['name']}_{timestamp}"
+
+        coordinator = self._connect()
+        try:
+            snapshot_id = begin_snapshot(coordinator)
+            with coordinator.cursor() as cursor:
+                if job.get('table'):
+                    cursor.execute("SELECT to_regclass(%s)", (job['table'],))
+                    if cursor.fetchone()[0] is None:
+                        raise ValueError(f"Table does not exist: {job['table']}")
+                    relation = parse_table_name(job['table'])
+                else:
+                    relation = sql.SQL("({}) AS q").format(sql.SQL(job['query']))
+
+                condition, extra = plan(cursor, relation) if plan else (sql.SQL('TRUE'), {})
+                if condition is None:
+                    return {'record_count': 0, 'file_count': 0, 'keys': [], **extra}
+
+                if job['partition_by']:
+                    slices = plan_partition_slices(cursor, relation, job['partition_by'], base_key, extension)
+                elif job.get('table') and job['parallelism'] > 1:
+                    slices = plan_range_slices(cursor, job['table'], base_key, extension, job['parallelism'],
+                                               job.get('partitions'), job.get('split_by'))
+                else:
+                    slices = [{'key': base_key + extension, 'condition': sql.SQL('TRUE')}]
+                for slice_ in slices:
+                    slice_['condition'] = sql.SQL("({}) AND ({})").format(slice_['condition'], condition)
+
+                cursor.execute(sql.SQL("SELECT * FROM {} LIMIT 0").format(relation))
+                columns = [desc[0] for desc in cursor.description]
+
+            slices = export_slices(
+                coordinator, self._connect, snapshot_id, self.s3_client, self.bucket, relation, slices,
+                write_format, job['parallelism'], writer_options, before_slice=self._check_time
+            )
+        finally:
+            coordinator.rollback()
+            coordinator.close()
+
+        record_count = sum(slice_['rows'] for slice_ in slices)
+        if len(slices) == 1 and not job['partition_by'] and 'split_by' not in slices[0]:
+            return {
+                's3_location': f"s3://{self.bucket}/{slices[0]['key']}",
+                'record_count': record_count,
+                'file_count': 1,
+                'bytes_uploaded': slices[0]['bytes'],
+                'keys': [slices[0]['key']],
+                **extra,
+            }
+
+        manifest_key = f"{base_key}/{MANIFEST_FILE_NAME}"
+        self.s3_client.put_object(
+            Bucket=self.bucket,
+            Key=manifest_key,
+            Body=json.dumps({
+                'name': job['name'],
+                'table': job.get('table'),
+                'query': job.get('query'),
+                'format': job['format'],
+                'compression': 'gzip' if job['gzip'] else None,
+                'columns': columns,
+                'partition_by': job['partition_by'],
+                'exported_at': datetime.now(timezone.utc).isoformat(),
+                'record_count': record_count,
+                'files': slices,
+            }, ensure_ascii=False, indent=2, default=str).encode('utf-8'),
+            ContentType='application/json'
+        )
+        return {
+            's3_location': f"s3://{self.bucket}/{base_key}/",
+            'manifest': f"s3://{self.bucket}/{manifest_key}",
+            'record_count': record_count,
+            'file_count': len(slices),
+            'bytes_uploaded': sum(slice_['bytes'] for slice_ in slices),
+            'keys': [slice_['key'] for slice_ in slices] + [manifest_key],
+            **extra,
+        }
+
+    def _check_time(self):
+        """残り時間がない場合は新しいスライスを開始しない"""
+        if time.time() >= self.deadline:
+            raise ExportTimeoutError("Not enough time remaining in the Lambda invocation")
+
+    def _connect(self):
+        """残り時間をstatement_timeoutに設定して接続（Lambdaのタイムアウト前にクエリを中断し、アップロードを中止する）"""
+        self._check_time()
+        return self.connect(int((self.deadline - time.time()) * 1000))
+
+
+def _checkpoint_keys(checkpoint):
+    """チェックポイントが参照するスナップショット・差分のオブジェクトキー"""
+    return checkpoint['snapshot']['keys'] + [key for delta in checkpoint['deltas'] for key in delta['keys']]
+
+
+def _output_entry(result):
+    """チェックポイントに記録する出力（場所・オブジェクトキー・行数）"""
+    return {
+        'location': result['s3_location'],
+        'manifest': result.get('manifest'),
+        'keys': result['keys'],
+        'rows': result['record_count'],
+        'exported_at': datetime.now(timezone.utc).isoformat(),
+    }
@@ -0,0 +1,131 @@
+"""
+エクスポートの出力形式（CSV / JSON Lines / Parquet）
+
+いずれもクエリ結果を一定行数ずつ書き込み先（S3MultipartWriter）に流し、結果セット全体をメモリに保持しない。
+- csv: COPY ... TO STDOUT でサーバー側でCSVに変換（ヘッダー付き）
+- jsonl: サーバー側で row_to_json により1行1JSONに変換し、名前付きカーソルで逐次取得
+- parquet: 名前付きカーソルで逐次取得し、EXPORT_FETCH_ROWS 行ごとに1つの行グループとして書き込む（pyarrowが必要）
+"""
+import json
+import os
+from decimal import Decimal
+from psycopg2 import sql
+
+# 名前付きカーソルで1回に取得する行数（Parquetの行グループの行数）
+EXPORT_FETCH_ROWS = int(os.environ.get('EXPORT_FETCH_ROWS', '10000'))
+
+# Parquetの圧縮形式
+PARQUET_COMPRESSION = os.environ.get('PARQUET_COMPRESSION', 'snappy')
+
+
+def write_csv(conn, query, writer):
+    """クエリ結果をヘッダー付きCSVで書き込み、行数を返す"""
+    copy_query = sql.SQL("COPY ({}) TO STDOUT WITH (FORMAT csv, HEADER)").format(query)
+    with conn.cursor() as cursor:
+        cursor.copy_expert(copy_query.as_string(conn), writer)
+        return cursor.rowcount
+
+
+def write_jsonl(conn, query, writer):
+    """クエリ結果を1行1JSON（JSON Lines）で書き込み、行数を返す"""
+    json_query = sql.SQL("SELECT row_to_json(q)::text FROM ({}) AS q").format(query)
+    row_count = 0
+    with conn.cursor(name='export_jsonl') as cursor:
+        cursor.itersize = EXPORT_FETCH_ROWS
+        cursor.execute(json_query)
+        while True:
+            rows = cursor.fetchmany(EXPORT_FETCH_ROWS)
+            if not rows:
+                break
+            writer.write(''.join(row[0] + '\n' for row in rows).encode('utf-8'))
+            row_count += len(rows)
+    return row_count
+
+
+def write_parquet(conn, query, writer):
+    """クエリ結果をParquetで書き込み、行数を返す（列の型はPostgreSQLの型から決定）"""
+    try:
+        import pyarrow as pa
+        import pyarrow.parquet as pq
+    except ImportError as e:
+        raise RuntimeError("pyarrow is required for parquet exports") from e
+
+    row_count = 0
+    parquet_writer = None
+    with conn.cursor(name='export_parquet') as cursor:
+        cursor.itersize = EXPORT_FETCH_ROWS
+        cursor.execute(query)
+        try:
+            while True:
+                rows = cursor.fetchmany(EXPORT_FETCH_ROWS)
+                if parquet_writer is None:
+                    columns = [_arrow_column(pa, column) for column in cursor.description]
+                    schema = pa.schema([(name, arrow_type) for name, arrow_type, _ in columns])
+                    parquet_writer = pq.ParquetWriter(writer, schema, compression=PARQUET_COMPRESSION)
+                if not rows:
+                    break
+                arrays = [
+                    pa.array([convert(value) for value in values], type=arrow_type)
+                    for (_, arrow_type, convert), values in zip(columns, zip(*rows))
+                ]
+                parquet_writer.write_table(pa.Table.from_arrays(arrays, schema=schema))
+                row_count += len(rows)
+        finally:
+            if parquet_writer is not None:
+                parquet_writer.close()
+    return row_count
+
+
+# PostgreSQLの型OID -> pyarrowの型名
+_ARROW_TYPES = {
+    16: 'bool_',
+    20: 'int64',
+    21: 'int16',
+    23: 'int32',
+    700: 'float32',
+    701: 'float64',
+    1082: 'date32',
+    17: 'binary',
+}
+_TIMESTAMP_OID = 1114
+_TIMESTAMPTZ_OID = 1184
+_NUMERIC_OID = 1700
+
+
+def _arrow_column(pa, column):
+    """
+    カーソルの列情報から (列名, pyarrowの型, 値の変換関数) を返す
+
+    精度・スケールが指定されたnumericはdecimal128、それ以外の型（text・json・uuidなど）は文字列として出力する
+    """
+    if column.type_code in _ARROW_TYPES:
+        return column.name, getattr(pa, _ARROW_TYPES[column.type_code])(), _identity
+    if column.type_code == _TIMESTAMP_OID:
+        return column.name, pa.timestamp('us'), _identity
+    if column.type_code == _TIMESTAMPTZ_OID:
+        return column.name, pa.timestamp('us', tz='UTC'), _identity
+    if column.type_code == _NUMERIC_OID and column.precision and column.scale is not None:
+        return column.name, pa.decimal128(column.precision, column.scale), _identity
+    return column.name, pa.string(), _to_string
+
+
+def _identity(value):
+    return value
+
+
+def _to_string(value):
+    if value is None or isinstance(value, str):
+        return value
+    if isinstance(value, (dict, list)):
+        return json.dumps(value, ensure_ascii=False)
+    if isinstance(value, Decimal):
+        return format(value, 'f')
+    return str(value)
+
+
+# 出力形式 -> (書き込み関数, 拡張子, Content-Type, gzip圧縮できるか)
+EXPORT_FORMATS = {
+    'csv': (write_csv, '.csv', 'text/csv', True),
+    'jsonl': (write_jsonl, '.jsonl', 'application/x-ndjson', True),
+    'parquet': (write_parquet, '.parquet', 'application/vnd.apache.parquet', False),
+}
@@ -0,0 +1,119 @@
+"""
+差分エクスポートのチェックポイント（高水位）管理
+
+ジョブごとのチェックポイント（<prefix>/<name>/_checkpoint.json）に、最新のスナップショット（全件）と
+その後に出力した差分ファイルの一覧、差分抽出に使う列（updated_at や id）の高水位を記録する。
+利用側はスナップショットに差分を順に適用する（同じキーの行は後のファイルの内容を優先）ことで最新の状態を得られる。
+
+- 差分: 高水位 < 列の値 <= 今回の上限 の行を <prefix>/<name>/deltas/dt=YYYY-MM-DD/ に出力
+- コンパクション: 全件をスナップショットとして <prefix>/<name>/snapshots/ に出力し、以前のスナップショット・差分を削除
+
+差分では削除された行を検出できないため、コンパクション（全件の再出力）で削除を反映する。
+
+チェックポイントは読み込んだ時のETagを条件に更新するため、同じジョブの差分とコンパクションが並行して実行されても
+一方の更新が失われることはない（後から更新しようとした実行は CheckpointConflictError で失敗する）。
+"""
+import json
+from datetime import datetime, timezone
+from botocore.exceptions import ClientError
+from psycopg2 import sql
+
+CHECKPOINT_FILE_NAME = '_checkpoint.json'
+
+# 遅れてコミットされる更新を取りこぼさないよう、上限を現在時刻より前にする型（date, timestamp, timestamptz）
+TIMESTAMP_TYPE_OIDS = (1082, 1114, 1184)
+
+
+class CheckpointConflictError(Exception):
+    """チェックポイントが読み込み後に他の実行によって更新（作成）された"""
+
+
+class CheckpointStore:
+    """S3上のジョブごとのチェックポイント"""
+    def __init__(self, s3_client, bucket):
+        self.s3_client = s3_client
+        self.bucket = bucket
+
+    def key(self, job):
+        return f"{job['prefix']}/{job['name']}/{CHECKPOINT_FILE_NAME}"
+
+    def load(self, job):
+        """
+        チェックポイントを読み込む
+
+        Returns:
+            (チェックポイント, ETag)。まだない場合は (None, None)
+        """
+        try:
+            response = self.s3_client.get_object(Bucket=self.bucket, Key=self.key(job))
+        except self.s3_client.exceptions.NoSuchKey:
+            return None, None
+        checkpoint = json.loads(response['Body'].read())
+        if checkpoint.get('column') != job['incremental_column']:
+            raise ValueError(f"Checkpoint for {job['name']} uses column {checkpoint.get('column')}; "
+                             f"run a compaction after changing incremental_column")
+        return checkpoint, response['ETag']
+
+    def save(self, job, checkpoint, etag):
+        """
+        load() で読み込んだ時から変わっていない場合のみチェックポイントを書き込む
+
+        etag がNone（読み込み時になかった）の場合は、まだ作成されていない場合のみ書き込む
+        （IfMatch・IfNoneMatch には boto3・botocore 1.35.68 以上が必要。requirements.txt で指定）
+        """
+        checkpoint['updated_at'] = datetime.now(timezone.utc).isoformat()
+        condition = {'IfMatch': etag} if etag else {'IfNoneMatch': '*'}
+        try:
+            self.s3_client.put_object(
+                Bucket=self.bucket,
+                Key=self.key(job),
+                Body=json.dumps(checkpoint, ensure_ascii=False, indent=2, default=str).encode('utf-8'),
+                ContentType='application/json',
+                **condition
+            )
+        except ClientError as e:
+            # 409は同じキーへの条件付き書き込みが同時に行われた場合
+            if e.response['Error']['Code'] in ('PreconditionFailed', 'ConditionalRequestConflict'):
+                raise CheckpointConflictError(
+                    f"Checkpoint for {job['name']} was updated by another run; retry the export"
+                ) from e
+            raise
+
+
+def find_upper_bound(cursor, relation, column, lag_seconds):
+    """
+    今回の差分の上限（スナップショット内の列の最大値）を返す
+
+    日付・タイムスタンプ列は、トランザクション開始時刻を値に使う更新が遅れてコミットされても取りこぼさないよう、
+    現在時刻から lag_seconds 以内の値を次回以降に回す
+    """
+    cursor.execute(sql.SQL("SELECT {} FROM {} LIMIT 0").format(sql.Identifier(column), relation))
+    condition = sql.SQL('TRUE')
+    if cursor.description[0].type_code in TIMESTAMP_TYPE_OIDS:
+        condition = sql.SQL("{} <= now() - make_interval(secs => {})").format(
+            sql.Identifier(column), sql.Literal(lag_seconds)
+        )
+    cursor.execute(sql.SQL("SELECT max({column}) FROM {relation} WHERE {condition}").format(
+        column=sql.Identifier(column), relation=relation, condition=condition
+    ))
+    return cursor.fetchone()[0]
+
+
+def delta_condition(column, lower, upper):
+    """高水位 < 列の値 <= 上限 の条件（高水位がない場合は上限のみ）"""
+    conditions = [sql.SQL("{} <= {}").format(sql.Identifier(column), sql.Literal(upper))]
+    if lower is not None:
+        conditions.insert(0, sql.SQL("{} > {}").format(sql.Identifier(column), sql.Literal(lower)))
+    return sql.SQL(' AND ').join(conditions)
+
+
+def delete_objects(s3_client, bucket, keys):
+    """コンパクション済みのスナップショット・差分を削除（1000件ずつ）"""
+    keys = list(keys)
+    for start in range(0, len(keys), 1000):
+        response = s3_client.delete_objects(
+            Bucket=bucket,
+            Delete={'Objects': [{'Key': key} for key in keys[start:start + 1000]], 'Quiet': True}
+        )
+        for error in response.get('Errors', []):
+            print(f"Failed to delete s3://{bucket}/{error['Key']}: {error.get('Message')}")
@@ -1,83 +1,87 @@
 import os
 import json
+import time
 import boto3
-import psycopg2
-import csv
-from datetime import datetime
+from secret_cache import connect_db
+from export_engine import ExportEngine, build_jobs, load_config
+
+# エクスポートジョブの設定ファイル（Lambdaのパッケージ内のパス）
+EXPORT_CONFIG_FILE = os.environ.get('EXPORT_CONFIG_FILE', 'exports.json')
+
+# 並列に実行するジョブ数（ジョブごとに parallelism 個の接続を使用する）
+EXPORT_JOB_CONCURRENCY = int(os.environ.get('EXPORT_JOB_CONCURRENCY', '4'))
+
+# Lambdaのタイムアウトまでに残す時間（秒）。この時間を残してクエリを中断し、未開始のジョブはスキップする
+EXPORT_TIME_MARGIN_SECONDS = int(os.environ.get('EXPORT_TIME_MARGIN_SECONDS', '20'))
+
+# マルチパートアップロードの1パートのサイズ（MB、最小5）。メモリ使用量の目安になる
+EXPORT_PART_SIZE_MB = int(os.environ.get('EXPORT_PART_SIZE_MB', '8'))
+
+s3 = boto3.client('s3')
 
 def lambda_handler(event, context):
     """
-    RDSインスタンスに接続し、データを取得してCSV形式でS3に保存するLambda関数
+    RDSインスタンスに接続し、設定されたテーブル・クエリをS3にエクスポートするLambda関数
+
+    エクスポートするジョブはイベントで指定する（優先順位順）:
+    - {"exports": [{...}, ...]}: ジョブ定義を直接指定
+    - {"names": ["users", ...]}: 設定ファイル（exports.json）のジョブから選択
+    - {"table": "users", ...}: 1つのテーブルをジョブ定義と同じ項目で指定
+    - {}: 設定ファイルのジョブのうち "default": false でないもの
+
+    {"mode": "incremental"} / {"mode": "compact"} を指定すると差分エクスポートのジョブ（incremental_column あり）のみを実行する
+    （"default": false のジョブも含む）。
+    compact は全件のスナップショットを出力して以前のスナップショット・差分を置き換える（定期実行用）。
+
+    ジョブの設定項目・出力先は export_engine.py を参照。
+    出力はCOPY・名前付きカーソルからS3マルチパートアップロードに直接流すため、メモリ使用量は一定で /tmp も使用しない
     """
-    
+
     # 環境変数からSecrets Manager ARNとS3バケット名を取得
     secret_arn = os.environ['DB_SECRET_ARN']
     s3_bucket = os.environ['S3_BUCKET_NAME']
-    
+
     try:
-        # Secrets Managerから全ての接続情報を取得
-        secrets_client = boto3.client('secretsmanager')
-        response = secrets_client.get_secret_value(SecretId=secret_arn)
-        secret = json.loads(response['SecretString'])
-
-        username = secret['username']
-        password = secret['password']
-        db_host = secret['host']
-        db_port = secret['port']
-        db_name = secret['dbname']
-        
-        print(f"Connecting to PostgreSQL database: {db_host}")
-        
-        # PostgreSQLへの接続
-        conn = psycopg2.connect(
-            host=db_host,
-            port=db_port,
-            dbname=db_name,
-            user=username,
-            password=password
+        event = event or {}
+        mode = event.get('mode')
+        if mode not in (None, 'incremental', 'compact'):
+            raise ValueError(f"mode must be 'incremental' or 'compact': {mode}")
+        jobs = select_jobs(event)
+        if mode:
+            jobs = [job for job in jobs if job.get('incremental_column')]
+            if not jobs:
+                raise ValueError("No incremental exports selected")
+
+        # Lambdaの残り時間から処理の期限を決める
+        remaining_seconds = context.get_remaining_time_in_millis() / 1000 if context else 900
+        deadline = time.time() + remaining_seconds - EXPORT_TIME_MARGIN_SECONDS
+
+        # PostgreSQLへの接続（接続情報はSecrets Managerから取得し、実行環境内でキャッシュ）
+        def connect(statement_timeout_ms):
+            return connect_db(secret_arn, options=f'-c statement_timeout={max(statement_timeout_ms, 1)}')
+
+        engine = ExportEngine(
+            connect, s3, s3_bucket,
+            writer_options={'part_size': EXPORT_PART_SIZE_MB * 1024 * 1024},
+            job_concurrency=EXPORT_JOB_CONCURRENCY,
+            deadline=deadline
         )
-        
-        # データを取得
-        with conn.cursor() as cursor:
-            cursor.execute("SELECT * FROM users")
-            rows = cursor.fetchall()
-            # カラム名を取得
-            columns = [desc[0] for desc in cursor.description]
-            
-            # データを整形
-            data = [dict(zip(columns, row)) for row in rows]
-            print(f"Retrieved {len(rows)} records from database")
-        
-        conn.close()
-        
-        # 現在のタイムスタンプをファイル名に使用
-        timestamp = datetime.now().strftime("%Y%m%d_%H%M%S")
-        csv_filename = f"/tmp/users_{timestamp}.csv"
-        s3_key = f"exports/users_{timestamp}.csv"
-        
-        # データをCSVファイルに書き込む
-        with open(csv_filename, 'w', newline='') as csvfile:
-            # カラム名をヘッダーとして使用
-            writer = csv.DictWriter(csvfile, fieldnames=columns)
-            writer.writeheader()
-            writer.writerows(data)
-            
-        print(f"CSV file created at {csv_filename}")
-        
-        # CSVファイルをS3にアップロード
-        s3 = boto3.client('s3')
-        s3.upload_file(csv_filename, s3_bucket, s3_key)
-        print(f"CSV file uploaded to s3://{s3_bucket}/{s3_key}")
-        
+        results = engine.run(jobs, compact=mode == 'compact')
+
+        succeeded = [result for result in results if result['status'] == 'succeeded']
         return {
-            'statusCode': 200,
+            'statusCode': 200 if len(succeeded) == len(results) else 500,
             'body': json.dumps({
-                'message': f'データの取得とCSVエクスポートが完了しました✨',
-                's3_location': f's3://{s3_bucket}/{s3_key}',
-                'record_count': len(rows)
-            })
+                'message': 'データの取得とエクスポートが完了しました✨' if len(succeeded) == len(results)
+                else 'Export failed or was skipped for some jobs',
+                'exports_succeeded': len(succeeded),
+                'exports_failed': sum(1 for result in results if result['status'] == 'failed'),
+                'exports_skipped': sum(1 for result in results if result['status'] == 'skipped'),
+                'record_count': sum(result['record_count'] for result in succeeded),
+                'results': results
+            }, ensure_ascii=False, default=str)
         }
-    
+
     except Exception as e:
         print(f"Error: {str(e)}")
         return {
@@ -85,4 +89,28 @@ def lambda_handler(event, context):
             'body': json.dumps({
                 'error': str(e)
             })
-        } 
\ No newline at end of file
+        }
+
+def select_jobs(event):
+    """イベントに応じてエクスポートするジョブの一覧を返す"""
+    config = load_config(EXPORT_CONFIG_FILE) if os.path.exists(EXPORT_CONFIG_FILE) else {}
+    defaults = config.get('defaults', {})
+
+    if 'exports' in event:
+        return build_jobs(event['exports'], defaults)
+    if 'table' in event:
+        return build_jobs([event], defaults)
+
+    exports = config.get('exports', [])
+    if 'names' in event:
+        by_name = {export.get('name') or export.get('table'): export for export in exports}
+        missing = [name for name in event['names'] if name not in by_name]
+        if missing:
+            raise ValueError(f"Unknown export names: {missing}")
+        exports = [by_name[name] for name in event['names']]
+    if not exports:
+        raise ValueError(f"No exports configured in {EXPORT_CONFIG_FILE}")
+    jobs = build_jobs(exports, defaults)
+    if 'names' not in event and not event.get('mode'):
+        jobs = [job for job in jobs if job['default']]
+    return jobs
\ No newline at end of file
@@ -0,0 +1,261 @@
+"""
+エクスポートの分割と並列実行
+
+1つのエクスポートを「スライス」（抽出条件と出力先キーの組）に分割し、スライスごとにファイルを出力する。
+- 主キー（整数型の単一列）の値の範囲、または主キーがない場合はctidのブロック範囲（テーブルのみ）
+- パーティション列の値（Hive形式のプレフィックス col=value/ に出力）。値ごとに抽出条件 col = 値（NULLは IS NULL）で
+  クエリを実行するため、パーティション列にインデックスがあるテーブル、または条件をクエリ内に押し込める単純なクエリ向け。
+  値の数は EXPORT_MAX_PARTITIONS まで
+- 分割しない場合は1スライス
+
+全スライスは pg_export_snapshot() で共有した同じスナップショットから読み出すため、
+並列に実行しても単一接続のエクスポートと同じ内容になる。
+"""
+import os
+import threading
+from concurrent.futures import ThreadPoolExecutor
+from urllib.parse import quote
+from psycopg2 import sql
+from s3_stream import S3MultipartWriter
+
+MANIFEST_FILE_NAME = '_manifest.json'
+
+# 主キーの範囲で分割できる型
+INTEGER_KEY_TYPES = ('smallint', 'integer', 'bigint')
+
+# パーティション列の値がNULLの場合のプレフィックス（Hiveと同じ）
+NULL_PARTITION_VALUE = '__HIVE_DEFAULT_PARTITION__'
+
+# パーティション列の値の組の最大数（値ごとにクエリを1回実行してファイルを1つ出力するため）
+EXPORT_MAX_PARTITIONS = int(os.environ.get('EXPORT_MAX_PARTITIONS', '500'))
+
+
+def parse_table_name(table):
+    """'schema.table' または 'table' をSQL識別子に変換"""
+    parts = table.split('.')
+    if len(parts) > 2 or not all(parts):
+        raise ValueError(f"Invalid table name: {table}")
+    return sql.Identifier(*parts)
+
+
+def find_integer_key(cursor, table):
+    """整数型の単一列の主キー名を返す（ない場合はNone）"""
+    cursor.execute("""
+        SELECT a.attname, format_type(a.atttypid, a.atttypmod)
+        FROM pg_index i
+        JOIN pg_attribute a ON a.attrelid = i.indrelid AND a.attnum = ANY(i.indkey)
+        WHERE i.indrelid = to_regclass(%s) AND i.indisprimary
+    """, (table,))
+    columns = cursor.fetchall()
+    if len(columns) == 1 and columns[0][1] in INTEGER_KEY_TYPES:
+        return columns[0][0]
+    return None
+
+
+def plan_key_ranges(cursor, table_identifier, key_column, partitions):
+    """
+    主キーの最小値〜最大値を partitions 個の範囲に等分
+
+    Returns:
+        [(下限, 上限)]（下限を含み上限を含まない。最初の範囲の下限・最後の範囲の上限はNone＝制限なし）
+    """
+    cursor.execute(sql.SQL("SELECT min({key}), max({key}) FROM {table}").format(
+        key=sql.Identifier(key_column), table=table_identifier
+    ))
+    lower, upper = cursor.fetchone()
+    if lower is None:
+        return [(None, None)]
+    step = max(-(-(upper - lower + 1) // partitions), 1)
+    bounds = list(range(lower + step, upper + 1, step))
+    return list(zip([None] + bounds, bounds + [None]))
+
+
+def plan_block_ranges(cursor, table, partitions):
+    """
+    テーブルのブロック（ページ）を partitions 個の範囲に等分
+
+    Returns:
+        [(下限ブロック, 上限ブロック)]（最初の範囲の下限・最後の範囲の上限はNone＝制限なし）
+    """
+    cursor.execute(
+        "SELECT pg_relation_size(to_regclass(%s)) / current_setting('block_size')::int", (table,)
+    )
+    blocks = cursor.fetchone()[0]
+    step = max(-(-blocks // partitions), 1)
+    bounds = list(range(step, blocks, step))
+    return list(zip([None] + bounds, bounds + [None]))
+
+
+def range_condition(split_by, key_column, lower, upper):
+    """範囲の抽出条件（WHERE句）"""
+    if split_by == 'ctid':
+        column = sql.SQL('ctid')
+        lower = f'({lower},0)' if lower is not None else None
+        upper = f'({upper},0)' if upper is not None else None
+        cast = sql.SQL('::tid')
+    else:
+        column = sql.Identifier(key_column)
+        cast = sql.SQL('')
+
+    conditions = []
+    if lower is not None:
+        conditions.append(sql.SQL("{} >= {}{}").format(column, sql.Literal(lower), cast))
+    if upper is not None:
+        conditions.append(sql.SQL("{} < {}{}").format(column, sql.Literal(upper), cast))
+    return sql.SQL(' AND ').join(conditions) if conditions else sql.SQL('TRUE')
+
+
+def plan_range_slices(cursor, table, prefix, extension, parallelism, partitions=None, split_by=None):
+    """
+    テーブルを主キーまたはctidの範囲に分割したスライス
+
+    split_by 省略時は主キーがあれば 'pk'、なければ 'ctid'
+    """
+    table_identifier = parse_table_name(table)
+    key_column = find_integer_key(cursor, table)
+    if split_by is None:
+        split_by = 'pk' if key_column else 'ctid'
+    if split_by == 'pk':
+        if key_column is None:
+            raise ValueError(f"Table {table} has no single-column integer primary key; use split_by=ctid")
+        ranges = plan_key_ranges(cursor, table_identifier, key_column, partitions or parallelism)
+    elif split_by == 'ctid':
+        ranges = plan_block_ranges(cursor, table, partitions or parallelism)
+    else:
+        raise ValueError(f"split_by must be 'pk' or 'ctid': {split_by}")
+
+    return [
+        {
+            'key': f"{prefix}/part-{index:05d}{extension}",
+            'split_by': split_by,
+            'key_column': key_column if split_by == 'pk' else None,
+            'lower': lower,
+            'upper': upper,
+            'condition': range_condition(split_by, key_column, lower, upper),
+        }
+        for index, (lower, upper) in enumerate(ranges, start=1)
+    ]
+
+
+def plan_partition_slices(cursor, relation, partition_by, prefix, extension, max_partitions=EXPORT_MAX_PARTITIONS):
+    """
+    パーティション列の値ごとのスライス（出力先は <prefix>/col=value/.../part-00001<拡張子>）
+
+    抽出条件は col = 値 / col IS NULL とし、インデックスやパーティションの絞り込み、クエリ内への条件の押し込みを使えるようにする。
+    値の組が max_partitions を超える場合はエラー（より粗い列でパーティションするか、上限を上げる）
+    """
+    columns = sql.SQL(', ').join(map(sql.Identifier, partition_by))
+    cursor.execute(sql.SQL("SELECT DISTINCT {columns} FROM {relation} ORDER BY {columns} LIMIT {limit}").format(
+        columns=columns, relation=relation, limit=sql.Literal(max_partitions + 1)
+    ))
+    partitions = cursor.fetchall()
+    if len(partitions) > max_partitions:
+        raise ValueError(
+            f"partition_by {partition_by} has more than {max_partitions} distinct values; "
+            f"partition by coarser columns or raise EXPORT_MAX_PARTITIONS"
+        )
+    slices = []
+    for values in partitions:
+        path = '/'.join(
+            f"{column}={NULL_PARTITION_VALUE if value is None else quote(str(value), safe='')}"
+            for column, value in zip(partition_by, values)
+        )
+        slices.append({
+            'key': f"{prefix}/{path}/part-00001{extension}",
+            'partition': {column: None if value is None else str(value) for column, value in zip(partition_by, values)},
+            'condition': sql.SQL(' AND ').join(
+                sql.SQL("{} IS NULL").format(sql.Identifier(column)) if value is None else
+                sql.SQL("{} = {}").format(sql.Identifier(column), sql.Literal(value))
+                for column, value in zip(partition_by, values)
+            ),
+        })
+    return slices
+
+
+def begin_snapshot(conn):
+    """読み取り専用のREPEATABLE READトランザクションを開始し、他の接続で共有するスナップショットIDを返す"""
+    conn.set_session(isolation_level='REPEATABLE READ', readonly=True)
+    with conn.cursor() as cursor:
+        cursor.execute("SELECT pg_export_snapshot()")
+        return cursor.fetchone()[0]
+
+
+def export_slices(coordinator, connect, snapshot_id, s3_client, bucket, relation, slices, write_format,
+                  parallelism, writer_options, before_slice=None):
+    """
+    スライスごとに relation（テーブル、または (クエリ) AS q）を抽出条件で絞り込んでS3に出力し、
+    各スライスに rows・bytes を設定する
+
+    parallelism が1の場合はコーディネーターの接続で順に出力し、2以上の場合はスレッドごとに新しい接続で
+    スナップショットを取り込んで並列に出力する（接続はスレッド内のスライス間で再利用）。いずれかのスライスが失敗した場合は出力済みのファイルを削除する。
+
+    Args:
+        before_slice: 各スライスの開始前に呼び出す関数（残り時間が足りない場合に例外を送出するなど）
+    """
+    def export_slice(conn, slice_):
+        if before_slice:
+            before_slice()
+        query = sql.SQL("SELECT * FROM {relation} WHERE {condition}").format(
+            relation=relation, condition=slice_['condition']
+        )
+        with S3MultipartWriter(s3_client, bucket, slice_['key'], **writer_options) as writer:
+            rows = write_format(conn, query, writer)
+        print(f"Exported {rows} rows to s3://{bucket}/{slice_['key']}")
+        return {'rows': rows, 'bytes': writer.bytes_uploaded}
+
+    local = threading.local()
+    worker_connections = []
+    worker_connections_lock = threading.Lock()
+
+    def export_slice_in_snapshot(slice_):
+        conn = getattr(local, 'conn', None)
+        if conn is None:
+            conn = connect()
+            with worker_connections_lock:
+                worker_connections.append(conn)
+            local.conn = conn
+            conn.set_session(isolation_level='REPEATABLE READ', readonly=True)
+            with conn.cursor() as cursor:
+                # コーディネーターと同じスナップショットから読み出す（トランザクションの最初の文で設定）
+                cursor.execute("SET TRANSACTION SNAPSHOT %s", (snapshot_id,))
+        return export_slice(conn, slice_)
+
+    results = [None] * len(slices)
+    errors = []
+    if parallelism > 1 and len(slices) > 1:
+        try:
+            with ThreadPoolExecutor(max_workers=parallelism) as executor:
+                futures = [executor.submit(export_slice_in_snapshot, slice_) for slice_ in slices]
+        finally:
+            for conn in worker_connections:
+                conn.close()
+        for index, future in enumerate(futures):
+            if future.exception() is not None:
+                errors.append(future.exception())
+            else:
+                results[index] = future.result()
+    else:
+        for index, slice_ in enumerate(slices):
+            try:
+                results[index] = export_slice(coordinator, slice_)
+            except Exception as e:
+                errors.append(e)
+                break
+
+    if errors:
+        _delete_objects(s3_client, bucket, [slice_['key'] for slice_, result in zip(slices, results) if result])
+        raise RuntimeError(f"{len(errors)} of {len(slices)} slices failed: {errors[0]}")
+
+    for slice_, result in zip(slices, results):
+        slice_.update(result)
+        del slice_['condition']
+    return slices
+
+
+def _delete_objects(s3_client, bucket, keys):
+    """失敗時に出力済みのファイルを削除（マニフェストのない不完全な出力を残さない）"""
+    for key in keys:
+        try:
+            s3_client.delete_object(Bucket=bucket, Key=key)
+        except Exception as e:
+            print(f"Failed to delete s3://{bucket}/{key}: {str(e)}")
@@ -0,0 +1,113 @@
+"""
+S3マルチパートアップロードへのストリーミング書き込み
+
+psycopg2の copy_expert に書き込み先として渡すファイルライクオブジェクト。
+受け取ったデータを（必要に応じてgzip圧縮して）パートサイズ分だけメモリに溜め、
+溜まるたびにパートとしてアップロードする。メモリ使用量はパートサイズ程度で一定になり、/tmp は使用しない。
+"""
+import zlib
+
+# S3マルチパートアップロードの最小パートサイズ（最終パートを除く）
+MIN_PART_SIZE = 5 * 1024 * 1024
+
+
+class S3MultipartWriter:
+    """
+    書き込んだバイト列をS3にマルチパートアップロードする
+
+    with文で使用し、正常終了時にアップロードを完了、例外時にアップロードを中止する
+    """
+    def __init__(self, s3_client, bucket, key, part_size=MIN_PART_SIZE, compress=False, content_type=None):
+        if part_size < MIN_PART_SIZE:
+            raise ValueError(f"part_size must be at least {MIN_PART_SIZE} bytes")
+        self.s3_client = s3_client
+        self.bucket = bucket
+        self.key = key
+        self.part_size = part_size
+        self.content_type = content_type
+        # wbits=31 でgzip形式（ヘッダー・CRC付き）のストリームを生成
+        self._compressor = zlib.compressobj(wbits=31) if compress else None
+        self._buffer = bytearray()
+        self._parts = []
+        self._upload_id = None
+        self.closed = False
+        self.bytes_written = 0
+        self.bytes_uploaded = 0
+
+    def __enter__(self):
+        extra_args = {'ContentType': self.content_type} if self.content_type else {}
+        response = self.s3_client.create_multipart_upload(Bucket=self.bucket, Key=self.key, **extra_args)
+        self._upload_id = response['UploadId']
+        return self
+
+    def __exit__(self, exc_type, exc_value, traceback):
+        if exc_type is not None:
+            self.abort()
+            return False
+        try:
+            self.close()
+        except Exception:
+            self.abort()
+            raise
+        return False
+
+    def write(self, data):
+        """データを書き込み、パートサイズに達したらアップロード"""
+        if isinstance(data, str):
+            data = data.encode('utf-8')
+        size = len(data)
+        self.bytes_written += size
+        if self._compressor:
+            data = self._compressor.compress(data)
+        self._buffer += data
+        while len(self._buffer) >= self.part_size:
+            self._upload_part(bytes(self._buffer[:self.part_size]))
+            del self._buffer[:self.part_size]
+        return size
+
+    def tell(self):
+        """書き込んだ（圧縮前の）バイト数（pyarrowなどファイル位置を参照する書き込み元用）"""
+        return self.bytes_written
+
+    def flush(self):
+        """パート単位でアップロードするため何もしない"""
+
+    def close(self):
+        """残りのデータを最終パートとしてアップロードし、マルチパートアップロードを完了（2回目以降は何もしない）"""
+        if self.closed:
+            return
+        if self._compressor:
+            self._buffer += self._compressor.flush()
+            self._compressor = None
+        if self._buffer or not self._parts:
+            self._upload_part(bytes(self._buffer))
+            self._buffer.clear()
+        self.s3_client.complete_multipart_upload(
+            Bucket=self.bucket,
+            Key=self.key,
+            UploadId=self._upload_id,
+            MultipartUpload={'Parts': self._parts}
+        )
+        self.closed = True
+        print(f"Completed multipart upload of s3://{self.bucket}/{self.key} "
+              f"({len(self._parts)} parts, {self.bytes_uploaded} bytes)")
+
+    def abort(self):
+        """アップロード済みのパートを破棄（不完全なオブジェクトを残さない）"""
+        if self.closed:
+            return
+        self.closed = True
+        print(f"Aborting multipart upload of s3://{self.bucket}/{self.key}")
+        self.s3_client.abort_multipart_upload(Bucket=self.bucket, Key=self.key, UploadId=self._upload_id)
+
+    def _upload_part(self, body):
+        part_number = len(self._parts) + 1
+        response = self.s3_client.upload_part(
+            Bucket=self.bucket,
+            Key=self.key,
+            UploadId=self._upload_id,
+            PartNumber=part_number,
+            Body=body
+        )
+        self._parts.append({'PartNumber': part_number, 'ETag': response['ETag']})
+        self.bytes_uploaded += len(body)
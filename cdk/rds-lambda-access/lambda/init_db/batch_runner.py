@@ -0,0 +1,238 @@
+"""
+大きなSQLファイル（シードデータ）のバッチ実行と再開
+
+SQLファイルを文に分割し、一定の文数・時間ごとにコミットしながら実行する。
+- 進捗（ファイル内の位置と、そこまでの内容のチェックサム）はバッチと同じトランザクションで init_sql_progress テーブルに
+  記録するため、タイムアウトや失敗の後に再実行すると、最後にコミットしたバッチの次の文から再開する。
+  実行済みの部分が変わっていなければ、失敗した文の修正やファイル末尾への追記の後も続きから実行する
+- 値がリテラルのみの INSERT ... VALUES は COPY に変換し、同じテーブル・列への連続したINSERTは1回のCOPYにまとめる
+- トランザクション内で実行できない文（VACUUM, CREATE INDEX CONCURRENTLY 等）は単独で自動コミットで実行する
+- ファイル内の BEGIN / COMMIT はバッチのトランザクションと競合するため無視する
+- statement_timeout の設定（pg_dump が出力する SET statement_timeout = 0 等）は、Lambdaのタイムアウト前に
+  クエリを中断するための設定を上書きしないよう無視する
+- セッションの設定（SET, set_config）は進捗と一緒に記録し、再開時に再実行する
+"""
+import hashlib
+import io
+import re
+import time
+from sql_splitter import split_statements, parse_insert, normalize_target
+
+PROGRESS_TABLE_SQL = """
+CREATE TABLE IF NOT EXISTS public.init_sql_progress (
+    file_name TEXT PRIMARY KEY,
+    checksum TEXT NOT NULL,
+    position BIGINT NOT NULL,
+    statements BIGINT NOT NULL,
+    copied_rows BIGINT NOT NULL,
+    session_settings TEXT[] NOT NULL,
+    completed_at TIMESTAMP WITH TIME ZONE,
+    updated_at TIMESTAMP WITH TIME ZONE NOT NULL DEFAULT CURRENT_TIMESTAMP
+)
+"""
+
+SAVE_PROGRESS_SQL = """
+INSERT INTO public.init_sql_progress
+    (file_name, checksum, position, statements, copied_rows, session_settings, completed_at, updated_at)
+VALUES (%s, %s, %s, %s, %s, %s, CASE WHEN %s THEN CURRENT_TIMESTAMP END, CURRENT_TIMESTAMP)
+ON CONFLICT (file_name) DO UPDATE SET
+    checksum = EXCLUDED.checksum,
+    position = EXCLUDED.position,
+    statements = EXCLUDED.statements,
+    copied_rows = EXCLUDED.copied_rows,
+    session_settings = EXCLUDED.session_settings,
+    completed_at = EXCLUDED.completed_at,
+    updated_at = EXCLUDED.updated_at
+"""
+
+_NON_TRANSACTIONAL = re.compile(
+    r"(VACUUM|ALTER\s+SYSTEM|(CREATE|DROP)\s+DATABASE|(CREATE|DROP)\s+(UNIQUE\s+)?INDEX\s+CONCURRENTLY"
+    r"|REINDEX\b.*\bCONCURRENTLY)\b",
+    re.I | re.S
+)
+_TRANSACTION_CONTROL = re.compile(r"(BEGIN|START\s+TRANSACTION|COMMIT|END|ROLLBACK)\b\s*(WORK|TRANSACTION)?\s*$", re.I)
+_STATEMENT_TIMEOUT = re.compile(
+    r"(SET\s+(SESSION\s+)?statement_timeout\b|SELECT\s+(pg_catalog\.)?set_config\s*\(\s*'statement_timeout')", re.I
+)
+_SESSION_SETTING = re.compile(
+    r"(SET\s+(?!LOCAL\b|TRANSACTION\b|SESSION\s+CHARACTERISTICS\b)|SELECT\s+(pg_catalog\.)?set_config\s*\()",
+    re.I
+)
+
+# 連続したINSERTをまとめたCOPYデータをこのサイズごとに送信する（メモリ使用量の上限の目安）
+COPY_BUFFER_BYTES = 16 * 1024 * 1024
+
+
+class BatchRunner:
+    """SQLファイルを進捗を記録しながらバッチ実行する"""
+    def __init__(self, conn, batch_statements, batch_seconds, deadline):
+        self.conn = conn
+        self.batch_statements = batch_statements
+        self.batch_seconds = batch_seconds
+        self.deadline = deadline
+
+    def run(self, file_name, text, restart=False):
+        """
+        SQLファイルを前回の進捗から実行する
+
+        Returns:
+            進捗（completed: 最後まで実行したか, position: 実行済みの位置, size: ファイルのサイズ 等）
+        """
+        with self.conn.cursor() as cursor:
+            cursor.execute(PROGRESS_TABLE_SQL)
+            # 同じファイルを同時に実行しない（接続を閉じると解放される）
+            cursor.execute("SELECT pg_try_advisory_lock(hashtext(%s))", (f"init_sql:{file_name}",))
+            if not cursor.fetchone()[0]:
+                raise RuntimeError(f"{file_name} is already being executed by another invocation")
+            cursor.execute(
+                "SELECT checksum, position, statements, copied_rows, session_settings, completed_at "
+                "FROM public.init_sql_progress WHERE file_name = %s", (file_name,)
+            )
+            saved = cursor.fetchone()
+        self.conn.commit()
+
+        progress = {'file_name': file_name, 'digest': hashlib.sha256(), 'position': 0, 'statements': 0,
+                    'copied_rows': 0, 'session_settings': []}
+        if saved and not restart:
+            digest = hashlib.sha256(text[:saved[1]].encode('utf-8'))
+            if saved[1] > len(text) or digest.hexdigest() != saved[0]:
+                print(f"{file_name} has changed before offset {saved[1]}; executing from the beginning")
+            elif saved[5] is not None and saved[1] == len(text):
+                print(f"{file_name} was already executed at {saved[5]}")
+                progress.update(position=saved[1], statements=saved[2], copied_rows=saved[3])
+                return self._result(progress, text, True, executed=False)
+            else:
+                progress.update(digest=digest, position=saved[1], statements=saved[2], copied_rows=saved[3],
+                                session_settings=list(saved[4]))
+                print(f"Resuming {file_name} at offset {saved[1]} of {len(text)} ({saved[2]} statements done)")
+                with self.conn.cursor() as cursor:
+                    for setting in progress['session_settings']:
+                        cursor.execute(setting)
+                self.conn.commit()
+
+        completed = self._execute(text, progress)
+        return self._result(progress, text, completed)
+
+    def _execute(self, text, progress):
+        """バッチごとにコミットしながら実行し、最後まで実行したかを返す"""
+        batch = _Batch(self.conn, progress['position'])
+        batch_start = time.time()
+        try:
+            for start, statement, data, end in split_statements(text, progress['position']):
+                if not batch.statements and time.time() >= self.deadline:
+                    return False
+
+                if _TRANSACTION_CONTROL.match(statement) or _STATEMENT_TIMEOUT.match(statement):
+                    print(f"Skipping statement at offset {start}: {statement}")
+                elif _NON_TRANSACTIONAL.match(statement):
+                    self._commit(batch, progress, text)
+                    self.conn.autocommit = True
+                    try:
+                        with self.conn.cursor() as cursor:
+                            cursor.execute(statement)
+                    finally:
+                        self.conn.autocommit = False
+                    # 再開時に再実行しないよう、すぐに進捗を記録する
+                    batch.statements = 1
+                    batch.last_offset = start
+                    progress['position'] = end
+                    self._commit(batch, progress, text)
+                    batch_start = time.time()
+                    continue
+                else:
+                    insert = parse_insert(statement) if data is None else None
+                    if insert:
+                        progress['copied_rows'] += batch.add_rows(*insert)
+                    else:
+                        batch.execute(statement, data)
+                    if _SESSION_SETTING.match(statement):
+                        progress['session_settings'].append(statement)
+
+                batch.statements += 1
+                batch.last_offset = start
+                progress['position'] = end
+                if (batch.statements >= self.batch_statements or
+                        time.time() - batch_start >= self.batch_seconds):
+                    self._commit(batch, progress, text)
+                    batch_start = time.time()
+            progress['position'] = len(text)
+            self._commit(batch, progress, text, completed=True)
+        except Exception as e:
+            self.conn.rollback()
+            raise RuntimeError(
+                f"Batch starting at offset {batch.first_offset} (up to offset {batch.last_offset}) failed: {str(e)}"
+            ) from e
+        return True
+
+    def _commit(self, batch, progress, text, completed=False):
+        """保留中のCOPYを送信し、進捗と一緒にコミット"""
+        batch.flush()
+        progress['statements'] += batch.statements
+        progress['digest'].update(text[batch.first_offset:progress['position']].encode('utf-8'))
+        with self.conn.cursor() as cursor:
+            cursor.execute(SAVE_PROGRESS_SQL, (
+                progress['file_name'], progress['digest'].hexdigest(), progress['position'], progress['statements'],
+                progress['copied_rows'], progress['session_settings'], completed
+            ))
+        self.conn.commit()
+        if batch.statements:
+            print(f"Committed {batch.statements} statements "
+                  f"(offset {progress['position']}, {progress['statements']} statements in total)")
+        batch.reset(progress['position'])
+
+    @staticmethod
+    def _result(progress, text, completed, executed=True):
+        return {
+            'completed': completed,
+            'executed': executed,
+            'position': progress['position'],
+            'size': len(text),
+            'percent': round(progress['position'] * 100 / len(text), 1) if text else 100.0,
+            'statements': progress['statements'],
+            'copied_rows': progress['copied_rows'],
+        }
+
+
+class _Batch:
+    """1トランザクション分の実行状態（連続したINSERTをまとめたCOPYデータを含む）"""
+    def __init__(self, conn, offset):
+        self.conn = conn
+        self.copy_target = None
+        self.copy_buffer = io.StringIO()
+        self.reset(offset)
+
+    def reset(self, offset):
+        self.statements = 0
+        self.first_offset = offset
+        self.last_offset = offset
+
+    def add_rows(self, table, columns, rows):
+        """INSERTの行をCOPYデータに追加し、行数を返す"""
+        target = normalize_target(table, columns)
+        if self.copy_target and self.copy_target[0] != target:
+            self.flush()
+        self.copy_target = (target, f"COPY {table} {columns} FROM STDIN WITH (FORMAT csv)")
+        for row in rows:
+            self.copy_buffer.write(row)
+            self.copy_buffer.write('\n')
+        if self.copy_buffer.tell() >= COPY_BUFFER_BYTES:
+            self.flush()
+        return len(rows)
+
+    def execute(self, statement, data=None):
+        self.flush()
+        with self.conn.cursor() as cursor:
+            if data is None:
+                cursor.execute(statement)
+            else:
+                cursor.copy_expert(statement, io.StringIO(data))
+
+    def flush(self):
+        """保留中のCOPYデータを送信"""
+        if self.copy_target is None:
+            return
+        self.copy_buffer.seek(0)
+        with self.conn.cursor() as cursor:
+            cursor.copy_expert(self.copy_target[1], self.copy_buffer)
+        self.copy_target = None
+        self.copy_buffer = io.StringIO()
@@ -1,59 +1,73 @@
 import os
 import json
-import boto3
-import psycopg2
+import time
+from secret_cache import connect_db
+from batch_runner import BatchRunner
+
+# 実行するSQLファイル（Lambdaのパッケージ内のパス）
+INIT_SQL_FILE = os.environ.get('INIT_SQL_FILE', 'init.sql')
+
+# 1バッチ（1トランザクション）で実行する最大の文数
+INIT_BATCH_STATEMENTS = int(os.environ.get('INIT_BATCH_STATEMENTS', '1000'))
+
+# 1バッチの実行時間の目安（秒）。超えた時点でコミットして進捗を記録する
+INIT_BATCH_SECONDS = int(os.environ.get('INIT_BATCH_SECONDS', '10'))
+
+# Lambdaのタイムアウトまでに残す時間（秒）。この時間を残してクエリを中断し、新しいバッチを開始しない
+INIT_TIME_MARGIN_SECONDS = int(os.environ.get('INIT_TIME_MARGIN_SECONDS', '10'))
 
 def lambda_handler(event, context):
     """
     RDSインスタンスに接続し、SQLファイルからテーブル作成とデータ挿入を行うLambda関数
+
+    SQLファイルは文ごとに分割し、バッチ単位でコミットしながら実行する（詳細は batch_runner.py を参照）。
+    Lambdaの実行時間内に終わらなかった場合は statusCode 202 を返すため、同じイベントで再度呼び出すと続きから実行する。
+    完了済みのファイル（内容が変わっていないもの）は再実行しない。{"restart": true} で最初から実行する
     """
-    
+
     # 環境変数からSecrets Manager ARNのみ取得
     secret_arn = os.environ['DB_SECRET_ARN']
 
     try:
-        # Secrets Managerから全ての接続情報を取得
-        secrets_client = boto3.client('secretsmanager')
-        response = secrets_client.get_secret_value(SecretId=secret_arn)
-        secret = json.loads(response['SecretString'])
+        event = event or {}
+
+        # Lambdaの残り時間から処理の期限を決める
+        remaining_seconds = context.get_remaining_time_in_millis() / 1000 if context else 900
+        deadline = time.time() + remaining_seconds - INIT_TIME_MARGIN_SECONDS
+        statement_timeout_ms = max(int((deadline - time.time()) * 1000), 1)
 
-        username = secret['username']
-        password = secret['password']
-        db_host = secret['host']
-        db_port = secret['port']
-        db_name = secret['dbname']
-        
-        print(f"Connecting to PostgreSQL database: {db_host}")
-        
-        # PostgreSQLへの接続
-        conn = psycopg2.connect(
-            host=db_host,
-            port=db_port,
-            dbname=db_name,
-            user=username,
-            password=password
-        )
-        
         # SQLファイルを読み込む
-        with open('init.sql', 'r') as file:
+        with open(INIT_SQL_FILE, 'r') as file:
             sql_commands = file.read()
-        
-        # クエリを実行
-        with conn.cursor() as cursor:
-            print("Executing SQL commands from init.sql...")
-            cursor.execute(sql_commands)
-            conn.commit()
-            print("Database initialization completed successfully!")
-        
-        conn.close()
-        
+
+        # PostgreSQLへの接続（接続情報はSecrets Managerから取得し、実行環境内でキャッシュ）
+        conn = connect_db(secret_arn, options=f'-c statement_timeout={statement_timeout_ms}')
+        try:
+            print(f"Executing SQL commands from {INIT_SQL_FILE}...")
+            runner = BatchRunner(conn, INIT_BATCH_STATEMENTS, INIT_BATCH_SECONDS, deadline)
+            result = runner.run(INIT_SQL_FILE, sql_commands, restart=bool(event.get('restart')))
+        finally:
+            conn.close()
+
+        if not result['completed']:
+            print(f"Paused at offset {result['position']} of {result['size']} ({result['percent']}%)")
+            return {
+                'statusCode': 202,
+                'body': json.dumps({
+                    'message': 'Initialization is in progress; invoke again to resume',
+                    **result
+                })
+            }
+
+        print("Database initialization completed successfully!")
         return {
             'statusCode': 200,
             'body': json.dumps({
-                'message': 'データベース初期化が完了しました✨'
+                'message': 'データベース初期化が完了しました✨',
+                **result
             })
         }
-    
+
     except Exception as e:
         print(f"Error: {str(e)}")
         return {
@@ -61,4 +75,4 @@ def lambda_handler(event, context):
             'body': json.dumps({
                 'error': str(e)
             })
-        } 
\ No newline at end of file
+        }
@@ -0,0 +1,180 @@
+"""
+SQLファイルの文単位の分割と INSERT の COPY 形式への変換
+
+文字列リテラル（'...' / E'...'）、引用符付き識別子、ドル引用（$$...$$ / $tag$...$tag$）、
+コメント（-- / ネストした /* */）の中のセミコロンでは分割しない。
+pg_dump 形式の COPY ... FROM stdin; に続くデータ（\\. の行まで）は文と組にして返す。
+"""
+import re
+from functools import lru_cache
+
+# 文の区切りの判定が必要なトークン（ドル引用のタグは識別子の途中の $ と区別する）
+_TOKEN = re.compile(r"""'|"|--|/\*|;|(?<![\w$])\$(?:[A-Za-z_][A-Za-z_0-9]*)?\$""")
+
+# ドル引用・コメント・E'...' を含まない文（大半のINSERT）を1回の正規表現で読み飛ばす
+_SIMPLE_STATEMENT = re.compile(
+    r"""(?:[^'";$/-]+|(?<![eE])'[^']*(?:''[^']*)*'|"[^"]*(?:""[^"]*)*"|-(?!-)|/(?!\*))*"""
+)
+
+_BLOCK_COMMENT_TOKEN = re.compile(r"/\*|\*/")
+_SPACE_AND_LINE_COMMENTS = re.compile(r"(?:\s+|--[^\n]*)*")
+_ESCAPE_STRING_BODY = re.compile(r"(?:[^'\\]|\\.|'')*'", re.S)
+_COPY_FROM_STDIN = re.compile(r"COPY\s.*\sFROM\s+stdin\b", re.I | re.S)
+
+# INSERT INTO table (col, ...) VALUES (...), (...) のうち、値がリテラルのみのもの
+_IDENTIFIER = r'(?:"[^"]*(?:""[^"]*)*"|[A-Za-z_][\w$]*)'
+_INSERT = re.compile(
+    rf"INSERT\s+INTO\s+({_IDENTIFIER}(?:\s*\.\s*{_IDENTIFIER})?)\s*"
+    rf"(\(\s*{_IDENTIFIER}(?:\s*,\s*{_IDENTIFIER})*\s*\))?\s*VALUES\s*",
+    re.I
+)
+_LITERAL = r"'[^']*(?:''[^']*)*'|NULL\b|TRUE\b|FALSE\b|[+-]?(?:\d+(?:\.\d*)?|\.\d+)"
+_ROW = re.compile(rf"\(\s*((?:{_LITERAL})(?:\s*,\s*(?:{_LITERAL}))*)\s*\)\s*(,)?\s*", re.I)
+_VALUE = re.compile(r"'([^']*(?:''[^']*)*)'|(NULL|TRUE|FALSE)\b|([+-]?(?:\d+(?:\.\d*)?|\.\d+))", re.I)
+_COPY_KEYWORDS = {'NULL': '', 'TRUE': 't', 'FALSE': 'f'}
+
+
+def split_statements(text, position=0):
+    """
+    position 以降のSQLを文に分割して (文の開始位置, 文, COPYデータ, 文の終了位置) を順に返す
+
+    文の終了位置（COPYの場合はデータの後）から再開すると、次の文から分割できる。
+    COPYデータは COPY ... FROM stdin の場合のみ（それ以外はNone）
+    """
+    length = len(text)
+    while True:
+        start = _skip_space_and_comments(text, position)
+        if start >= length:
+            return
+        end = _find_statement_end(text, start)
+        statement = text[start:end].strip()
+        position = min(end + 1, length)
+        data = None
+        if _COPY_FROM_STDIN.match(statement):
+            data, position = _read_copy_data(text, position, start)
+        if statement:
+            yield start, statement, data, position
+
+
+def parse_insert(statement):
+    """
+    値がリテラル（文字列・数値・NULL・TRUE/FALSE）のみの INSERT ... VALUES を解析
+
+    Returns:
+        (テーブル, 列リスト（ない場合は''）, COPYのCSV形式の行のリスト)。変換できない文の場合はNone
+    """
+    match = _INSERT.match(statement)
+    if not match:
+        return None
+    table, columns = match.group(1), match.group(2) or ''
+    rows = []
+    position = match.end()
+    length = len(statement)
+    while position < length:
+        row = _ROW.match(statement, position)
+        if not row:
+            return None
+        rows.append(','.join(
+            _COPY_KEYWORDS[keyword.upper()] if keyword else number or
+            '"' + string.replace("''", "'").replace('"', '""') + '"'
+            for string, keyword, number in _VALUE.findall(row.group(1))
+        ))
+        position = row.end()
+        if (row.group(2) is None) == (position < length):
+            # ON CONFLICT / RETURNING などが続く文（や末尾のカンマ）は変換しない
+            return None
+    return table, columns, rows
+
+
+@lru_cache(maxsize=256)
+def normalize_target(table, columns):
+    """連続したINSERTを同じCOPYにまとめられるか判定するためのキー（区切り記号の前後の空白を無視）"""
+    return re.sub(r'\s*([(),.])\s*', r'\1', f"{table}{columns}")
+
+
+def _skip_space_and_comments(text, position):
+    while True:
+        position = _SPACE_AND_LINE_COMMENTS.match(text, position).end()
+        if not text.startswith('/*', position):
+            return position
+        position = _end_of_block_comment(text, position + 2)
+
+
+def _find_statement_end(text, position):
+    """文の終わりのセミコロンの位置（ない場合はテキストの末尾）"""
+    simple = _SIMPLE_STATEMENT.match(text, position).end()
+    if text.startswith(';', simple):
+        return simple
+    while True:
+        match = _TOKEN.search(text, position)
+        if match is None:
+            return len(text)
+        token = match.group()
+        position = match.end()
+        if token == ';':
+            return match.start()
+        if token == "'":
+            if _is_escape_string(text, match.start()):
+                body = _ESCAPE_STRING_BODY.match(text, position)
+                if body is None:
+                    raise ValueError(f"Unterminated string literal at offset {match.start()}")
+                position = body.end()
+            else:
+                position = _end_of_quoted(text, position, "'", match.start())
+        elif token == '"':
+            position = _end_of_quoted(text, position, '"', match.start())
+        elif token == '--':
+            newline = text.find('\n', position)
+            position = len(text) if newline < 0 else newline + 1
+        elif token == '/*':
+            position = _end_of_block_comment(text, position)
+        else:
+            close = text.find(token, position)
+            if close < 0:
+                raise ValueError(f"Unterminated dollar-quoted string at offset {match.start()}")
+            position = close + len(token)
+
+
+def _is_escape_string(text, quote_position):
+    """E'...' 形式（バックスラッシュでエスケープする文字列）か"""
+    if quote_position == 0 or text[quote_position - 1] not in 'eE':
+        return False
+    return quote_position == 1 or not (text[quote_position - 2].isalnum() or text[quote_position - 2] in '_$')
+
+
+def _end_of_quoted(text, position, quote, start):
+    """引用符の終わりの次の位置（引用符を2つ重ねたエスケープは読み飛ばす）"""
+    while True:
+        close = text.find(quote, position)
+        if close < 0:
+            raise ValueError(f"Unterminated quoted string at offset {start}")
+        if not text.startswith(quote, close + 1):
+            return close + 1
+        position = close + 2
+
+
+def _end_of_block_comment(text, position):
+    """ネストを考慮したブロックコメントの終わりの次の位置"""
+    depth = 1
+    while depth:
+        match = _BLOCK_COMMENT_TOKEN.search(text, position)
+        if match is None:
+            return len(text)
+        depth += 1 if match.group() == '/*' else -1
+        position = match.end()
+    return position
+
+
+def _read_copy_data(text, position, start):
+    """COPY ... FROM stdin; の次の行から \\. の行までのデータと、その次の位置を返す"""
+    newline = text.find('\n', position - 1)
+    data_start = len(text) if newline < 0 else newline + 1
+    if text.startswith('\\.', data_start):
+        terminator = data_start
+    else:
+        terminator = text.find('\n\\.', data_start - 1)
+        if terminator < 0:
+            raise ValueError(f"COPY data at offset {start} is not terminated by \\.")
+        terminator += 1
+    newline = text.find('\n', terminator)
+    return text[data_start:terminator], len(text) if newline < 0 else newline + 1
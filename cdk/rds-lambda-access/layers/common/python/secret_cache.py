@@ -0,0 +1,86 @@
+"""
+Secrets Managerのデータベース接続情報キャッシュ
+
+Lambda実行環境内でシークレットARNごとに接続情報を保持し、
+ウォームスタート時のSecrets Manager呼び出しを省略する
+"""
+import json
+import os
+import threading
+import time
+import boto3
+import psycopg2
+
+# キャッシュの有効期間（秒）
+SECRET_CACHE_TTL_SECONDS = int(os.environ.get('SECRET_CACHE_TTL_SECONDS', '300'))
+METRICS_NAMESPACE = os.environ.get('METRICS_NAMESPACE', 'RdsLambdaAccess')
+
+secrets_client = boto3.client('secretsmanager')
+
+# シークレットARN -> (シークレット, 有効期限)
+_secret_cache = {}
+_secret_cache_lock = threading.Lock()
+
+
+def get_db_secret(secret_arn, force_refresh=False):
+    """
+    Secrets Managerから接続情報（username, password, host, port, dbname）を取得
+    """
+    if not force_refresh:
+        with _secret_cache_lock:
+            cached = _secret_cache.get(secret_arn)
+        if cached and time.time() < cached[1]:
+            put_metric('SecretCacheHit')
+            return cached[0]
+
+    put_metric('SecretCacheMiss')
+    response = secrets_client.get_secret_value(SecretId=secret_arn)
+    secret = json.loads(response['SecretString'])
+
+    with _secret_cache_lock:
+        _secret_cache[secret_arn] = (secret, time.time() + SECRET_CACHE_TTL_SECONDS)
+    return secret
+
+
+def connect_db(secret_arn, **kwargs):
+    """
+    キャッシュ済みの接続情報でPostgreSQLに接続
+
+    認証に失敗した場合（パスワードのローテーション等）はシークレットを再取得して1度だけ接続し直す
+    """
+    secret = get_db_secret(secret_arn)
+    try:
+        return _connect(secret, **kwargs)
+    except psycopg2.OperationalError as e:
+        if 'password authentication failed' not in str(e):
+            raise
+        print("Authentication failed with cached credentials, refreshing secret")
+        return _connect(get_db_secret(secret_arn, force_refresh=True), **kwargs)
+
+
+def _connect(secret, **kwargs):
+    print(f"Connecting to PostgreSQL database: {secret['host']}")
+    return psycopg2.connect(
+        host=secret['host'],
+        port=secret['port'],
+        dbname=secret['dbname'],
+        user=secret['username'],
+        password=secret['password'],
+        **kwargs
+    )
+
+
+def put_metric(name, value=1, unit='Count'):
+    """CloudWatch Embedded Metric Format でメトリクスを出力"""
+    print(json.dumps({
+        '_aws': {
+            'Timestamp': int(time.time() * 1000),
+            'CloudWatchMetrics': [{
+                'Namespace': METRICS_NAMESPACE,
+                'Dimensions': [['FunctionName']],
+                'Metrics': [{'Name': name, 'Unit': unit}],
+            }],
+        },
+        'FunctionName': os.environ.get('AWS_LAMBDA_FUNCTION_NAME', 'local'),
+        name: value,
+    }))
@@ -6,6 +6,8 @@ import * as lambda from 'aws-cdk-lib/aws-lambda';
 import * as iam from 'aws-cdk-lib/aws-iam';
 import * as path from 'node:path';
 import * as s3 from 'aws-cdk-lib/aws-s3';
+import * as events from 'aws-cdk-lib/aws-events';
+import * as targets from 'aws-cdk-lib/aws-events-targets';
 
 export class RdsLambdaAccessStack extends cdk.Stack {
   constructor(scope: Construct, id: string, props?: cdk.StackProps) {
@@ -130,6 +132,14 @@ export class RdsLambdaAccessStack extends cdk.Stack {
     // S3バケットへの書き込み権限をLambdaに追加
     csvBucket.grantReadWrite(lambdaRole);
 
+    // 共通コードLayer（Secrets Managerの接続情報キャッシュ）
+    const commonLayer = new lambda.LayerVersion(this, 'CommonLayer', {
+      code: lambda.Code.fromAsset(path.join(__dirname, '../layers/common')),
+      compatibleRuntimes: [lambda.Runtime.PYTHON_3_13],
+      compatibleArchitectures: [lambda.Architecture.ARM_64],
+      description: 'Common code (cached Secrets Manager credentials)',
+    });
+
     // DB初期化用のLambda関数
     const initDbLambda = new lambda.Function(this, 'InitDbLambda', {
       runtime: lambda.Runtime.PYTHON_3_13,
@@ -157,9 +167,10 @@ export class RdsLambdaAccessStack extends cdk.Stack {
       securityGroups: [lambdaSecurityGroup],
       role: lambdaRole,
       architecture: lambda.Architecture.ARM_64,
+      layers: [commonLayer],
     });
 
-    // データ取得・CSV出力用のLambda関数
+    // データ取得・エクスポート（CSV / JSON Lines / Parquet）用のLambda関数
     const exportRdsToS3Lambda = new lambda.Function(this, 'ExportRdsToS3Lambda', {
       runtime: lambda.Runtime.PYTHON_3_13,
       code: lambda.Code.fromAsset(path.join(__dirname, '../lambda/export_rds_to_s3'), {
@@ -177,9 +188,13 @@ export class RdsLambdaAccessStack extends cdk.Stack {
       environment: {
         DB_SECRET_ARN: rdsInstance.secret?.secretArn || '',
         S3_BUCKET_NAME: csvBucket.bucketName,
+        EXPORT_JOB_CONCURRENCY: '4',
+        EXPORT_TIME_MARGIN_SECONDS: '20',
       },
-      timeout: cdk.Duration.minutes(3),
-      memorySize: 256,
+      // 複数テーブルのエクスポートを1回の実行で処理するため長め（残り時間が足りないジョブはスキップ）
+      timeout: cdk.Duration.minutes(15),
+      // Parquet出力（pyarrow）とジョブごとのアップロードバッファ用
+      memorySize: 1024,
       vpc,
       vpcSubnets: {
         subnetType: ec2.SubnetType.PRIVATE_WITH_EGRESS,
@@ -187,8 +202,37 @@ export class RdsLambdaAccessStack extends cdk.Stack {
       securityGroups: [lambdaSecurityGroup],
       role: lambdaRole,
       architecture: lambda.Architecture.ARM_64,
+      layers: [commonLayer],
+    });
+
+    // 差分エクスポート・コンパクションのスケジュールは初期状態では無効
+    // （cdk deploy -c enableExportSchedules=true で有効化）
+    const exportSchedulesEnabled = ['true', true].includes(this.node.tryGetContext('enableExportSchedules'));
+
+    // 差分エクスポートのスケジュール（1時間ごと。前回の高水位より後に変更された行のみ出力）
+    const incrementalExportRule = new events.Rule(this, 'IncrementalExportSchedule', {
+      schedule: events.Schedule.rate(cdk.Duration.hours(1)),
+      enabled: exportSchedulesEnabled,
     });
 
+    incrementalExportRule.addTarget(new targets.LambdaFunction(exportRdsToS3Lambda, {
+      event: events.RuleTargetInput.fromObject({ mode: 'incremental' }),
+    }));
+
+    // 差分のコンパクション（毎週日曜の午前3時に全件のスナップショットを出力し、以前の差分を置き換える）
+    const compactExportRule = new events.Rule(this, 'CompactExportSchedule', {
+      schedule: events.Schedule.cron({
+        minute: '0',
+        hour: '3',
+        weekDay: 'SUN',
+      }),
+      enabled: exportSchedulesEnabled,
+    });
+
+    compactExportRule.addTarget(new targets.LambdaFunction(exportRdsToS3Lambda, {
+      event: events.RuleTargetInput.fromObject({ mode: 'compact' }),
+    }));
+
     // 出力
     new cdk.CfnOutput(this, 'BastionHostId', {
       value: bastionHost.instanceId,
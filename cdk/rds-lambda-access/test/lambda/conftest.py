@@ -0,0 +1,43 @@
+"""
+Lambda関数（Python）のテストの共通設定
+
+init_db のモジュールは Lambda と同じくトップレベルのモジュールとして読み込む。
+DBを使うテストは環境変数 TEST_DATABASE_URL（例: postgresql://postgres@localhost:5432/postgres）の
+PostgreSQLで実行し、未設定の場合はスキップする。
+"""
+import os
+import sys
+import uuid
+from pathlib import Path
+
+import pytest
+
+sys.path.insert(0, str(Path(__file__).resolve().parents[2] / 'lambda' / 'init_db'))
+
+
+@pytest.fixture()
+def conn():
+    """テストごとの接続（public.init_sql_progress を使うため、テストで作成したテーブル・進捗は終了時に削除する）"""
+    dsn = os.environ.get('TEST_DATABASE_URL')
+    if not dsn:
+        pytest.skip('TEST_DATABASE_URL is not set')
+    import psycopg2
+
+    connection = psycopg2.connect(dsn)
+    yield connection
+    connection.rollback()
+    connection.close()
+
+
+@pytest.fixture()
+def table_name(conn):
+    """テスト用のテーブル名（SQLファイル名にも使用し、終了時にテーブルと進捗を削除）"""
+    name = f"test_init_{uuid.uuid4().hex[:8]}"
+    yield name
+    conn.rollback()
+    with conn.cursor() as cursor:
+        cursor.execute(f"DROP TABLE IF EXISTS {name}")
+        cursor.execute("SELECT to_regclass('public.init_sql_progress') IS NOT NULL")
+        if cursor.fetchone()[0]:
+            cursor.execute("DELETE FROM public.init_sql_progress WHERE file_name = %s", (name,))
+    conn.commit()
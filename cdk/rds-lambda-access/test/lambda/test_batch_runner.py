@@ -0,0 +1,143 @@
+import time
+
+import pytest
+
+from batch_runner import BatchRunner
+
+
+def run(conn, file_name, text, batch_statements=2, deadline=None, restart=False):
+    runner = BatchRunner(conn, batch_statements, 60, deadline or time.time() + 60)
+    return runner.run(file_name, text, restart=restart)
+
+
+def fetch(conn, query):
+    with conn.cursor() as cursor:
+        cursor.execute(query)
+        rows = cursor.fetchall()
+    conn.rollback()
+    return rows
+
+
+def saved_progress(conn, file_name):
+    rows = fetch(conn, f"SELECT position, statements, completed_at IS NOT NULL FROM public.init_sql_progress "
+                       f"WHERE file_name = '{file_name}'")
+    return rows[0] if rows else None
+
+
+def seed_sql(table, values):
+    return f"CREATE TABLE {table} (id int, name text);\n" + ''.join(
+        f"INSERT INTO {table} (id, name) VALUES ({value}, 'row {value}');\n" for value in values
+    )
+
+
+def test_executes_file_and_skips_completed_file(conn, table_name):
+    text = seed_sql(table_name, range(1, 6))
+
+    result = run(conn, table_name, text)
+
+    assert result['completed'] and result['executed']
+    assert result['position'] == len(text) and result['percent'] == 100.0
+    assert result['statements'] == 6
+    assert fetch(conn, f"SELECT count(*) FROM {table_name}") == [(5,)]
+    assert saved_progress(conn, table_name) == (len(text), 6, True)
+
+    result = run(conn, table_name, text)
+    assert result['completed'] and not result['executed']
+    assert fetch(conn, f"SELECT count(*) FROM {table_name}") == [(5,)]
+
+
+def test_converts_literal_inserts_to_copy(conn, table_name):
+    text = (f"CREATE TABLE {table_name} (id int, name text, note text);\n"
+            f"INSERT INTO {table_name} (id, name, note) VALUES (1, 'O''Brien', NULL), (2, 'a,\"b\"', '');\n"
+            f"INSERT INTO {table_name}(id,name,note) VALUES (3, 'c', 'x');\n")
+
+    result = run(conn, table_name, text, batch_statements=10)
+
+    assert result['copied_rows'] == 3
+    assert fetch(conn, f"SELECT id, name, note FROM {table_name} ORDER BY id") == [
+        (1, "O'Brien", None), (2, 'a,"b"', ''), (3, 'c', 'x')
+    ]
+
+
+def test_resumes_after_last_committed_batch(conn, table_name):
+    text = seed_sql(table_name, range(1, 6)).replace(
+        "VALUES (5, 'row 5')", "VALUES (5, 'row 5', 'extra')"
+    )
+    committed_end = text.index("VALUES (3, 'row 3');") + len("VALUES (3, 'row 3');")
+
+    with pytest.raises(RuntimeError, match='Batch starting at offset'):
+        run(conn, table_name, text)
+
+    # CREATE TABLE と 1〜3行目のINSERTを含む2バッチのみコミット済み
+    assert saved_progress(conn, table_name) == (committed_end, 4, False)
+    assert fetch(conn, f"SELECT id FROM {table_name} ORDER BY id") == [(1,), (2,), (3,)]
+
+    # コミット済みの部分は変えずに、失敗した文を修正して再実行すると続きから実行する
+    fixed = text[:committed_end] + text[committed_end:].replace(", 'extra')", ")")
+    result = run(conn, table_name, fixed)
+
+    assert result['completed'] and result['statements'] == 6
+    assert fetch(conn, f"SELECT id FROM {table_name} ORDER BY id") == [(1,), (2,), (3,), (4,), (5,)]
+
+
+def test_pauses_at_deadline_and_resumes(conn, table_name):
+    text = seed_sql(table_name, range(1, 4))
+
+    result = run(conn, table_name, text, deadline=time.time() - 1)
+
+    assert not result['completed']
+    assert result['position'] == 0 and result['percent'] == 0.0
+
+    result = run(conn, table_name, text)
+    assert result['completed']
+    assert fetch(conn, f"SELECT count(*) FROM {table_name}") == [(3,)]
+
+
+def test_restarts_when_executed_part_changes(conn, table_name):
+    text = seed_sql(table_name, range(1, 4)).replace("CREATE TABLE", "CREATE TABLE IF NOT EXISTS")
+    run(conn, table_name, text)
+
+    changed = text.replace("'row 1'", "'row one'")
+    result = run(conn, table_name, changed)
+
+    assert result['completed'] and result['statements'] == 4
+    assert fetch(conn, f"SELECT count(*) FROM {table_name}") == [(6,)]
+
+
+def test_restart_option_executes_from_beginning(conn, table_name):
+    text = seed_sql(table_name, range(1, 3)).replace("CREATE TABLE", "CREATE TABLE IF NOT EXISTS")
+    run(conn, table_name, text)
+
+    result = run(conn, table_name, text, restart=True)
+
+    assert result['executed']
+    assert fetch(conn, f"SELECT count(*) FROM {table_name}") == [(4,)]
+
+
+def test_replays_session_settings_on_resume(conn, table_name):
+    text = (f"SET application_name = 'init_sql_test';\n"
+            f"CREATE TABLE {table_name} (name text);\n"
+            f"INSERT INTO {table_name} SELECT current_setting('application_name') || missing;\n")
+    with pytest.raises(RuntimeError):
+        run(conn, table_name, text, batch_statements=1)
+
+    with conn.cursor() as cursor:
+        cursor.execute("SET application_name = 'other'")
+    conn.commit()
+    fixed = text.replace(" || missing", "")
+    run(conn, table_name, fixed, batch_statements=1)
+
+    assert fetch(conn, f"SELECT name FROM {table_name}") == [('init_sql_test',)]
+
+
+def test_skips_transaction_control_and_statement_timeout(conn, table_name):
+    with conn.cursor() as cursor:
+        cursor.execute("SET statement_timeout = '5min'")
+    conn.commit()
+    text = (f"BEGIN;\nSET statement_timeout = 0;\nCREATE TABLE {table_name} (id int);\n"
+            f"INSERT INTO {table_name} VALUES (1);\nROLLBACK;\nCOMMIT;\n")
+
+    run(conn, table_name, text)
+
+    assert fetch(conn, f"SELECT count(*) FROM {table_name}") == [(1,)]
+    assert fetch(conn, "SHOW statement_timeout") == [('5min',)]
@@ -0,0 +1,114 @@
+import pytest
+
+from sql_splitter import normalize_target, parse_insert, split_statements
+
+
+def statements(text, position=0):
+    return [statement for _, statement, _, _ in split_statements(text, position)]
+
+
+class TestSplitStatements:
+    def test_splits_on_semicolons(self):
+        assert statements("SELECT 1; SELECT 2;\nSELECT 3") == ['SELECT 1', 'SELECT 2', 'SELECT 3']
+
+    def test_ignores_empty_statements(self):
+        assert statements(";;  SELECT 1;;\n;") == ['SELECT 1']
+
+    @pytest.mark.parametrize('literal', [
+        "'a;b'",
+        "'it''s;'",
+        "E'a\\';b'",
+        "e'\\\\;'",
+        '"semi;colon"',
+        '"quo""te;"',
+    ])
+    def test_does_not_split_inside_quotes(self, literal):
+        assert statements(f"SELECT {literal}; SELECT 2") == [f"SELECT {literal}", 'SELECT 2']
+
+    def test_backslash_is_literal_in_standard_strings(self):
+        assert statements("SELECT 'a\\'; SELECT 2") == ["SELECT 'a\\'", 'SELECT 2']
+
+    def test_identifier_ending_in_e_is_not_an_escape_string(self):
+        assert statements("SELECT name'x\\'; SELECT 2") == ["SELECT name'x\\'", 'SELECT 2']
+
+    def test_does_not_split_inside_dollar_quotes(self):
+        body = "CREATE FUNCTION f() RETURNS int AS $$ SELECT 1; $$ LANGUAGE sql"
+        tagged = "DO $body$ BEGIN PERFORM 1; RAISE NOTICE '$$;'; END $body$"
+        assert statements(f"{body}; {tagged}; SELECT 3") == [body, tagged, 'SELECT 3']
+
+    def test_dollar_in_identifier_is_not_a_quote(self):
+        assert statements("SELECT a$b$ FROM t; SELECT 2") == ['SELECT a$b$ FROM t', 'SELECT 2']
+
+    def test_does_not_split_inside_comments(self):
+        text = "SELECT 1 -- not here;\n+ 1; SELECT 2 /* nor ; /* nested; */ here; */ + 2; SELECT 3"
+        assert statements(text) == [
+            'SELECT 1 -- not here;\n+ 1', 'SELECT 2 /* nor ; /* nested; */ here; */ + 2', 'SELECT 3'
+        ]
+
+    def test_skips_leading_comments(self):
+        text = "-- header; \n/* a; /* b; */ */\n SELECT 1;"
+        assert [start for start, _, _, _ in split_statements(text)] == [text.index('SELECT')]
+
+    def test_unterminated_quotes_raise(self):
+        for text in ("SELECT 'abc", 'SELECT "abc', "SELECT $$abc", "SELECT E'abc"):
+            with pytest.raises(ValueError):
+                statements(text)
+
+    def test_returns_copy_data(self):
+        text = "COPY t (a, b) FROM stdin;\n1\tx;y\n2\t\\N\n\\.\nSELECT 1;"
+        result = list(split_statements(text))
+        assert [(statement, data) for _, statement, data, _ in result] == [
+            ('COPY t (a, b) FROM stdin', '1\tx;y\n2\t\\N\n'),
+            ('SELECT 1', None),
+        ]
+
+    def test_empty_copy_data(self):
+        result = list(split_statements("COPY t FROM stdin;\n\\.\nSELECT 1;"))
+        assert [data for _, _, data, _ in result] == ['', None]
+
+    def test_unterminated_copy_data_raises(self):
+        with pytest.raises(ValueError):
+            statements("COPY t FROM stdin;\n1\n")
+
+    def test_resumes_from_end_position(self):
+        text = "SELECT 1; SELECT 'x;'; COPY t FROM stdin;\n1\n\\.\nSELECT 4"
+        result = list(split_statements(text))
+        for index, (_, _, _, end) in enumerate(result):
+            assert statements(text, end) == [statement for _, statement, _, _ in result[index + 1:]]
+
+
+class TestParseInsert:
+    def test_converts_literals_to_csv(self):
+        statement = ("INSERT INTO public.users (id, name, note, active, score) VALUES "
+                     "(1, 'O''Brien', NULL, TRUE, -1.5), (2, 'say \"hi\"', '', false, .5)")
+        assert parse_insert(statement) == ('public.users', '(id, name, note, active, score)', [
+            '1,"O\'Brien",,t,-1.5',
+            '2,"say ""hi""","",f,.5',
+        ])
+
+    def test_without_column_list(self):
+        assert parse_insert("insert into t values ('a')") == ('t', '', ['"a"'])
+
+    def test_quoted_identifiers(self):
+        assert parse_insert('INSERT INTO "My Table" ("a b") VALUES (1)') == ('"My Table"', '("a b")', ['1'])
+
+    @pytest.mark.parametrize('statement', [
+        "INSERT INTO t (a) VALUES (now())",
+        "INSERT INTO t (a) VALUES (1) ON CONFLICT DO NOTHING",
+        "INSERT INTO t (a) VALUES (1) RETURNING a",
+        "INSERT INTO t (a) VALUES (1),",
+        "INSERT INTO t (a) VALUES (1) (2)",
+        "INSERT INTO t (a) SELECT 1",
+        "INSERT INTO t (a) VALUES ('x'::text)",
+        "UPDATE t SET a = 1",
+    ])
+    def test_rejects_statements_that_are_not_plain_literal_inserts(self, statement):
+        assert parse_insert(statement) is None
+
+
+class TestNormalizeTarget:
+    def test_ignores_whitespace_around_punctuation(self):
+        assert normalize_target('public . users', '( id ,name )') == normalize_target('public.users', '(id, name)')
+
+    def test_distinguishes_columns(self):
+        assert normalize_target('users', '(id, name)') != normalize_target('users', '(name, id)')